@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""Latency of /ws/speech from sentence completion to first audio frame.
+
+Types `--sentences` sentences into the WebSocket word by word at `--wpm`
+words per minute, the way live captions or a chat client would deliver
+them. A sentence is complete when the delta carrying its final word (and
+the space after it) is sent; its latency runs until the binary audio frame
+for that sentence arrives. Reports p50/p95/max plus the server's own
+per-stage split (detect / tts / modulate / encode).
+
+By default the app runs in-process with stub detector and TTS backends
+(EMPATHY_STUB_BACKENDS=1, --tts-latency-ms per sentence), so it measures the
+streaming path itself; pass --url ws://host:port/ws/speech to measure a
+running server instead (needs the `websockets` package, installed with
+uvicorn[standard]).
+
+Usage:
+    python Backend/bench_stream.py --sentences 30 --wpm 300 --format opus
+Requires NLTK punkt data for sentence segmentation on the server.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from empathy_engine.bench_pipeline import make_corpus
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def run(send, receive, sentences: List[str], wpm: float) -> Dict:
+    """Type `sentences` through `send(str)`; collect replies via `receive()`."""
+    completed: Dict[int, float] = {}
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    errors: List[str] = []
+
+    def reader():
+        meta = None
+        while True:
+            frame = receive()
+            if isinstance(frame, bytes):
+                latencies.append(time.perf_counter() - completed[meta["index"]])
+                continue
+            meta = json.loads(frame)
+            if meta["type"] == "done":
+                return
+            if meta["type"] == "error":
+                errors.append(meta["detail"])
+            elif meta["type"] == "sentence":
+                for stage, seconds in meta["timings"].items():
+                    stages.setdefault(stage, []).append(seconds)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    interval = 60.0 / wpm
+    for index, sentence in enumerate(sentences):
+        words = sentence.split()
+        for n, word in enumerate(words):
+            if n == len(words) - 1:
+                completed[index] = time.perf_counter()
+            send(json.dumps({"type": "text", "text": word + " "}))
+            time.sleep(interval)
+    send(json.dumps({"type": "end"}))
+    thread.join(timeout=60)
+    return {"latencies": latencies, "stages": stages, "errors": errors}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="ws:// URL of a running server (default: in-process app with stubs)")
+    parser.add_argument("--sentences", type=int, default=30)
+    parser.add_argument("--wpm", type=float, default=300.0, help="typing speed in words per minute")
+    parser.add_argument("--format", default="opus")
+    parser.add_argument("--tts-latency-ms", type=float, default=100.0)
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    # Punkt does not split after "...", so end those sentences with a period
+    sentences = [s[:-3] + "." if s.endswith("...") else s for s in make_corpus(args.sentences, seed=args.seed)]
+    if args.url:
+        from websockets.sync.client import connect
+
+        with connect(f"{args.url}?format={args.format}") as ws:
+            result = run(ws.send, ws.recv, sentences, args.wpm)
+    else:
+        os.environ.setdefault("EMPATHY_STUB_BACKENDS", "1")
+        os.environ.setdefault("EMPATHY_STUB_TTS_LATENCY_MS", str(args.tts_latency_ms))
+        os.environ.setdefault("EMPATHY_JOB_WORKERS", "0")
+        # Keep the app's output and job database out of the working tree
+        work_dir = tempfile.mkdtemp(prefix="empathy_stream_")
+        os.environ.setdefault("EMPATHY_OUTPUT_DIR", os.path.join(work_dir, "audio"))
+        os.environ.setdefault("EMPATHY_JOB_DB", os.path.join(work_dir, "jobs.sqlite3"))
+        from fastapi.testclient import TestClient
+        from Backend.main import app
+
+        try:
+            with TestClient(app) as client:
+                for _ in range(300):
+                    if client.get("/readyz").status_code == 200:
+                        break
+                    time.sleep(0.1)
+                with client.websocket_connect(f"/ws/speech?format={args.format}") as ws:
+                    def receive():
+                        message = ws.receive()
+                        return message.get("bytes") if message.get("bytes") is not None else message.get("text")
+                    result = run(ws.send_text, receive, sentences, args.wpm)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    lat = result["latencies"]
+    print(f"{len(sentences)} sentences at {args.wpm:g} wpm, format {args.format}"
+          + ("" if args.url else f", stub TTS {args.tts_latency_ms:g} ms"))
+    print(f"completion -> first audio: p50 {_percentile(lat, 0.5) * 1000:.0f} ms, "
+          f"p95 {_percentile(lat, 0.95) * 1000:.0f} ms, max {max(lat, default=0) * 1000:.0f} ms")
+    print("server stages (mean): " + ", ".join(
+        f"{stage} {sum(v) / len(v) * 1000:.1f} ms" for stage, v in result["stages"].items()))
+    if result["errors"] or len(lat) != len(sentences):
+        print(f"{len(sentences) - len(lat)} sentences without audio: {result['errors'][:3]}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+"""Open-loop load test for POST /generate-speech.
+
+By default boots `Backend/main.py` under uvicorn with stub detector and TTS
+backends (EMPATHY_STUB_BACKENDS=1, latency set by --tts-latency-ms etc.) on
+a free local port; pass --url to target an already running server instead.
+
+For each target rate, requests are fired on a Poisson schedule for
+--duration seconds regardless of how many are still in flight (open loop),
+so queueing shows up as latency rather than as a lower send rate. Request
+texts follow a mixed length distribution (mostly 1-3 sentences, a tail of
+long documents) and are unique unless --repeat-fraction is set, so the
+render cache does not hide pipeline cost.
+
+Reports per rate: latency p50/p95/p99/max, error rate, achieved throughput,
+and server CPU / peak RSS (Linux, self-booted server only). The maximum
+sustainable rate is the highest one with error rate <= --max-error-rate and
+p99 <= --slo-ms. Results are JSON with sorted keys and rounded values so
+that runs can be diffed.
+
+Usage:
+    python Backend/loadtest.py --rates 1 2 5 10 --duration 20 --output load.json
+Requires NLTK punkt data for sentence segmentation on the server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from empathy_engine.bench_pipeline import make_corpus
+
+
+# (weight, min_sentences, max_sentences): short chat-style messages dominate
+LENGTH_MIX = [(0.60, 1, 3), (0.30, 4, 12), (0.10, 13, 60)]
+
+
+class TextSampler:
+    """Draws request texts from LENGTH_MIX, deterministic for a given seed."""
+
+    def __init__(self, seed: int, repeat_fraction: float):
+        self.rng = random.Random(seed)
+        self.pool = make_corpus(2000, seed=seed)
+        self.repeat_fraction = repeat_fraction
+        self.sent: List[str] = []
+        self.counter = 0
+
+    def next(self) -> str:
+        if self.sent and self.rng.random() < self.repeat_fraction:
+            return self.rng.choice(self.sent)
+        r = self.rng.random()
+        for weight, lo, hi in LENGTH_MIX:
+            if r < weight:
+                break
+            r -= weight
+        n = self.rng.randint(lo, hi)
+        start = self.rng.randrange(len(self.pool) - n)
+        self.counter += 1
+        # Request number keeps texts unique so the render cache stays cold
+        text = f"Message {self.counter}. " + " ".join(self.pool[start:start + n])
+        self.sent.append(text)
+        return text
+
+
+class ServerProcess:
+    """uvicorn running Backend.main:app with stub backends on a free port."""
+
+    def __init__(self, args):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.work_dir = tempfile.mkdtemp(prefix="empathy_load_")
+        env = dict(os.environ)
+        env.update({
+            "EMPATHY_STUB_BACKENDS": "1",
+            "EMPATHY_STUB_TTS_LATENCY_MS": str(args.tts_latency_ms),
+            "EMPATHY_STUB_TTS_JITTER_MS": str(args.tts_jitter_ms),
+            "EMPATHY_STUB_DETECT_LATENCY_MS": str(args.detect_latency_ms),
+            "EMPATHY_OUTPUT_DIR": os.path.join(self.work_dir, "audio"),
+            "EMPATHY_PROFILE_DIR": os.path.join(self.work_dir, "profiles"),
+            "EMPATHY_JOB_DB": os.path.join(self.work_dir, "jobs.sqlite3"),
+            "EMPATHY_JOB_WORKERS": "0",
+        })
+        cmd = [
+            sys.executable, "-m", "uvicorn", "Backend.main:app",
+            "--host", "127.0.0.1", "--port", str(self.port),
+            "--workers", str(args.workers), "--log-level", "warning",
+        ]
+        self.proc = subprocess.Popen(cmd, cwd=str(PROJECT_ROOT), env=env)
+
+    def wait_ready(self, timeout: float = 60.0) -> None:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"server exited with code {self.proc.returncode}")
+            try:
+                if httpx.get(f"{self.url}/health", timeout=1.0).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("server did not become healthy in time")
+
+    def _pids(self) -> List[int]:
+        # The uvicorn parent plus any worker processes it spawned
+        pids = [self.proc.pid]
+        try:
+            with open(f"/proc/{self.proc.pid}/task/{self.proc.pid}/children") as f:
+                pids += [int(p) for p in f.read().split()]
+        except OSError:
+            pass
+        return pids
+
+    def resource_sample(self) -> Optional[Dict]:
+        """Total CPU seconds and RSS bytes of the server processes (Linux only)."""
+        if not sys.platform.startswith("linux"):
+            return None
+        cpu = 0.0
+        rss = 0
+        ticks = os.sysconf("SC_CLK_TCK")
+        page = os.sysconf("SC_PAGE_SIZE")
+        for pid in self._pids():
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                cpu += (int(fields[11]) + int(fields[12])) / ticks
+                rss += int(fields[21]) * page
+            except (OSError, IndexError, ValueError):
+                continue
+        return {"cpu_s": cpu, "rss_bytes": rss}
+
+    def stop(self) -> None:
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def _percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+async def _one(client: httpx.AsyncClient, url: str, text: str, fmt: str, results: List[Dict]) -> None:
+    t0 = time.perf_counter()
+    status = 0
+    try:
+        r = await client.post(f"{url}/generate-speech", json={"text": text, "format": fmt})
+        status = r.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    results.append({"latency_s": time.perf_counter() - t0, "status": status})
+
+
+async def run_step(url: str, rate: float, duration: float, sampler: TextSampler, fmt: str,
+                   timeout: float, seed: int, server: Optional[ServerProcess]) -> Dict:
+    rng = random.Random(seed)
+    results: List[Dict] = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    before = server.resource_sample() if server else None
+    t_start = time.perf_counter()
+    peak_rss = 0
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        tasks = []
+        next_at = 0.0
+        while next_at < duration:
+            delay = t_start + next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(_one(client, url, sampler.next(), fmt, results)))
+            if server:
+                sample = server.resource_sample()
+                if sample:
+                    peak_rss = max(peak_rss, sample["rss_bytes"])
+            next_at += rng.expovariate(rate)
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - t_start
+    after = server.resource_sample() if server else None
+
+    latencies = sorted(r["latency_s"] for r in results if r["status"] == 200)
+    errors = [r for r in results if r["status"] != 200]
+    error_kinds: Dict[str, int] = {}
+    for r in errors:
+        error_kinds[str(r["status"])] = error_kinds.get(str(r["status"]), 0) + 1
+
+    def ms(v: Optional[float]) -> Optional[float]:
+        return None if v is None else round(v * 1000.0, 1)
+
+    step = {
+        "target_rps": rate,
+        "sent": len(results),
+        "ok": len(latencies),
+        "errors": error_kinds,
+        "error_rate": round(len(errors) / len(results), 4) if results else 0.0,
+        "achieved_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": ms(_percentile(latencies, 0.50)),
+            "p95": ms(_percentile(latencies, 0.95)),
+            "p99": ms(_percentile(latencies, 0.99)),
+            "max": ms(latencies[-1] if latencies else None),
+        },
+    }
+    if before and after:
+        step["server"] = {
+            "cpu_util": round((after["cpu_s"] - before["cpu_s"]) / elapsed, 3),
+            "peak_rss_mb": round(max(peak_rss, after["rss_bytes"]) / 2 ** 20, 1),
+        }
+    return step
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="target an existing server instead of booting one")
+    parser.add_argument("--rates", type=float, nargs="+", default=[1, 2, 5, 10], help="target requests/second")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per rate step")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout (s)")
+    parser.add_argument("--format", default="opus", help="output format requested")
+    parser.add_argument("--repeat-fraction", type=float, default=0.0, help="share of requests reusing a sent text")
+    parser.add_argument("--slo-ms", type=float, default=5000.0, help="p99 latency objective")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (self-booted server)")
+    parser.add_argument("--tts-latency-ms", type=float, default=150.0)
+    parser.add_argument("--tts-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--detect-latency-ms", type=float, default=5.0)
+    parser.add_argument("--output", default="loadtest_results.json")
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if url is None:
+        server = ServerProcess(args)
+        server.wait_ready()
+        url = server.url
+
+    steps = []
+    try:
+        sampler = TextSampler(args.seed, args.repeat_fraction)
+        for i, rate in enumerate(args.rates):
+            step = asyncio.run(run_step(url, rate, args.duration, sampler, args.format,
+                                        args.timeout, args.seed + i, server))
+            steps.append(step)
+            lat = step["latency_ms"]
+            print(f"rate={rate:>6.1f} rps  sent={step['sent']:>5}  ok={step['ok']:>5}  "
+                  f"err={step['error_rate']:.1%}  p50={lat['p50']}ms  p95={lat['p95']}ms  "
+                  f"p99={lat['p99']}ms  achieved={step['achieved_rps']} rps"
+                  + (f"  cpu={step['server']['cpu_util']}  rss={step['server']['peak_rss_mb']}MB" if "server" in step else ""))
+    finally:
+        if server:
+            server.stop()
+
+    sustainable = [
+        s["target_rps"] for s in steps
+        if s["error_rate"] <= args.max_error_rate and s["latency_ms"]["p99"] is not None
+        and s["latency_ms"]["p99"] <= args.slo_ms
+    ]
+    report = {
+        "config": {
+            "url": args.url or "self-booted (stub backends)",
+            "duration_s": args.duration,
+            "format": args.format,
+            "repeat_fraction": args.repeat_fraction,
+            "seed": args.seed,
+            "workers": args.workers if server else None,
+            "stub_latency_ms": {"tts": args.tts_latency_ms, "tts_jitter": args.tts_jitter_ms,
+                                "detect": args.detect_latency_ms} if server else None,
+            "slo_p99_ms": args.slo_ms,
+            "python": platform.python_version(),
+        },
+        "steps": steps,
+        "max_sustainable_rps": max(sustainable) if sustainable else None,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Max sustainable rate: {report['max_sustainable_rps']} rps (p99 <= {args.slo_ms}ms)")
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
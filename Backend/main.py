@@ -1,44 +1,187 @@
 from pathlib import Path
 import sys
 import os
-import nltk
+import random
+import time
+import asyncio
+import functools
+import json
+import threading
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.requests import HTTPConnection
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+
+# Time-to-ready is measured from here
+_BOOT_T0 = time.perf_counter()
 
 # Ensure the project root is on sys.path
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(PROJECT_ROOT))
 
-# 1. LIFESPAN: This handles heavy tasks AFTER the port is bound
+# 1. LIFESPAN: heavy startup runs on a thread so the port binds immediately
+# (prevents Render's "Port Scan Timeout"); /readyz reports when it is done
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # This prevents Render's "Port Scan Timeout"
-    print("Starting up: Downloading NLTK data...")
+    threading.Thread(target=_start_up, name="startup", daemon=True).start()
+    output_store.start()
+    job_queue.prune(JOB_RETENTION_SECONDS)
+    if job_workers is not None:
+        job_workers.start()
+    yield
+    if job_workers is not None:
+        job_workers.stop()
+    admission.shutdown(wait=False)
+    output_store.stop()
+
+def _start_up():
+    # Load NLTK data and the model from the local bundle, then warm every
+    # stage up. Any failure leaves the app unready instead of half-working.
+    phases = readiness["phases"]
     try:
-        nltk.download("punkt")
-        nltk.download("punkt_tab") # Fixes the 500 error for NLTK 3.9+
-        print("NLTK data downloaded successfully.")
-        
-        # Pre-initialize the AI model so the first request is fast
-        from empathy_engine.emotion_detector import _init_detector
-        _init_detector()
-        print("Emotion detector model loaded.")
+        t0 = time.perf_counter()
+        paths = configure_artifacts(allow_downloads=ALLOW_DOWNLOADS)
+        ensure_nltk(allow_download=ALLOW_DOWNLOADS)
+        phases["nltk"] = time.perf_counter() - t0
+        print(f"Starting up: artifacts {paths}")
+
+        if not STUB_BACKENDS:
+            t0 = time.perf_counter()
+            ensure_model(allow_download=ALLOW_DOWNLOADS)
+            _init_detector()
+            phases["model"] = time.perf_counter() - t0
+            print(f"Emotion detector model loaded in {phases['model']:.2f}s.")
+
+        phases.update({f"warmup_{stage}": s for stage, s in warm_up().items()})
     except Exception as e:
-        print(f"Startup warning: {e}")
-    
-    yield
-    # Shutdown logic goes here if needed
+        readiness["error"] = f"{type(e).__name__}: {e}"
+        readiness["status"] = "failed"
+        print(f"Startup failed: {readiness['error']}")
+        return
+    readiness["time_to_ready_s"] = time.perf_counter() - _BOOT_T0
+    readiness["status"] = "ready"
+    print(f"Ready in {readiness['time_to_ready_s']:.2f}s "
+          f"({', '.join(f'{k} {v:.2f}s' for k, v in phases.items())})")
 
 # 2. APP INITIALIZATION
 app = FastAPI(title="Empathy AI Backend", version="0.1", lifespan=lifespan)
 
 try:
-    from empathy_engine.pipeline import run_pipeline
+    from empathy_engine.pipeline import analyze_text, analysis_etag, PipelineCancelled
+    from empathy_engine.batch import render_batch
+    from empathy_engine.streaming import StreamingSession
+    from empathy_engine.render_pool import RenderPool, PoolSaturated
+    from empathy_engine.admission import AdmissionController, BudgetExceeded, ClientBudgets, estimate_cost
+    from empathy_engine.audio_codec import OUTPUT_FORMATS, negotiate_format, normalize_format
+    from empathy_engine.output_store import OutputStore
+    from empathy_engine import metrics, single_flight, tts_hedge
+    from empathy_engine.profiling import ProfileStore
+    from empathy_engine.stubs import install_from_env
+    from empathy_engine.jobs import JobQueue, JobWorkers, DONE
+    from empathy_engine import emotion_detector
+    from empathy_engine.emotion_detector import _init_detector
+    from empathy_engine.startup import ALLOW_DOWNLOADS, configure_artifacts, ensure_model, ensure_nltk, load_tuning, warm_up
 except Exception as e:
     raise RuntimeError(f"Failed to import empathy_engine.pipeline: {e}")
 
+# Offline stand-ins for load testing: EMPATHY_STUB_BACKENDS=1 swaps in the stub
+# detector and TTS, with simulated latency from the *_LATENCY_MS variables
+synthesize = install_from_env()
+STUB_BACKENDS = synthesize is not None
+
+# Startup reads NLTK data and the model from the local bundle
+# (EMPATHY_ARTIFACTS_DIR, see empathy_engine/startup.py) and never downloads
+# unless EMPATHY_ALLOW_DOWNLOADS=1 (startup.ALLOW_DOWNLOADS); without a
+# bundled model and downloads off, readiness fails with an error saying so
+readiness = {"status": "starting", "error": None, "time_to_ready_s": None, "phases": {}}
+READY_RETRY_AFTER_SECONDS = 5
+
+# Rendered outputs double as a render cache, bounded by idle TTL and total size
+output_store = OutputStore(
+    os.environ.get("EMPATHY_OUTPUT_DIR", "static/audio"),
+    ttl_seconds=float(os.environ.get("EMPATHY_OUTPUT_TTL_SECONDS", 24 * 3600)),
+    max_bytes=int(os.environ.get("EMPATHY_OUTPUT_MAX_BYTES", 1024 ** 3)),
+)
+
+# Admission: requests are costed from their size (empathy_engine/admission.py)
+# and queued fairly per client, keyed by EMPATHY_CLIENT_ID_HEADER (e.g. an API
+# key header set by a gateway) or the client address. EMPATHY_CLIENT_WEIGHTS
+# ("client=2,other=0.5") skews the shares; EMPATHY_CLIENT_BUDGET cost units
+# per client, refilled at EMPATHY_CLIENT_BUDGET_PER_S, caps usage (0 = off).
+# Renders costing EMPATHY_SPLIT_COST or more run as sentence-level units.
+CLIENT_ID_HEADER = os.environ.get("EMPATHY_CLIENT_ID_HEADER", "").lower()
+CLIENT_BUDGET = float(os.environ.get("EMPATHY_CLIENT_BUDGET", 0))
+CLIENT_BUDGET_PER_S = float(os.environ.get("EMPATHY_CLIENT_BUDGET_PER_S", 5))
+# Server processes on this host (uvicorn --workers sets WEB_CONCURRENCY). Each
+# keeps its own pool and budgets, so the cores and every client's budget are
+# split between them; EMPATHY_RENDER_WORKERS / _RENDER_QUEUE are per process
+SERVER_PROCESSES = max(1, int(os.environ.get("WEB_CONCURRENCY") or 1))
+
+def _parse_weights(spec: str) -> dict:
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        client, _, weight = item.rpartition("=")
+        weights[client] = float(weight)
+    return weights
+
+# Pipeline runs happen on a bounded worker pool so the event loop stays free;
+# requests beyond workers + queue get 429 straight away
+render_pool = RenderPool(
+    max_workers=int(os.environ.get("EMPATHY_RENDER_WORKERS", min(4, max(1, (os.cpu_count() or 1) // SERVER_PROCESSES)))),
+    max_queue=int(os.environ.get("EMPATHY_RENDER_QUEUE", 16)),
+    weights=_parse_weights(os.environ.get("EMPATHY_CLIENT_WEIGHTS", "")),
+)
+admission = AdmissionController(
+    render_pool,
+    budgets=(ClientBudgets(CLIENT_BUDGET / SERVER_PROCESSES, CLIENT_BUDGET_PER_S / SERVER_PROCESSES)
+             if CLIENT_BUDGET > 0 else None),
+    split_cost=float(os.environ.get("EMPATHY_SPLIT_COST", 40)),
+    coordinator=RenderPool(max_workers=int(os.environ.get("EMPATHY_SPLIT_RENDERS", 2)), max_queue=render_pool.max_queue),
+)
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("EMPATHY_REQUEST_TIMEOUT_SECONDS", 120))
+# A batch occupies one pool slot and fans its TTS out over its own threads
+BATCH_MAX_TEXTS = int(os.environ.get("EMPATHY_BATCH_MAX_TEXTS", 500))
+BATCH_CONCURRENCY = int(os.environ.get("EMPATHY_BATCH_CONCURRENCY", 8))
+BATCH_TIMEOUT_SECONDS = float(os.environ.get("EMPATHY_BATCH_TIMEOUT_SECONDS", 600))
+# Live sessions on /ws/speech; each renders one sentence at a time
+STREAM_MAX_SESSIONS = int(os.environ.get("EMPATHY_STREAM_MAX_SESSIONS", 32))
+stream_sessions = 0
+DISCONNECT_POLL_SECONDS = 0.5
+
+# Audio is served from content-hashed URLs that never change meaning. Behind
+# nginx, set EMPATHY_ACCEL_REDIRECT_PREFIX to the internal location mapped to
+# the output dir so nginx streams the file (sendfile, ranges) instead of Python
+AUDIO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+ACCEL_REDIRECT_PREFIX = os.environ.get("EMPATHY_ACCEL_REDIRECT_PREFIX", "").rstrip("/")
+
+# Job API for long documents: jobs persist in SQLite and are rendered by
+# EMPATHY_JOB_WORKERS worker processes (0 = queue only, run workers elsewhere).
+# The default database sits in the project root, wherever the server starts
+JOB_DB = os.environ.get("EMPATHY_JOB_DB", str(PROJECT_ROOT / "jobs" / "jobs.sqlite3"))
+JOB_RETENTION_SECONDS = float(os.environ.get("EMPATHY_JOB_RETENTION_SECONDS", 7 * 24 * 3600))
+job_queue = JobQueue(JOB_DB, max_attempts=int(os.environ.get("EMPATHY_JOB_MAX_ATTEMPTS", 3)))
+JOB_WORKER_COUNT = int(os.environ.get("EMPATHY_JOB_WORKERS", 2))
+job_workers = JobWorkers(JOB_DB, output_store.root, processes=JOB_WORKER_COUNT) if JOB_WORKER_COUNT > 0 else None
+
+# Opt-in profiling: EMPATHY_PROFILING=1 honours the X-Empathy-Profile header /
+# ?profile=1 flag, EMPATHY_PROFILE_SAMPLE_RATE profiles a random fraction and
+# /debug/profiles serves the results. Without it nothing is profiled or mounted.
+PROFILING_ENABLED = os.environ.get("EMPATHY_PROFILING", "0").lower() in ("1", "true", "yes", "on")
+PROFILE_SAMPLE_RATE = float(os.environ.get("EMPATHY_PROFILE_SAMPLE_RATE", 0.0))
+profile_store = ProfileStore(
+    os.environ.get("EMPATHY_PROFILE_DIR", str(PROJECT_ROOT / "profiles")),
+    max_profiles=int(os.environ.get("EMPATHY_PROFILE_MAX", 50)),
+) if PROFILING_ENABLED else None
+
+def _should_profile(request: Request) -> bool:
+    if not PROFILING_ENABLED:
+        return False
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return True
+    flag = request.headers.get("x-empathy-profile") or request.query_params.get("profile") or ""
+    return flag.lower() in ("1", "true", "yes", "on")
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://127.0.0.1:3000", "https://empathy-ai-3iiy.onrender.com"],
@@ -47,31 +190,467 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.get("/livez")
+def livez():
+    # The process is up and serving; says nothing about the model
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    if readiness["status"] != "ready":
+        return JSONResponse(
+            status_code=503,
+            content={k: readiness[k] for k in ("status", "error")},
+            headers={"Retry-After": str(READY_RETRY_AFTER_SECONDS)},
+        )
+    return readiness
+
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    # Kept for existing health checks; same as /readyz
+    return readyz()
+
+def _require_ready():
+    if readiness["status"] != "ready":
+        raise HTTPException(
+            status_code=503,
+            detail=f"service is {readiness['status']}",
+            headers={"Retry-After": str(READY_RETRY_AFTER_SECONDS)},
+        )
+
+@app.get("/cache/stats")
+def cache_stats():
+    return output_store.stats()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    # Stage histograms and counters from the pipeline, plus output store gauges
+    store = output_store.stats()
+    gauges = {f"output_store_{k}": store[k] for k in ("hits", "misses", "hit_rate", "entries", "bytes_stored", "evictions")}
+    pool = render_pool.stats()
+    gauges.update({f"render_pool_{k}": pool[k] for k in ("workers", "running", "queued", "rejected")})
+    gauges["stream_sessions"] = stream_sessions
+    gauges.update({f"admission_{k}": v for k, v in admission.stats().items()})
+    # Identical in-flight work being shared (totals are the *_coalesced counters)
+    gauges.update({f"coalesce_{name}_in_flight": s["in_flight"] for name, s in single_flight.all_stats().items()})
+    # TTS attempts still running, including abandoned ones (hedge losers, deadline misses)
+    gauges["tts_attempts_in_flight"] = tts_hedge.stats()["attempts_in_flight"]
+    gauges.update({f"jobs_{status}": n for status, n in job_queue.counts().items()})
+    gauges["startup_ready"] = int(readiness["status"] == "ready")
+    if readiness["time_to_ready_s"] is not None:
+        gauges["startup_time_to_ready_seconds"] = readiness["time_to_ready_s"]
+    gauges.update({f"startup_{phase}_seconds": s for phase, s in readiness["phases"].items()})
+    # Detector settings in effect (from the tuning profile or environment)
+    gauges["detector_batch_size"] = emotion_detector.DETECT_BATCH_SIZE
+    gauges["detector_torch_threads"] = emotion_detector.TORCH_THREADS or 0
+    return PlainTextResponse(
+        metrics.REGISTRY.render_prometheus(gauges),
+        media_type="text/plain; version=0.0.4",
+    )
+
+if PROFILING_ENABLED:
+    @app.get("/debug/profiles")
+    def list_profiles(limit: int = 20):
+        # Recent profiled requests plus the hottest functions across all of them
+        profiles = []
+        for profile_id in reversed(profile_store.list_ids()):
+            summary = profile_store.summary(profile_id) or {}
+            profiles.append({k: summary.get(k) for k in ("id", "label", "wall_s", "peak_bytes", "error")})
+        return {"profiles": profiles, "hot_functions": profile_store.hot_functions(limit)}
+
+    @app.get("/debug/profiles/{profile_id}")
+    def get_profile(profile_id: str):
+        summary = profile_store.summary(profile_id)
+        if summary is None:
+            raise HTTPException(status_code=404, detail="profile not found")
+        return summary
+
+    @app.get("/debug/profiles/{profile_id}/prof")
+    def download_profile(profile_id: str):
+        path = profile_store.prof_path(profile_id)
+        if path is None:
+            raise HTTPException(status_code=404, detail="profile not found")
+        return FileResponse(path=path, media_type="application/octet-stream", filename=Path(path).name)
+
+_AUDIO_EXTENSIONS = {spec["extension"] for spec in OUTPUT_FORMATS.values()}
+_AUDIO_MEDIA_TYPES = {spec["extension"]: spec["media_type"] for spec in OUTPUT_FORMATS.values()}
+
+def _audio_url(path: str) -> str:
+    return f"/audio/{Path(path).name}"
+
+def _render_body(result: dict) -> dict:
+    # JSON view of a stored render: metadata plus the URL of its audio
+    body = {k: v for k, v in result.items() if k not in ("output_audio_path", "sentence_audio_paths", "cache_hit")}
+    body["audio_url"] = _audio_url(result["output_audio_path"])
+    return body
+
+def _output_options(request: Request, payload: dict):
+    # Output encoding: explicit `format`/`bitrate` (body or query) wins over Accept.
+    # A body value is used whenever present, so `"bitrate": 0` is rejected, not ignored
+    requested = payload["format"] if payload.get("format") is not None else request.query_params.get("format")
+    bitrate = payload["bitrate"] if payload.get("bitrate") is not None else request.query_params.get("bitrate")
+    if requested is not None and not isinstance(requested, str):
+        raise HTTPException(status_code=400, detail="format must be a string")
+    if isinstance(bitrate, bool):
+        raise HTTPException(status_code=400, detail="bitrate must be a positive number of kbps")
+    try:
+        output_format = normalize_format(requested) if requested else negotiate_format(request.headers.get("accept"))
+        bitrate = float(bitrate) if bitrate is not None else None
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if bitrate is not None and not 0 < bitrate < float("inf"):
+        raise HTTPException(status_code=400, detail="bitrate must be a positive number of kbps")
+    return output_format, bitrate
+
+async def _cancel_on_disconnect(request: Request, cancel: threading.Event) -> None:
+    while not cancel.is_set():
+        if await request.is_disconnected():
+            print("Client disconnected, cancelling pipeline run")
+            cancel.set()
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+def _client_id(conn: HTTPConnection) -> str:
+    if CLIENT_ID_HEADER and conn.headers.get(CLIENT_ID_HEADER):
+        return conn.headers[CLIENT_ID_HEADER]
+    return conn.client.host if conn.client else ""
+
+async def _run_on_pool(request: Request, timeout: float, submit, *args, **kwargs):
+    """Run `submit(*args, cancel=event, **kwargs)`'s future, mapping failures to HTTP errors.
+
+    `submit` is an `admission` method bound to the client and cost.
+    """
+    cancel = threading.Event()
+    try:
+        future = submit(*args, cancel=cancel, **kwargs)
+    except BudgetExceeded as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Usage budget exceeded, please retry later",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except PoolSaturated as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Server is busy, please retry later",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    # Stop the run at the next sentence if the client goes away or time runs out
+    watcher = asyncio.create_task(_cancel_on_disconnect(request, cancel))
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+    except asyncio.TimeoutError:
+        cancel.set()
+        raise HTTPException(status_code=504, detail=f"Speech generation timed out after {timeout:g}s")
+    except PipelineCancelled:
+        # The client is gone; this status only shows up in logs
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except Exception as e:
+        # Logs the actual error to Render console for you to see
+        print(f"Error in pipeline: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate speech: {e}")
+    finally:
+        watcher.cancel()
 
 @app.post("/generate-speech")
 async def generate_speech(request: Request):
+    _require_ready()
     payload = await request.json()
     text = payload.get("text") if isinstance(payload, dict) else None
     
     if not text or not isinstance(text, str) or not text.strip():
         raise HTTPException(status_code=400, detail="'text' must be a non-empty string")
 
-    try:
-        # Now run_pipeline won't crash because NLTK is already there
-        result = run_pipeline(text)
-    except Exception as e:
-        # Logs the actual error to Render console for you to see
-        print(f"Error in pipeline: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to generate speech: {e}")
+    output_format, bitrate = _output_options(request, payload)
+
+    result = await _run_on_pool(
+        request,
+        REQUEST_TIMEOUT_SECONDS,
+        functools.partial(admission.submit_render, _client_id(request)),
+        text,
+        output_dir=output_store.root,
+        synthesize=synthesize,
+        output_format=output_format,
+        bitrate_kbps=bitrate,
+        store=output_store,
+        profiler=profile_store if _should_profile(request) else None,
+    )
 
     out_path = result.get("output_audio_path")
     if not out_path or not os.path.exists(out_path):
         raise HTTPException(status_code=500, detail="Audio file was not created")
 
-    return FileResponse(path=out_path, media_type="audio/wav", filename=Path(out_path).name)
+    headers = {"Vary": "Accept", "X-Cache": "HIT" if result.get("cache_hit") else "MISS"}
+    if result.get("profile_id"):
+        headers["X-Empathy-Profile-Id"] = result["profile_id"]
+    if result.get("degraded_sentences"):
+        # Some sentences came from the TTS fallback; the render was not cached
+        headers["X-Empathy-Degraded"] = str(len(result["degraded_sentences"]))
+    return JSONResponse(content=_render_body(result), headers=headers)
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison: ignore W/ prefixes
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return any((t[2:] if t.startswith("W/") else t) == etag for t in tags)
+
+async def _analyze(request: Request, text):
+    _require_ready()
+    if not text or not isinstance(text, str) or not text.strip():
+        raise HTTPException(status_code=400, detail="'text' must be a non-empty string")
+
+    # The ETag is known before any model work, so revalidation is free
+    etag = analysis_etag(text)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        metrics.count("analysis_not_modified")
+        return Response(status_code=304, headers=headers)
+
+    submit = functools.partial(admission.submit, _client_id(request), estimate_cost(text, tts=False))
+    result = await _run_on_pool(request, REQUEST_TIMEOUT_SECONDS, submit, analyze_text, text, store=output_store)
+    headers["X-Cache"] = "HIT" if result.pop("cache_hit") else "MISS"
+    return JSONResponse(content=result, headers=headers)
+
+@app.get("/analyze")
+async def analyze_get(request: Request, text: str = ""):
+    return await _analyze(request, text)
+
+@app.post("/analyze")
+async def analyze_post(request: Request):
+    # Same as GET for texts too long for a query string; honours If-None-Match too
+    payload = await request.json()
+    return await _analyze(request, payload.get("text") if isinstance(payload, dict) else None)
+
+@app.post("/generate-speech/batch")
+async def generate_speech_batch(request: Request):
+    _require_ready()
+    payload = await request.json()
+    texts = payload.get("texts") if isinstance(payload, dict) else None
+
+    if not isinstance(texts, list) or not texts:
+        raise HTTPException(status_code=400, detail="'texts' must be a non-empty list of strings")
+    if len(texts) > BATCH_MAX_TEXTS:
+        raise HTTPException(status_code=413, detail=f"at most {BATCH_MAX_TEXTS} texts per batch")
+    for i, text in enumerate(texts):
+        if not isinstance(text, str) or not text.strip():
+            raise HTTPException(status_code=400, detail=f"texts[{i}] must be a non-empty string")
+
+    output_format, bitrate = _output_options(request, payload)
+    submit = functools.partial(admission.submit, _client_id(request), sum(estimate_cost(t) for t in texts))
+    batch = await _run_on_pool(
+        request,
+        BATCH_TIMEOUT_SECONDS,
+        submit,
+        render_batch,
+        texts,
+        output_dir=output_store.root,
+        synthesize=synthesize,
+        output_format=output_format,
+        bitrate_kbps=bitrate,
+        store=output_store,
+        concurrency=BATCH_CONCURRENCY,
+    )
+
+    # Manifest: per-text audio URL and analysis, or the error for that text
+    items = []
+    for item in batch["items"]:
+        if "error" in item:
+            items.append({"index": item["index"], "status": "error", "error": item["error"]})
+            continue
+        entry = _render_body(item)
+        entry.update(status="ok", cache_hit=item.get("cache_hit", False))
+        items.append(entry)
+    return {
+        "output_format": output_format,
+        "items": items,
+        "failed": sum(1 for i in items if i["status"] == "error"),
+        "stats": batch["stats"],
+    }
+
+@app.websocket("/ws/speech")
+async def speech_stream(websocket: WebSocket):
+    """Incremental text in, per-sentence audio out.
+
+    Client frames are JSON: `{"type": "text", "text": delta}` (plain text
+    frames work too), `{"type": "flush"}` to speak a pending partial
+    sentence, `{"type": "end"}` to finish. For each completed sentence the
+    server sends a JSON `{"type": "sentence", ...}` frame with the emotion
+    metadata, running base_pitch and `latency_s` from completion, followed
+    by one binary frame with the encoded audio (`?format=`, default opus).
+    Binary client frames get a `{"type": "error"}` frame back.
+    """
+    global stream_sessions
+    try:
+        output_format = normalize_format(websocket.query_params.get("format") or "opus")
+        bitrate = websocket.query_params.get("bitrate")
+        bitrate = float(bitrate) if bitrate is not None else None
+        if bitrate is not None and not 0 < bitrate < float("inf"):
+            raise ValueError("bitrate must be a positive number of kbps")
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    if readiness["status"] != "ready" or stream_sessions >= STREAM_MAX_SESSIONS:
+        await websocket.close(code=1013, reason="server is busy or starting, please retry later")
+        return
+
+    await websocket.accept()
+    stream_sessions += 1
+    session = StreamingSession(synthesize, output_format, bitrate, output_dir=output_store.root)
+    # Completed sentences, rendered in order by one task while more text arrives
+    pending: asyncio.Queue = asyncio.Queue()
+    sender = asyncio.create_task(_stream_sentences(websocket, session, _client_id(websocket), pending))
+    try:
+        while True:
+            received = await websocket.receive()
+            if received["type"] == "websocket.disconnect":
+                break
+            frame = received.get("text")
+            if frame is None:
+                # Binary frames are not part of the protocol; the session stays open
+                await websocket.send_json({"type": "error", "detail": "binary frames are not supported, send text"})
+                continue
+            try:
+                message = json.loads(frame)
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                # Plain text, including frames that happen to parse as JSON ("42", "true")
+                message = {"type": "text", "text": frame}
+            kind = message.get("type")
+            if kind == "text":
+                sentences = session.feed(str(message.get("text", "")))
+            elif kind in ("flush", "end"):
+                sentences = session.flush()
+            else:
+                await websocket.send_json({"type": "error", "detail": f"unknown message type {kind!r}"})
+                continue
+            completed_at = time.perf_counter()
+            for sentence in sentences:
+                pending.put_nowait((sentence, completed_at))
+            if kind == "end":
+                pending.put_nowait(None)
+                await sender
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        session.close()
+        stream_sessions -= 1
+
+async def _stream_sentences(websocket: WebSocket, session, client: str, pending: asyncio.Queue) -> None:
+    while True:
+        item = await pending.get()
+        if item is None:
+            await websocket.send_json({"type": "done", "base_pitch": session.prosody.base_pitch})
+            return
+        sentence, completed_at = item
+        try:
+            future = admission.submit_unit(client, estimate_cost(sentence), session.render, sentence)
+            out = await asyncio.wrap_future(future)
+        except PoolSaturated as e:
+            await websocket.send_json({"type": "error", "sentence": sentence, "detail": str(e), "retry_after": e.retry_after})
+            continue
+        except Exception as e:
+            print(f"Error in speech stream: {e}")
+            await websocket.send_json({"type": "error", "sentence": sentence, "detail": f"Failed to render sentence: {e}"})
+            continue
+        audio = out.pop("audio")
+        out.update(type="sentence", bytes=len(audio), latency_s=time.perf_counter() - completed_at)
+        await websocket.send_json(out)
+        await websocket.send_bytes(audio)
+        if metrics.enabled():
+            metrics.REGISTRY.observe_stage("stream_first_audio", time.perf_counter() - completed_at, 0.0)
+
+@app.get("/audio/{name}")
+def get_audio(name: str, download: bool = False):
+    # Only content-addressed audio files of the store root: <sha256>.<ext>
+    stem, _, ext = name.rpartition(".")
+    if len(stem) != 64 or ext not in _AUDIO_EXTENSIONS or not all(c in "0123456789abcdef" for c in stem):
+        raise HTTPException(status_code=404, detail="audio not found")
+    path = os.path.join(output_store.root, name)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="audio not found")
+
+    # The name is the hash of the bytes, so the response can be cached forever
+    headers = {"Cache-Control": AUDIO_CACHE_CONTROL, "ETag": f'"{stem}"'}
+    if ACCEL_REDIRECT_PREFIX:
+        headers["X-Accel-Redirect"] = f"{ACCEL_REDIRECT_PREFIX}/{name}"
+        headers["Content-Type"] = _AUDIO_MEDIA_TYPES[ext]
+        if download:
+            headers["Content-Disposition"] = f'attachment; filename="{name}"'
+        return Response(headers=headers)
+    # FileResponse answers Range requests with 206 and uses zero-copy
+    # http.response.pathsend on ASGI servers that support it
+    return FileResponse(
+        path=path,
+        media_type=_AUDIO_MEDIA_TYPES[ext],
+        filename=name,
+        content_disposition_type="attachment" if download else "inline",
+        headers=headers,
+    )
+
+@app.post("/jobs")
+async def create_job(request: Request):
+    payload = await request.json()
+    text = payload.get("text") if isinstance(payload, dict) else None
+
+    if not text or not isinstance(text, str) or not text.strip():
+        raise HTTPException(status_code=400, detail="'text' must be a non-empty string")
+
+    output_format, bitrate = _output_options(request, payload)
+    job_id = job_queue.submit(text, {"output_format": output_format, "bitrate_kbps": bitrate})
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/jobs/{job_id}",
+            "audio_url": f"/jobs/{job_id}/audio",
+        },
+        headers={"Location": f"/jobs/{job_id}"},
+    )
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    # Analysis summary plus the content-addressed URL of the audio
+    result = _render_body(job["result"]) if job["result"] else None
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "attempts": job["attempts"],
+        "max_attempts": job["max_attempts"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "result": result,
+    }
+
+@app.get("/jobs/{job_id}/audio")
+def get_job_audio(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    if job["status"] != DONE:
+        raise HTTPException(status_code=409, detail=f"job is {job['status']}")
+    out_path = job["result"].get("output_audio_path")
+    if not out_path or not os.path.exists(out_path):
+        # Evicted from the output store since the job finished
+        raise HTTPException(status_code=410, detail="job audio has expired")
+    return FileResponse(
+        path=out_path,
+        media_type=job["result"].get("media_type", "audio/wav"),
+        filename=Path(out_path).name,
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -81,4 +660,21 @@ if __name__ == "__main__":
     # 2. Default to 8000 ONLY if we are running locally
     port = int(os.environ.get("PORT", 8000))
 
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    # Worker processes: WEB_CONCURRENCY, else the tuning profile's best count
+    # (python -m empathy_engine.autotune); more than one needs the import string
+    profile = load_tuning() or {}
+    workers = int(os.environ.get("WEB_CONCURRENCY") or profile.get("workers") or 1)
+    if workers > 1:
+        # Server processes split the cores (emotion_detector) and client budgets
+        os.environ["WEB_CONCURRENCY"] = str(workers)
+        # Job workers run once, from this supervisor; server processes only queue
+        os.environ["EMPATHY_JOB_WORKERS"] = "0"
+        if job_workers is not None:
+            job_workers.start()
+        try:
+            uvicorn.run("Backend.main:app", host="0.0.0.0", port=port, workers=workers)
+        finally:
+            if job_workers is not None:
+                job_workers.stop()
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
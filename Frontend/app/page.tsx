@@ -27,17 +27,18 @@ export default function Home() {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ text: input }),
+        // Compressed output: ~10x fewer bytes than WAV over slow links
+        body: JSON.stringify({ text: input, format: 'mp3' }),
       });
 
       if (!response.ok) {
         throw new Error('Failed to generate speech');
       }
 
-      // Assuming your FastAPI returns audio blob
-      const audioBlob = await response.blob();
-      const url = URL.createObjectURL(audioBlob);
-      setAudioUrl(url);
+      // The backend returns metadata plus a cacheable URL; the player streams
+      // from it with range requests instead of downloading a blob up front
+      const result = await response.json();
+      setAudioUrl(`${backendUrl}${result.audio_url}`);
     } catch (err) {
       setError(err instanceof Error ? err.message : 'An error occurred');
       console.error('Error:', err);
@@ -47,9 +48,6 @@ export default function Home() {
   };
 
   const handleClearAudio = () => {
-    if (audioUrl) {
-      URL.revokeObjectURL(audioUrl);
-    }
     setAudioUrl(null);
     setInput('');
   };
@@ -58,9 +58,11 @@ export default function AudioPlayer({ audioUrl, onClear }: AudioPlayerProps) {
   };
 
   const downloadAudio = () => {
+    // download=1 makes the backend send Content-Disposition: attachment,
+    // since the download attribute is ignored for cross-origin URLs
     const a = document.createElement('a');
-    a.href = audioUrl;
-    a.download = 'speech.mp3';
+    a.href = `${audioUrl}?download=1`;
+    a.download = audioUrl.split('/').pop() || 'speech.mp3';
     document.body.appendChild(a);
     a.click();
     document.body.removeChild(a);
@@ -81,9 +83,12 @@ export default function AudioPlayer({ audioUrl, onClear }: AudioPlayerProps) {
           : 'opacity-0 scale-95 translate-y-4'
       }`}
     >
+      {/* preload="metadata" fetches only the header; playback and seeking
+          then request just the byte ranges they need */}
       <audio
         ref={audioRef}
         src={audioUrl}
+        preload="metadata"
         onTimeUpdate={handleTimeUpdate}
         onLoadedMetadata={handleLoadedMetadata}
         onEnded={handleEnded}
@@ -0,0 +1,6 @@
+"""`python -m empathy_engine`: offline bulk rendering, see `bulk`."""
+import sys
+
+from .bulk import main
+
+sys.exit(main())
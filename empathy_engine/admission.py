@@ -0,0 +1,182 @@
+"""Cost-aware admission of render requests onto a fair RenderPool.
+
+ - estimate_cost(text): work estimate in cost units (about one short
+   sentence each) from sentence and character counts, before any model runs
+ - ClientBudgets: per-client token buckets of cost units; a request that
+   does not fit raises BudgetExceeded with a `retry_after`
+ - AdmissionController: charges the budget, then schedules the call on the
+   RenderPool under the client's fair share. Renders costing at least
+   `split_cost` are split into sentence-level work units: their analysis and
+   each sentence's TTS are queued separately, so a long document
+   interleaves with other clients' short requests instead of holding a
+   worker for its whole run
+"""
+import functools
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+try:
+    from .pipeline import analyze_text, run_pipeline
+    from .render_pool import PoolSaturated, RenderPool
+    from .tts_engine import synthesize_sentence
+    from . import metrics
+except ImportError:
+    from pipeline import analyze_text, run_pipeline
+    from render_pool import PoolSaturated, RenderPool
+    from tts_engine import synthesize_sentence
+    import metrics
+
+
+# One unit per sentence (TTS round trip, model call share) plus one per
+# CHARS_PER_UNIT characters of text (audio length, modulation and encoding);
+# analysis alone costs ANALYSIS_SENTENCE_COST per sentence plus the characters
+SENTENCE_COST = 1.0
+ANALYSIS_SENTENCE_COST = 0.2
+CHARS_PER_UNIT = 200.0
+
+_SENTENCE_END = re.compile(r"[.!?]+(?=\s|$)")
+
+
+def estimate_cost(text: str, tts: bool = True) -> float:
+    """Estimated cost of rendering `text` (or only analysing it), in cost units."""
+    sentences = max(1, len(_SENTENCE_END.findall(text.strip())))
+    per_sentence = SENTENCE_COST if tts else ANALYSIS_SENTENCE_COST
+    return sentences * per_sentence + len(text) / CHARS_PER_UNIT
+
+
+class BudgetExceeded(PoolSaturated):
+    """The client has used up its cost budget for now."""
+
+    def __init__(self, retry_after: int):
+        Exception.__init__(self, f"client cost budget exceeded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class ClientBudgets:
+    """Token bucket per client: `capacity` cost units refilled at `refill_per_s`.
+
+    A request is admitted once the bucket holds its cost, or is full for
+    requests larger than `capacity`; the bucket may then go negative, so
+    very large requests push the client's next ones back accordingly.
+    """
+
+    # Buckets kept before full (idle) ones are forgotten
+    MAX_TRACKED_CLIENTS = 4096
+
+    def __init__(self, capacity: float, refill_per_s: float):
+        self.capacity = float(capacity)
+        self.refill_per_s = float(refill_per_s)
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, list] = {}  # client -> [tokens, updated]
+        self._rejected = 0
+
+    def _level(self, client: str, now: float) -> float:
+        tokens, updated = self._buckets.get(client, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated) * self.refill_per_s)
+
+    def charge(self, client: str, cost: float) -> None:
+        """Take `cost` from `client`'s bucket or raise BudgetExceeded."""
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._level(client, now)
+            needed = min(cost, self.capacity)
+            if tokens < needed:
+                self._rejected += 1
+                metrics.count("budget_rejected")
+                raise BudgetExceeded(max(1, int((needed - tokens) / self.refill_per_s + 0.999)))
+            if len(self._buckets) >= self.MAX_TRACKED_CLIENTS and client not in self._buckets:
+                self._buckets = {c: b for c, b in self._buckets.items() if self._level(c, now) < self.capacity}
+            self._buckets[client] = [tokens - cost, now]
+
+    def refund(self, client: str, cost: float) -> None:
+        """Give back `cost` charged for a request that was turned away after all."""
+        now = time.monotonic()
+        with self._lock:
+            if client in self._buckets:
+                self._buckets[client] = [min(self.capacity, self._level(client, now) + cost), now]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"clients": len(self._buckets), "rejected": self._rejected}
+
+
+class AdmissionController:
+    """Budgeted, fair-queued access to a RenderPool; see module docstring.
+
+    Split renders are coordinated on `coordinator`, a small pool of its own:
+    its threads only wait on work units, and it bounds how many split
+    renders are in progress at once.
+    """
+
+    def __init__(self, pool: RenderPool, budgets: Optional[ClientBudgets] = None,
+                 split_cost: Optional[float] = None, coordinator: Optional[RenderPool] = None):
+        self.pool = pool
+        self.budgets = budgets
+        self.split_cost = split_cost
+        self.coordinator = coordinator or RenderPool(max_workers=2, max_queue=pool.max_queue)
+
+    def submit(self, client: str, cost: float, fn: Callable, *args, **kwargs) -> Future:
+        """Charge `cost` to `client` and schedule `fn(*args, **kwargs)` as one unit."""
+        return self._admit(client, cost, lambda: self.pool.schedule(fn, args, kwargs, client=client, cost=cost))
+
+    def submit_unit(self, client: str, cost: float, fn: Callable, *args, **kwargs) -> Future:
+        """submit() for a unit of an already admitted request, e.g. one sentence
+        of a stream: charged to the budget but not bounded by the queue limit."""
+        return self._admit(
+            client, cost, lambda: self.pool.schedule(fn, args, kwargs, client=client, cost=cost, bounded=False)
+        )
+
+    def _admit(self, client: str, cost: float, schedule: Callable[[], Future]) -> Future:
+        # Charged first so over-budget requests never queue; refunded when
+        # the pool turns the request away (PoolSaturated)
+        if self.budgets is not None:
+            self.budgets.charge(client, cost)
+        try:
+            future = schedule()
+        except PoolSaturated:
+            if self.budgets is not None:
+                self.budgets.refund(client, cost)
+            raise
+        metrics.count("admitted_cost", cost)
+        return future
+
+    def submit_render(self, client: str, text: str, **kwargs) -> Future:
+        """run_pipeline(text, **kwargs) for `client`, split into units when large."""
+        cost = estimate_cost(text)
+        if self.split_cost is None or cost < self.split_cost:
+            return self.submit(client, cost, run_pipeline, text, **kwargs)
+        future = self._admit(client, cost, lambda: self.coordinator.submit(self._render_split, client, text, **kwargs))
+        metrics.count("renders_split")
+        return future
+
+    def _render_split(self, client: str, text: str, synthesize: Optional[Callable[[str, str], str]] = None,
+                      store=None, cancel: Optional[threading.Event] = None, **kwargs) -> Dict:
+        # Analysis first, as its own unit; with a store, run_pipeline then reuses it
+        if store is not None:
+            self._unit(client, estimate_cost(text, tts=False), analyze_text, text, store=store, cancel=cancel)
+        synthesize = synthesize or synthesize_sentence
+
+        # Keeps the TTS function's identity (part of the render cache key) and
+        # its native prosody controls
+        @functools.wraps(synthesize)
+        def synthesize_unit(sentence: str, output_path: str, *voice_params) -> str:
+            cost = SENTENCE_COST + len(sentence) / CHARS_PER_UNIT
+            return self._unit(client, cost, synthesize, sentence, output_path, *voice_params)
+
+        return run_pipeline(text, synthesize=synthesize_unit, store=store, cancel=cancel, **kwargs)
+
+    def _unit(self, client: str, cost: float, fn: Callable, *args, **kwargs):
+        return self.pool.schedule(fn, args, kwargs, client=client, cost=cost, bounded=False).result()
+
+    def stats(self) -> Dict:
+        stats = {"split_running": self.coordinator.stats()["running"]}
+        if self.budgets is not None:
+            stats.update({f"budget_{k}": v for k, v in self.budgets.stats().items()})
+        return stats
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.coordinator.shutdown(wait=wait)
+        self.pool.shutdown(wait=wait)
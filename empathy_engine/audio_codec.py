@@ -0,0 +1,145 @@
+"""Output encodings for rendered speech.
+
+Compressed formats are encoded in-process through libsndfile (via
+`soundfile`), so no ffmpeg process is spawned per request.
+
+Formats:
+ - `wav`:  16-bit PCM (default, uncompressed)
+ - `flac`: lossless, typically ~50-60% of WAV
+ - `opus`: Ogg/Opus, speech-friendly at 24-48 kbps
+ - `mp3`:  MPEG Layer III, widest browser support
+"""
+from typing import Dict, Optional
+
+from pydub import AudioSegment
+
+
+OUTPUT_FORMATS: Dict[str, Dict] = {
+    "wav":  {"container": "WAV",  "subtype": "PCM_16",         "media_type": "audio/wav",  "extension": "wav"},
+    "flac": {"container": "FLAC", "subtype": "PCM_16",         "media_type": "audio/flac", "extension": "flac"},
+    "opus": {"container": "OGG",  "subtype": "OPUS",           "media_type": "audio/ogg",  "extension": "opus"},
+    "mp3":  {"container": "MP3",  "subtype": "MPEG_LAYER_III", "media_type": "audio/mpeg", "extension": "mp3"},
+}
+
+DEFAULT_BITRATE_KBPS: Dict[str, int] = {"opus": 32, "mp3": 64}
+
+# Media types accepted in `Accept` headers -> format name
+_MEDIA_TYPE_FORMATS = {
+    "audio/wav": "wav",
+    "audio/wave": "wav",
+    "audio/x-wav": "wav",
+    "audio/flac": "flac",
+    "audio/x-flac": "flac",
+    "audio/ogg": "opus",
+    "audio/opus": "opus",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+}
+
+# Opus only encodes at these rates; anything else is resampled to 48 kHz
+_OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def normalize_format(fmt: Optional[str]) -> str:
+    """Return a canonical format name; raises ValueError for unknown formats."""
+    name = (fmt or "wav").strip().lower()
+    if name == "ogg":
+        name = "opus"
+    if name not in OUTPUT_FORMATS:
+        raise ValueError(f"unsupported output format {fmt!r}; expected one of {sorted(OUTPUT_FORMATS)}")
+    return name
+
+
+def negotiate_format(accept: Optional[str], default: str = "wav") -> str:
+    """Pick an output format from an HTTP `Accept` header.
+
+    Highest q-value wins; ties keep header order. Wildcards and headers
+    with no supported audio type fall back to `default`.
+    """
+    if not accept:
+        return default
+
+    best = None
+    best_q = 0.0
+    for part in accept.split(","):
+        fields = [f.strip() for f in part.split(";")]
+        media_type = fields[0].lower()
+        q = 1.0
+        for f in fields[1:]:
+            if f.lower().startswith("q="):
+                try:
+                    q = float(f[2:])
+                except ValueError:
+                    q = 0.0
+        if media_type in ("*/*", "audio/*"):
+            fmt = default
+        else:
+            fmt = _MEDIA_TYPE_FORMATS.get(media_type)
+        if fmt is not None and q > best_q:
+            best, best_q = fmt, q
+    return best or default
+
+
+def _compression_level(fmt: str, bitrate_kbps: float, frame_rate: int, channels: int) -> float:
+    """Map a target bitrate onto libsndfile's 0..1 compression level.
+
+    libsndfile spreads the level linearly across each codec's bitrate range
+    (Opus: 6-256 kbps per channel; MP3: 32-320 kbps for MPEG-1 rates,
+    8-160 kbps for MPEG-2 rates below 32 kHz).
+    """
+    if fmt == "opus":
+        lo, hi = 6.0 * channels, 256.0 * channels
+        top = 1.0
+    else:
+        lo, hi = (32.0, 320.0) if frame_rate >= 32000 else (8.0, 160.0)
+        top = 0.99  # libsndfile rejects 1.0 for MP3
+    level = (hi - bitrate_kbps) / (hi - lo)
+    return max(0.0, min(top, level))
+
+
+def export_audio(
+    audio: AudioSegment,
+    output_path: str,
+    fmt: str = "wav",
+    bitrate_kbps: Optional[float] = None,
+) -> str:
+    """Encode `audio` to `output_path` in `fmt`. Returns `output_path`.
+
+    `bitrate_kbps` applies to `opus`/`mp3` only (defaults in
+    DEFAULT_BITRATE_KBPS); it is ignored for lossless formats.
+    """
+    fmt = normalize_format(fmt)
+    if fmt == "wav":
+        audio.export(output_path, format="wav")
+        return output_path
+
+    try:
+        import numpy as np
+        import soundfile as sf
+    except Exception as e:  # pragma: no cover - helpful error when deps missing
+        raise ImportError(
+            "numpy and soundfile are required for compressed output. Install dependencies: pip install -r requirements.txt"
+        ) from e
+
+    spec = OUTPUT_FORMATS[fmt]
+    audio = audio.set_sample_width(2)
+    if fmt == "opus" and audio.frame_rate not in _OPUS_RATES:
+        audio = audio.set_frame_rate(48000)
+
+    samples = np.frombuffer(audio.raw_data, dtype=np.int16).reshape(-1, audio.channels)
+    kwargs = {}
+    if fmt in DEFAULT_BITRATE_KBPS:
+        bitrate = float(bitrate_kbps or DEFAULT_BITRATE_KBPS[fmt])
+        kwargs["compression_level"] = _compression_level(fmt, bitrate, audio.frame_rate, audio.channels)
+        if fmt == "mp3":
+            kwargs["bitrate_mode"] = "CONSTANT"
+
+    sf.write(
+        output_path,
+        samples,
+        audio.frame_rate,
+        format=spec["container"],
+        subtype=spec["subtype"],
+        **kwargs,
+    )
+    return output_path
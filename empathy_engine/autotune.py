@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+"""Tune detector threads, batch size and server worker count for this host.
+
+Sweeps server worker processes x torch intra-op threads per worker x
+detection batch size. Each worker process loads the model once, as a
+uvicorn worker would. For every (threads, batch size) pair, all workers
+then call detect_emotions() back to back for `--duration` seconds at the
+same time. Measured per configuration:
+ - throughput: sentences per second summed over the workers
+ - p50/p99 latency of one detect_emotions() call of `batch size` sentences
+
+Configurations with more threads in total than cores are measured too, so
+the cost of oversubscription shows up. The best configuration is the one
+with the highest throughput whose p99 stays within `--max-p99-ms` (if
+given). It is written, with every measurement, to a profile:
+`<artifacts>/tuning.json` by default, or EMPATHY_TUNING_PROFILE.
+configure_artifacts() applies the profile's thread count and batch size to
+the detector at startup (explicit EMPATHY_TORCH_THREADS /
+EMPATHY_DETECT_BATCH_SIZE still win), provided the profile was measured for
+the same detector and core count. Backend/main.py, run directly, starts the
+profile's number of workers. `--stub` sweeps must name an `--output`.
+
+Usage:
+    python -m empathy_engine.autotune --duration 10
+    python -m empathy_engine.autotune --workers 1 2 4 --threads 1 2 4 --batch-sizes 4 8 16 --max-p99-ms 500
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from . import emotion_detector
+    from .bench_pipeline import make_corpus
+    from .startup import ARTIFACTS_DIR, configure_artifacts, detector_id, tuning_path
+    from .stubs import StubDetector
+except ImportError:
+    import emotion_detector
+    from bench_pipeline import make_corpus
+    from startup import ARTIFACTS_DIR, configure_artifacts, detector_id, tuning_path
+    from stubs import StubDetector
+
+
+DEFAULT_BATCH_SIZES = (1, 4, 8, 16, 32)
+
+
+def _powers_of_two(limit: int) -> List[int]:
+    values, n = [], 1
+    while n < limit:
+        values.append(n)
+        n *= 2
+    return values + [limit]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def _sweep_worker(index: int, configs: List[Tuple[int, int]], duration: float, sentences: List[str],
+                  root: str, stub: bool, barrier, results) -> None:
+    # One server worker: load the model once, then run every config in step
+    # with the other workers
+    try:
+        if stub:
+            emotion_detector.set_detector(StubDetector(call_ms=2.0, item_ms=1.0))
+        else:
+            configure_artifacts(root)
+            emotion_detector._init_detector()
+        offset = index * 7
+        for threads, batch_size in configs:
+            if not stub:
+                emotion_detector.set_torch_threads(threads)
+            batches = [
+                [sentences[(offset + n * batch_size + i) % len(sentences)] for i in range(batch_size)]
+                for n in range(16)
+            ]
+            emotion_detector.detect_emotions(batches[0], batch_size=batch_size)  # warm-up
+            barrier.wait()
+            latencies: List[float] = []
+            done = 0
+            started = time.perf_counter()
+            while time.perf_counter() - started < duration:
+                t0 = time.perf_counter()
+                emotion_detector.detect_emotions(batches[len(latencies) % len(batches)], batch_size=batch_size)
+                latencies.append(time.perf_counter() - t0)
+                done += batch_size
+            results.put((index, threads, batch_size, done / (time.perf_counter() - started), latencies))
+            barrier.wait()
+    except BaseException as e:
+        barrier.abort()
+        results.put((index, None, None, 0.0, f"{type(e).__name__}: {e}"))
+        raise
+
+
+def measure(workers: int, configs: List[Tuple[int, int]], duration: float, sentences: List[str],
+            root: str = ARTIFACTS_DIR, stub: bool = False) -> List[Dict]:
+    """Run `configs` ((threads, batch size) pairs) on `workers` processes at once."""
+    # spawn: each worker loads its own model, as separate server processes do
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=_sweep_worker, args=(i, configs, duration, sentences, root, stub, barrier, results),
+                    daemon=True)
+        for i in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    collected: Dict[Tuple[int, int], List] = {}
+    try:
+        for _ in range(workers * len(configs)):
+            index, threads, batch_size, rate, latencies = results.get()
+            if threads is None:
+                raise RuntimeError(f"tuning worker {index} failed: {latencies}")
+            collected.setdefault((threads, batch_size), []).append((rate, latencies))
+    finally:
+        for p in procs:
+            p.join(timeout=30)
+            if p.is_alive():
+                p.terminate()
+
+    rows = []
+    for (threads, batch_size), per_worker in collected.items():
+        latencies = [s for _, lat in per_worker for s in lat]
+        rows.append({
+            "workers": workers,
+            "threads": threads,
+            "batch_size": batch_size,
+            "throughput": sum(rate for rate, _ in per_worker),
+            "p50_ms": _percentile(latencies, 0.50) * 1000.0,
+            "p99_ms": _percentile(latencies, 0.99) * 1000.0,
+            "calls": len(latencies),
+        })
+    return rows
+
+
+def pick_best(rows: List[Dict], max_p99_ms: Optional[float] = None) -> Dict:
+    """Highest throughput within the p99 limit; lowest p99 if none meets it."""
+    eligible = [r for r in rows if max_p99_ms is None or r["p99_ms"] <= max_p99_ms]
+    if not eligible:
+        return min(rows, key=lambda r: r["p99_ms"])
+    return max(eligible, key=lambda r: (r["throughput"], -r["p99_ms"]))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=_powers_of_two(cpus),
+                        help="server worker processes to try (default: powers of two up to the core count)")
+    parser.add_argument("--threads", type=int, nargs="+", default=_powers_of_two(cpus),
+                        help="torch threads per worker to try")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(DEFAULT_BATCH_SIZES))
+    parser.add_argument("--max-oversubscription", type=float, default=2.0,
+                        help="skip configs with more than this many threads per core in total")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per configuration")
+    parser.add_argument("--max-p99-ms", type=float, help="latency limit for the chosen configuration")
+    parser.add_argument("--root", default=ARTIFACTS_DIR, help="artifacts bundle with the model")
+    parser.add_argument("--output", help=f"profile path (default: {tuning_path()})")
+    parser.add_argument("--stub", action="store_true",
+                        help="stub detector, to check the sweep itself offline (needs --output)")
+    args = parser.parse_args(argv)
+    if args.stub and not args.output:
+        # The server would pick up a stub profile from the default path
+        parser.error("--stub needs --output; stub measurements must not replace the host's tuning profile")
+
+    sentences = make_corpus(512, seed=45)
+    rows: List[Dict] = []
+    print(f"{'workers':>7} {'threads':>7} {'batch':>5} {'sent/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for workers in sorted(set(args.workers)):
+        configs = [
+            (threads, batch_size)
+            for threads in sorted(set(args.threads))
+            if workers * threads <= cpus * args.max_oversubscription
+            for batch_size in sorted(set(args.batch_sizes))
+        ]
+        if not configs:
+            continue
+        for row in sorted(measure(workers, configs, args.duration, sentences, args.root, args.stub),
+                          key=lambda r: (r["threads"], r["batch_size"])):
+            rows.append(row)
+            print(f"{row['workers']:>7} {row['threads']:>7} {row['batch_size']:>5} {row['throughput']:>9.1f} "
+                  f"{row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+    if not rows:
+        print("No configuration to measure", file=sys.stderr)
+        return 1
+
+    best = pick_best(rows, args.max_p99_ms)
+    try:
+        import torch
+        torch_version = torch.__version__
+    except ImportError:
+        torch_version = None
+    profile = {
+        "workers": best["workers"],
+        "threads": best["threads"],
+        "batch_size": best["batch_size"],
+        "throughput": best["throughput"],
+        "p99_ms": best["p99_ms"],
+        "max_p99_ms": args.max_p99_ms,
+        "detector": "stub" if args.stub else detector_id(args.root),
+        "host": {"cpu_count": cpus, "platform": platform.platform(), "python": platform.python_version(),
+                 "torch": torch_version},
+        "created_at": time.time(),
+        "results": rows,
+    }
+    path = args.output or tuning_path(args.root)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+    print(f"Best: {best['workers']} workers x {best['threads']} threads, batch {best['batch_size']} "
+          f"({best['throughput']:.1f} sentences/s, p99 {best['p99_ms']:.1f} ms). Profile written to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""Render many short texts in one call with shared detection and TTS.
+
+`render_batch(texts, ...)` returns the same per-text results as calling
+run_pipeline on each text, but
+ - the sentences of all texts are segmented up front and scored in shared
+   detect_emotions() batches, each distinct sentence once
+ - raw TTS for all texts runs on one pool of `concurrency` threads, again
+   once per distinct sentence (and voice params, for engines that apply
+   prosody natively); the same pool then assembles each text
+ - each text's output is stored under the key run_pipeline would use, so
+   cached texts are skipped and batch renders serve later single requests;
+   repeated texts within a batch are rendered once
+
+A text that fails (e.g. a TTS error on one of its sentences) does not fail
+the batch: its item carries `error` instead of an output path. A text with
+sentences from the TTS fallback lists them under `degraded_sentences` and is
+not stored, as in run_pipeline.
+"""
+import contextvars
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from typing import Callable, Dict, FrozenSet, List, Optional
+
+
+try:
+    from .emotion_detector import apply_prosody_to_timeline, score_sentences, summarize_timeline
+    from .tts_engine import native_controls, split_voice_params, synthesize_sentence, synthesize_text
+    from .audio_codec import normalize_format
+    from .output_store import OutputStore
+    from .pipeline import (
+        PipelineCancelled, check_cancel, assemble_output, make_scratch_dir, output_cache_key, resolve_voice_params,
+    )
+    from . import metrics, segmentation
+except ImportError:
+    from emotion_detector import apply_prosody_to_timeline, score_sentences, summarize_timeline
+    from tts_engine import native_controls, split_voice_params, synthesize_sentence, synthesize_text
+    from audio_codec import normalize_format
+    from output_store import OutputStore
+    from pipeline import (
+        PipelineCancelled, check_cancel, assemble_output, make_scratch_dir, output_cache_key, resolve_voice_params,
+    )
+    import metrics
+    import segmentation
+
+
+DEFAULT_CONCURRENCY = 4
+
+
+def render_batch(
+    texts: List[str],
+    output_dir: str = "static/audio",
+    synthesize: Optional[Callable[[str, str], str]] = None,
+    output_format: str = "wav",
+    bitrate_kbps: Optional[float] = None,
+    store: Optional[OutputStore] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    cancel: Optional[threading.Event] = None,
+) -> Dict:
+    """Render every text in `texts`; arguments as for run_pipeline.
+
+    Returns `{"items": [...], "stats": {...}}` with one item per text, in
+    order: a run_pipeline result dict plus `index`, or `{"index", "error"}`.
+    """
+    synthesize = synthesize or synthesize_sentence
+    output_format = normalize_format(output_format)
+    with metrics.track_run() as run:
+        with metrics.stage("batch"):
+            items = _render_batch(
+                texts, output_dir, synthesize, output_format, bitrate_kbps, store, max(1, int(concurrency)), cancel
+            )
+    metrics.count("batch_texts", len(texts))
+    return {"items": items, "stats": run.as_dict()}
+
+
+def _render_batch(
+    texts: List[str],
+    output_dir: str,
+    synthesize: Callable[[str, str], str],
+    output_format: str,
+    bitrate_kbps: Optional[float],
+    store: Optional[OutputStore],
+    concurrency: int,
+    cancel: Optional[threading.Event],
+) -> List[Dict]:
+    check_cancel(cancel)
+    items: List[Optional[Dict]] = [None] * len(texts)
+    keys: List[Optional[str]] = [None] * len(texts)
+    pending: List[int] = []
+    first_of: Dict[str, int] = {}
+    duplicates: Dict[int, int] = {}
+    for i, text in enumerate(texts):
+        # Repeated texts are rendered once and share the output
+        if text in first_of:
+            duplicates[i] = first_of[text]
+            continue
+        first_of[text] = i
+        if store is not None:
+            keys[i] = output_cache_key(text, synthesize, output_format, bitrate_kbps)
+            cached = store.lookup(keys[i])
+            if cached is not None:
+                metrics.count("cache_hits")
+                items[i] = dict(cached, index=i)
+                continue
+            metrics.count("cache_misses")
+        pending.append(i)
+    if pending:
+        _render_pending(
+            texts, pending, items, keys, output_dir, synthesize, output_format, bitrate_kbps, store, concurrency, cancel
+        )
+    for i, first in duplicates.items():
+        items[i] = dict(items[first], index=i)
+    return items
+
+
+def _render_pending(
+    texts: List[str],
+    pending: List[int],
+    items: List[Optional[Dict]],
+    keys: List[Optional[str]],
+    output_dir: str,
+    synthesize: Callable[[str, str], str],
+    output_format: str,
+    bitrate_kbps: Optional[float],
+    store: Optional[OutputStore],
+    concurrency: int,
+    cancel: Optional[threading.Event],
+) -> None:
+    # Step 1: segment all texts, then score each distinct sentence once
+    with metrics.stage("segment"):
+        sentences = {i: segmentation.sentences(texts[i]) for i in pending}
+    metrics.count("sentences", sum(len(s) for s in sentences.values()))
+    unique = list(dict.fromkeys(s for i in pending for s in sentences[i]))
+    metrics.count("batch_unique_sentences", len(unique))
+    try:
+        scored = dict(zip(unique, score_sentences(unique, cancel=cancel)))
+    except CancelledError:
+        # Detection stopped because this batch (and any other caller) gave up
+        check_cancel(cancel)
+        raise
+    analyses = {
+        i: apply_prosody_to_timeline(summarize_timeline([scored[s] for s in sentences[i]]))
+        for i in pending
+    }
+
+    temp_dir = make_scratch_dir(output_dir)
+    pool = ThreadPoolExecutor(concurrency, thread_name_prefix="batch")
+    try:
+        # Step 2: raw TTS per distinct sentence on the shared pool (per distinct
+        # sentence and params when the engine applies prosody itself)
+        native = native_controls(synthesize)
+        tts_keys = {i: [_tts_key(item, native) for item in analyses[i]["timeline"]] for i in pending}
+        jobs = {k: item for i in pending for k, item in zip(tts_keys[i], analyses[i]["timeline"])}
+        raw_paths = {k: os.path.join(temp_dir, f"raw_{n:05d}.wav") for n, k in enumerate(jobs)}
+        tts = {
+            k: pool.submit(contextvars.copy_context().run, _synthesize, synthesize, item, raw_paths[k], cancel)
+            for k, item in jobs.items()
+        }
+        tts_errors: Dict[tuple, str] = {}
+        degraded = set()
+        for k, future in tts.items():
+            try:
+                if future.result():
+                    degraded.add(k)
+            except PipelineCancelled:
+                raise
+            except Exception as e:
+                tts_errors[k] = f"{type(e).__name__}: {e}"
+
+        # Step 3: modulate, mix down and export each text on the same pool
+        assembled = {}
+        for i in pending:
+            failed = [k for k in tts_keys[i] if k in tts_errors]
+            if failed:
+                items[i] = {"index": i, "error": f"TTS failed for {failed[0][0]!r}: {tts_errors[failed[0]]}"}
+                continue
+            assembled[i] = pool.submit(
+                contextvars.copy_context().run, _assemble, analyses[i], [raw_paths[k] for k in tts_keys[i]],
+                temp_dir, output_dir=output_dir, output_format=output_format, bitrate_kbps=bitrate_kbps,
+                store=store, cache_key=keys[i], cancel=cancel, native=native,
+                degraded=[n for n, k in enumerate(tts_keys[i], start=1) if k in degraded],
+            )
+        for i, future in assembled.items():
+            try:
+                items[i] = dict(future.result(), index=i)
+            except PipelineCancelled:
+                raise
+            except Exception as e:
+                print(f"Batch item {i} failed: {e}")
+                items[i] = {"index": i, "error": f"{type(e).__name__}: {e}"}
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _tts_key(item: Dict, native: FrozenSet[str]) -> tuple:
+    sentence = item.get("sentence", "")
+    if not native:
+        return (sentence,)
+    params, _ = split_voice_params(resolve_voice_params(item), native)
+    return (sentence, *sorted(params.items()))
+
+
+def _synthesize(synthesize: Callable[[str, str], str], item: Dict, path: str,
+                cancel: Optional[threading.Event]) -> bool:
+    # True when the sentence came from the TTS fallback
+    check_cancel(cancel)
+    with metrics.stage("tts"):
+        return synthesize_text(item.get("sentence", ""), path, resolve_voice_params(item), synthesize)[1]
+
+
+def _assemble(result: Dict, raw_paths: List[str], temp_dir: str, **kwargs) -> Dict:
+    # Each text gets its own subdirectory for modulated segments and staging
+    text_dir = tempfile.mkdtemp(prefix="text_", dir=temp_dir)
+    out = assemble_output(result, raw_paths, text_dir, **kwargs)
+    out.pop("sentence_audio_paths", None)
+    return out
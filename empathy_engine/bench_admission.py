@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""Short-request latency under mixed load, with and without fair admission.
+
+One "bulk" client submits `--bulk` long documents at once while short
+one-sentence requests from `--clients` other clients arrive as a Poisson
+stream at `--rate` per second, all on a RenderPool of `--workers` threads.
+Modes:
+ - alone: short requests only, the latency floor
+ - fifo:  every request is one unit, served in arrival order
+ - fair:  weighted fair queuing by estimated cost, requests still whole
+ - split: fair queuing plus sentence-level units for large renders
+
+Runs offline with the stub detector and TTS (`--tts-latency-ms` per
+sentence), so the numbers reflect scheduling rather than the model or
+network. Needs NLTK punkt data.
+
+Usage:
+    python -m empathy_engine.bench_admission --bulk 3 --rate 10
+"""
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+try:
+    from . import emotion_detector
+    from .admission import AdmissionController
+    from .bench_batch import make_texts
+    from .output_store import OutputStore
+    from .pipeline import run_pipeline
+    from .render_pool import RenderPool
+    from .stubs import StubDetector, make_stub_synthesize
+except ImportError:
+    import emotion_detector
+    from admission import AdmissionController
+    from bench_batch import make_texts
+    from output_store import OutputStore
+    from pipeline import run_pipeline
+    from render_pool import RenderPool
+    from stubs import StubDetector, make_stub_synthesize
+
+
+MODES = ("alone", "fifo", "fair", "split")
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def run_mode(mode: str, args, synthesize, work_dir: str) -> Dict:
+    """Latencies (seconds) of the short and bulk requests in one scenario."""
+    store = OutputStore(f"{work_dir}/{mode}")
+    pool = RenderPool(max_workers=args.workers, max_queue=10_000)
+    admission = AdmissionController(
+        pool, split_cost=args.split_cost if mode == "split" else None,
+        coordinator=RenderPool(max_workers=args.bulk or 1, max_queue=10_000),
+    )
+    # Unique texts per mode so the render cache never answers
+    shorts = [f"{t} ({mode} {i})" for i, t in enumerate(make_texts(int(args.rate * args.duration), seed=7))]
+    bulk = [" ".join(make_texts(args.bulk_sentences, seed=100 + i)) + f" ({mode})" for i in range(args.bulk)]
+
+    def submit(client: str, text: str):
+        kwargs = dict(output_dir=store.root, synthesize=synthesize, output_format="wav", store=store)
+        if mode == "fifo":
+            return pool.submit(run_pipeline, text, **kwargs)
+        return admission.submit_render(client, text, **kwargs)
+
+    latencies = {"short": [], "bulk": []}
+    lock = threading.Lock()
+
+    def track(kind: str, t0: float):
+        def done(_future):
+            with lock:
+                latencies[kind].append(time.perf_counter() - t0)
+        return done
+
+    futures = []
+    if mode != "alone":
+        for text in bulk:
+            f = submit("bulk", text)
+            f.add_done_callback(track("bulk", time.perf_counter()))
+            futures.append(f)
+
+    rng = random.Random(1)
+    next_at = time.perf_counter()
+    for i, text in enumerate(shorts):
+        next_at += rng.expovariate(args.rate)
+        time.sleep(max(0.0, next_at - time.perf_counter()))
+        f = submit(f"client{i % args.clients}", text)
+        f.add_done_callback(track("short", time.perf_counter()))
+        futures.append(f)
+
+    for f in futures:
+        f.result()
+    admission.shutdown()
+    return latencies
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--bulk", type=int, default=3, help="long documents from the bulk client")
+    parser.add_argument("--bulk-sentences", type=int, default=150)
+    parser.add_argument("--clients", type=int, default=5, help="clients sending short requests")
+    parser.add_argument("--rate", type=float, default=10.0, help="short requests per second")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--split-cost", type=float, default=40.0)
+    parser.add_argument("--tts-latency-ms", type=float, default=20.0)
+    parser.add_argument("--modes", default=",".join(MODES))
+    args = parser.parse_args(argv)
+
+    emotion_detector.set_detector(StubDetector(call_ms=5.0, item_ms=0.5))
+    synthesize = make_stub_synthesize(args.tts_latency_ms)
+
+    work_dir = tempfile.mkdtemp(prefix="empathy_bench_admission_")
+    print(f"{args.workers} workers, {args.bulk} x {args.bulk_sentences}-text bulk documents, "
+          f"{args.rate:g} short req/s for {args.duration:g}s, TTS {args.tts_latency_ms:g} ms/sentence")
+    print(f"{'mode':<8}{'short p50':>11}{'short p95':>11}{'short max':>11}{'bulk max':>10}")
+    try:
+        for mode in args.modes.split(","):
+            lat = run_mode(mode, args, synthesize, work_dir)
+            short = lat["short"]
+            print(f"{mode:<8}{_percentile(short, 0.5) * 1000:>9.0f}ms{_percentile(short, 0.95) * 1000:>9.0f}ms"
+                  f"{max(short) * 1000:>9.0f}ms" + (f"{max(lat['bulk']):>9.1f}s" if lat["bulk"] else f"{'-':>10}"))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""Throughput of render_batch() against one run_pipeline() call per text.
+
+Renders N short notification-style texts (1-2 sentences, with the repeats
+typical of templated messages) both ways, offline:
+ - individual: run_pipeline per text on `--concurrency` threads, the way
+   concurrent /generate-speech requests would run on the render pool
+ - batch:      one render_batch() call with the same concurrency
+
+The stub detector charges `--detect-call-ms` per model call plus
+`--detect-item-ms` per sentence, and stub TTS sleeps `--tts-latency-ms`, so
+the saving from fewer model calls and deduplicated sentences shows up
+without the real model or network. Needs NLTK punkt data.
+
+Usage:
+    python -m empathy_engine.bench_batch --texts 200
+"""
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+try:
+    from . import emotion_detector
+    from .batch import render_batch
+    from .pipeline import run_pipeline
+    from .stubs import StubDetector, make_stub_synthesize
+except ImportError:
+    import emotion_detector
+    from batch import render_batch
+    from pipeline import run_pipeline
+    from stubs import StubDetector, make_stub_synthesize
+
+
+_NOTIFICATIONS = [
+    "Your order has shipped.",
+    "Your package was delivered!",
+    "Payment received, thank you.",
+    "We could not process your payment.",
+    "Your appointment is tomorrow at {n}.",
+    "You have {n} new messages.",
+    "Great news, your refund of ${n} is on its way!",
+    "Sorry, your flight is delayed by {n} minutes.",
+    "Welcome back!",
+    "Reminder: your subscription renews in {n} days.",
+]
+
+
+def make_texts(n: int, seed: int = 99) -> List[str]:
+    """Deterministic notification texts; about half repeat a sentence verbatim."""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n):
+        parts = [rng.choice(_NOTIFICATIONS).format(n=rng.randint(1, 60)) for _ in range(rng.randint(1, 2))]
+        texts.append(" ".join(parts))
+    return texts
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--format", default="opus")
+    parser.add_argument("--detect-call-ms", type=float, default=20.0)
+    parser.add_argument("--detect-item-ms", type=float, default=2.0)
+    parser.add_argument("--tts-latency-ms", type=float, default=100.0)
+    args = parser.parse_args(argv)
+
+    emotion_detector.set_detector(StubDetector(call_ms=args.detect_call_ms, item_ms=args.detect_item_ms))
+    synthesize = make_stub_synthesize(args.tts_latency_ms)
+    texts = make_texts(args.texts)
+
+    work_dir = tempfile.mkdtemp(prefix="empathy_bench_batch_")
+    try:
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            list(pool.map(
+                lambda t: run_pipeline(t, output_dir=f"{work_dir}/single", synthesize=synthesize, output_format=args.format),
+                texts,
+            ))
+        single_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        out = render_batch(texts, output_dir=f"{work_dir}/batch", synthesize=synthesize,
+                           output_format=args.format, concurrency=args.concurrency)
+        batch_s = time.perf_counter() - t0
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    errors = [i for i in out["items"] if "error" in i]
+    counters = out["stats"]["counters"]
+    print(f"{args.texts} texts, {counters.get('sentences', 0)} sentences "
+          f"({counters.get('batch_unique_sentences', 0)} distinct), concurrency {args.concurrency}")
+    print(f"{'mode':<12}{'seconds':>10}{'texts/s':>10}")
+    print(f"{'individual':<12}{single_s:>10.2f}{args.texts / single_s:>10.1f}")
+    print(f"{'batch':<12}{batch_s:>10.2f}{args.texts / batch_s:>10.1f}")
+    print(f"speedup x{single_s / batch_s:.2f}" + (f", {len(errors)} failed items" if errors else ""))
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
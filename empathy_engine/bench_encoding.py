@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""Benchmark output encodings: encode time vs. bytes saved relative to WAV.
+
+Encodes a stub-rendered clip (24 kHz mono, like gTTS) in every supported
+format and bitrate and prints one row per setting.
+
+Usage: python -m empathy_engine.bench_encoding [--seconds 30] [--repeat 3]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from pydub import AudioSegment
+
+try:
+    from .audio_codec import DEFAULT_BITRATE_KBPS, OUTPUT_FORMATS, export_audio
+    from .stubs import stub_synthesize
+except ImportError:
+    from audio_codec import DEFAULT_BITRATE_KBPS, OUTPUT_FORMATS, export_audio
+    from stubs import stub_synthesize
+
+
+SETTINGS = [
+    ("wav", None),
+    ("flac", None),
+    ("opus", 24),
+    ("opus", DEFAULT_BITRATE_KBPS["opus"]),
+    ("opus", 64),
+    ("mp3", 48),
+    ("mp3", DEFAULT_BITRATE_KBPS["mp3"]),
+    ("mp3", 128),
+]
+
+
+def _clip(seconds: float, work_dir: str) -> AudioSegment:
+    """Concatenate stub sentences with 300ms gaps until `seconds` long."""
+    gap = AudioSegment.silent(duration=300, frame_rate=24000)
+    clip = AudioSegment.silent(duration=0, frame_rate=24000)
+    idx = 0
+    while len(clip) < seconds * 1000:
+        path = os.path.join(work_dir, f"s{idx}.wav")
+        stub_synthesize(f"Sentence number {idx} of the encoding benchmark corpus.", path)
+        clip += AudioSegment.from_wav(path) + gap
+        idx += 1
+    return clip[: int(seconds * 1000)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=30.0, help="clip length")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per setting (best is reported)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="empathy_bench_enc_")
+    try:
+        clip = _clip(args.seconds, work_dir)
+        wav_bytes = None
+        print(f"{'format':<6} {'kbps':>5} {'encode_ms':>10} {'bytes':>10} {'vs_wav':>7} {'x_realtime':>10}")
+        for fmt, kbps in SETTINGS:
+            out = os.path.join(work_dir, f"out.{OUTPUT_FORMATS[fmt]['extension']}")
+            best = float("inf")
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                export_audio(clip, out, fmt, kbps)
+                best = min(best, time.perf_counter() - t0)
+            size = os.path.getsize(out)
+            if wav_bytes is None:
+                wav_bytes = size
+            print(
+                f"{fmt:<6} {kbps or '-':>5} {best * 1000:>10.1f} {size:>10d} "
+                f"{size / wav_bytes:>6.1%} {args.seconds / best:>10.0f}"
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
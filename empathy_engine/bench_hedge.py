@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""Tail latency of TTS with and without hedging and deadlines.
+
+Starts a local stand-in TTS server (stubs.StubTTSServer) whose responses
+take `--latency-ms` +/- `--jitter-ms`, except for a `--spike-rate`
+fraction that stall for `--spike-ms`. Documents of `--doc-sentences`
+sentences are synthesized sentence by sentence through synthesize_text(),
+as run_pipeline's TTS stage does, by `--concurrency` threads, under three
+settings:
+ - plain:    no hedging, no deadline (the previous behaviour)
+ - hedged:   duplicate request after the measured p95, within the budget
+ - deadline: hedged, and sentences cut off at `--deadline` seconds fall
+             back to EMPATHY_TTS_FALLBACK (silence unless pyttsx3 is installed)
+
+Reports per-sentence and per-document latency percentiles, hedges issued,
+extra server load and fallbacks.
+
+Usage:
+    python -m empathy_engine.bench_hedge --documents 40 --spike-rate 0.03
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+try:
+    from . import tts_hedge
+    from .bench_pipeline import make_corpus
+    from .stubs import StubTTSServer, make_http_synthesize
+    from .tts_engine import synthesize_text
+except ImportError:
+    import tts_hedge
+    from bench_pipeline import make_corpus
+    from stubs import StubTTSServer, make_http_synthesize
+    from tts_engine import synthesize_text
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def run_documents(synthesize, documents: List[List[str]], concurrency: int, work_dir: str) -> Dict:
+    """Synthesize `documents` on `concurrency` threads; latencies in seconds."""
+    sentence_s: List[float] = []
+    document_s: List[float] = []
+    lock = threading.Lock()
+    todo = list(enumerate(documents))
+
+    def worker() -> None:
+        while True:
+            with lock:
+                if not todo:
+                    return
+                index, sentences = todo.pop()
+            doc_dir = os.path.join(work_dir, f"doc{index}")
+            timings = []
+            for n, sentence in enumerate(sentences):
+                t0 = time.perf_counter()
+                synthesize_text(sentence, os.path.join(doc_dir, f"raw_{n:03d}.wav"), None, synthesize)
+                timings.append(time.perf_counter() - t0)
+            shutil.rmtree(doc_dir, ignore_errors=True)
+            with lock:
+                sentence_s.extend(timings)
+                document_s.append(sum(timings))
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {"sentence_s": sentence_s, "document_s": document_s}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--doc-sentences", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=60.0)
+    parser.add_argument("--jitter-ms", type=float, default=15.0)
+    parser.add_argument("--spike-rate", type=float, default=0.03)
+    parser.add_argument("--spike-ms", type=float, default=2000.0)
+    parser.add_argument("--deadline", type=float, default=0.5, help="per-sentence deadline in seconds")
+    parser.add_argument("--hedge-budget", type=float, default=tts_hedge.HEDGE_BUDGET)
+    args = parser.parse_args(argv)
+
+    settings = {
+        "plain": dict(deadline_seconds=0.0, hedge_quantile=0.0),
+        "hedged": dict(deadline_seconds=0.0, hedge_quantile=0.95, hedge_budget=args.hedge_budget),
+        "deadline": dict(deadline_seconds=args.deadline, hedge_quantile=0.95, hedge_budget=args.hedge_budget),
+    }
+    per_doc = args.doc_sentences
+    corpus = make_corpus(args.documents * per_doc + tts_hedge.MIN_SAMPLES, seed=47)
+    # Numbered so no two sentences coalesce into one TTS call
+    corpus = [f"{sentence} ({n})" for n, sentence in enumerate(corpus)]
+    warmup, corpus = corpus[:tts_hedge.MIN_SAMPLES], corpus[tts_hedge.MIN_SAMPLES:]
+    documents = [corpus[i:i + per_doc] for i in range(0, len(corpus), per_doc)]
+
+    print(f"{args.documents} documents x {per_doc} sentences, {args.concurrency} threads; server "
+          f"{args.latency_ms:g}+/-{args.jitter_ms:g} ms, {args.spike_rate:.0%} spikes of {args.spike_ms:g} ms")
+    print(f"{'setting':<9} {'sent p50':>9} {'p99':>8} {'max':>8} {'doc p50':>9} {'doc p99':>9} "
+          f"{'hedges':>7} {'load':>6} {'fallbacks':>9}")
+    work_dir = tempfile.mkdtemp(prefix="empathy_bench_hedge_")
+    try:
+        for name, config in settings.items():
+            tts_hedge.configure(**config)
+            # Same spike sequence for every setting
+            with StubTTSServer(args.latency_ms, args.jitter_ms, args.spike_rate, args.spike_ms) as server:
+                synthesize = make_http_synthesize(server.url)
+                run_documents(synthesize, [warmup], 1, work_dir)
+                before_requests = server.requests
+                result = run_documents(synthesize, documents, args.concurrency, work_dir)
+                requests = server.requests - before_requests
+            # Only the stand-in backend has been called since configure()
+            (counts,) = tts_hedge.stats()["backends"].values()
+
+            calls = len(result["sentence_s"])
+            sentence_ms = [s * 1000.0 for s in result["sentence_s"]]
+            document_ms = [s * 1000.0 for s in result["document_s"]]
+            print(f"{name:<9} {_percentile(sentence_ms, 0.5):>9.0f} {_percentile(sentence_ms, 0.99):>8.0f} "
+                  f"{max(sentence_ms):>8.0f} {_percentile(document_ms, 0.5):>9.0f} "
+                  f"{_percentile(document_ms, 0.99):>9.0f} {counts['hedges']:>7} "
+                  f"{requests / calls:>5.2f}x {counts['deadline_misses']:>9}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print("Latencies in ms; load = server requests per sentence (plus late requests still running).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""Benchmark incremental re-rendering of an edited document.
+
+Renders an N-sentence document with DocumentRenderer, applies a one-word
+edit, and re-renders; compares against a single-sentence run_pipeline call.
+Uses the offline stubs, with `--tts-latency-ms` of sleep per TTS call to
+stand in for the gTTS round trip.
+
+Usage: python -m empathy_engine.bench_incremental [--sentences 100]
+Requires NLTK punkt data for sentence segmentation.
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+try:
+    from . import emotion_detector
+    from .document import DocumentRenderer
+    from .pipeline import run_pipeline
+    from .stubs import StubDetector, stub_synthesize
+except ImportError:
+    import emotion_detector
+    from document import DocumentRenderer
+    from pipeline import run_pipeline
+    from stubs import StubDetector, stub_synthesize
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sentences", type=int, default=100)
+    parser.add_argument("--tts-latency-ms", type=float, default=200.0)
+    args = parser.parse_args()
+
+    def slow_tts(text: str, output_path: str) -> str:
+        time.sleep(args.tts_latency_ms / 1000.0)
+        return stub_synthesize(text, output_path)
+
+    emotion_detector.set_detector(StubDetector())
+    sentences = [f"This is sentence number {i} of a long document about the weather." for i in range(args.sentences)]
+    edited = list(sentences)
+    edited[args.sentences // 2] = edited[args.sentences // 2].replace("weather", "climate")
+
+    output_dir = tempfile.mkdtemp(prefix="empathy_bench_doc_")
+    try:
+        t0 = time.perf_counter()
+        run_pipeline(sentences[0], output_dir=output_dir, synthesize=slow_tts)
+        one_sentence = time.perf_counter() - t0
+
+        with DocumentRenderer(output_dir=output_dir, synthesize=slow_tts) as doc:
+            t0 = time.perf_counter()
+            doc.render(" ".join(sentences))
+            full = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            out = doc.render(" ".join(edited))
+            incremental = time.perf_counter() - t0
+
+        stats = out["render_stats"]
+        print(f"single-sentence run_pipeline: {one_sentence * 1000:8.1f} ms")
+        print(f"full render ({args.sentences} sentences): {full * 1000:8.1f} ms")
+        print(f"re-render after one-word edit: {incremental * 1000:8.1f} ms  "
+              f"(detected={stats['detected']} synthesized={stats['synthesized']} "
+              f"modulated={stats['modulated']} reused={stats['reused']})")
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
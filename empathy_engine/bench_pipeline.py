@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+"""Offline benchmark suite for the full pipeline and each stage.
+
+Runs without network: TTS is the offline stub and detection uses the stub
+detector unless `--real-detector` is given (which needs the model cached
+locally). For each corpus size it times:
+
+ - segment          segmentation.sentences() over the whole text
+ - detect_single    detect_emotion() per sentence
+ - detect_batched   detect_emotions() over all sentences
+ - tts              stub TTS per sentence
+ - modulate         modulate_segment() per sentence
+ - mixdown          concatenation with gaps
+ - export_wav / export_opus
+ - end_to_end       run_pipeline() on the text
+
+Stages needing NLTK punkt data (segment, end_to_end) are skipped when it is
+not installed. Results are written as JSON; `--baseline old.json` compares
+against a stored run and exits non-zero if any stage regressed by more than
+`--threshold`.
+
+Usage:
+    python -m empathy_engine.bench_pipeline --output bench.json
+    python -m empathy_engine.bench_pipeline --baseline bench.json --output new.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import nltk
+from pydub import AudioSegment
+
+try:
+    from . import emotion_detector, segmentation
+    from .audio_codec import export_audio
+    from .pipeline import mixdown, run_pipeline
+    from .stubs import StubDetector, stub_synthesize
+    from .voice_modulator import modulate_segment
+    from .config import get_voice_params, EMOTIONS
+except ImportError:
+    import emotion_detector
+    import segmentation
+    from audio_codec import export_audio
+    from pipeline import mixdown, run_pipeline
+    from stubs import StubDetector, stub_synthesize
+    from voice_modulator import modulate_segment
+    from config import get_voice_params, EMOTIONS
+
+
+DEFAULT_SIZES = [1, 10, 100, 1000]
+
+_OPENERS = ["I", "We", "My sister", "The whole team", "Nobody", "Everyone at work", "Our neighbour"]
+_VERBS = ["finally finished", "completely forgot", "can't stop thinking about", "was thrilled by",
+          "got really upset about", "quietly celebrated", "am still confused by", "won't forget"]
+_OBJECTS = ["the presentation", "the trip to the coast", "that awful meeting", "the surprise party",
+            "the results from last week", "the letter from grandma", "the broken window", "the new job"]
+_TAILS = ["", " this morning", " after everything that happened", " and it still feels unreal",
+          " even though nobody noticed", " for the third time this month"]
+_ENDS = [".", "!", "?", "..."]
+
+
+def make_corpus(n_sentences: int, seed: int = 1234) -> List[str]:
+    """Deterministic list of `n_sentences` sentences of varied length."""
+    rng = random.Random(seed)
+    return [
+        f"{rng.choice(_OPENERS)} {rng.choice(_VERBS)} {rng.choice(_OBJECTS)}{rng.choice(_TAILS)}{rng.choice(_ENDS)}"
+        for _ in range(n_sentences)
+    ]
+
+
+def _has_punkt() -> bool:
+    try:
+        nltk.sent_tokenize("Probe sentence. Another one.")
+        return True
+    except LookupError:
+        return False
+
+
+def _time(fn: Callable[[], object], repeat: int) -> Dict:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return {"median_s": statistics.median(samples), "min_s": min(samples), "runs": repeat}
+
+
+def run_suite(sizes: List[int], repeat: int, work_dir: str) -> Dict:
+    punkt = _has_punkt()
+    results: Dict[str, Dict] = {}
+    for n in sizes:
+        sentences = make_corpus(n)
+        text = " ".join(sentences)
+        size_dir = os.path.join(work_dir, f"n{n}")
+        os.makedirs(size_dir, exist_ok=True)
+        stages: Dict[str, Dict] = {}
+
+        if punkt:
+            stages["segment"] = _time(lambda: segmentation.sentences(text), repeat)
+        stages["detect_single"] = _time(lambda: [emotion_detector.detect_emotion(s) for s in sentences], repeat)
+        stages["detect_batched"] = _time(lambda: emotion_detector.detect_emotions(sentences), repeat)
+
+        raw_paths = [os.path.join(size_dir, f"raw_{i:04d}.wav") for i in range(n)]
+        stages["tts"] = _time(lambda: [stub_synthesize(s, p) for s, p in zip(sentences, raw_paths)], repeat)
+
+        raw = [AudioSegment.from_wav(p) for p in raw_paths]
+        params = [get_voice_params(EMOTIONS[i % len(EMOTIONS)], ("low", "medium", "high")[i % 3]) for i in range(n)]
+        stages["modulate"] = _time(lambda: [modulate_segment(a, v) for a, v in zip(raw, params)], repeat)
+
+        modulated = [modulate_segment(a, v) for a, v in zip(raw, params)]
+        stages["mixdown"] = _time(lambda: mixdown(modulated), repeat)
+
+        final = mixdown(modulated)
+        stages["export_wav"] = _time(lambda: export_audio(final, os.path.join(size_dir, "out.wav"), "wav"), repeat)
+        stages["export_opus"] = _time(lambda: export_audio(final, os.path.join(size_dir, "out.opus"), "opus"), repeat)
+
+        if punkt:
+            out_dir = os.path.join(size_dir, "pipeline")
+            stages["end_to_end"] = _time(
+                lambda: run_pipeline(text, output_dir=out_dir, synthesize=stub_synthesize), repeat
+            )
+
+        for stats in stages.values():
+            stats["per_sentence_ms"] = stats["median_s"] * 1000.0 / n
+        results[str(n)] = stages
+        shutil.rmtree(size_dir, ignore_errors=True)
+        print(f"  n={n}: " + ", ".join(f"{k}={v['median_s'] * 1000:.1f}ms" for k, v in stages.items()))
+    return results
+
+
+def compare(current: Dict, baseline: Dict, threshold: float, min_delta_s: float) -> List[str]:
+    """Return one message per (size, stage) whose median regressed beyond `threshold`."""
+    regressions = []
+    for size, stages in current["results"].items():
+        base_stages = baseline.get("results", {}).get(size, {})
+        for name, stats in stages.items():
+            base = base_stages.get(name)
+            if not base:
+                continue
+            cur_s, base_s = stats["median_s"], base["median_s"]
+            if cur_s - base_s > min_delta_s and cur_s > base_s * (1.0 + threshold):
+                regressions.append(
+                    f"n={size} {name}: {base_s * 1000:.2f}ms -> {cur_s * 1000:.2f}ms (+{(cur_s / base_s - 1.0):.0%})"
+                )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="corpus sizes in sentences")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage (median is compared)")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative slowdown")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--real-detector", action="store_true", help="use the local GoEmotions model")
+    args = parser.parse_args(argv)
+
+    if not args.real_detector:
+        emotion_detector.set_detector(StubDetector())
+
+    work_dir = tempfile.mkdtemp(prefix="empathy_bench_")
+    try:
+        print("Running benchmark suite...")
+        results = run_suite(args.sizes, args.repeat, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "detector": "model" if args.real_detector else "stub",
+            "tts": "stub",
+            "repeat": args.repeat,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.min_delta_ms / 1000.0)
+        if regressions:
+            print(f"{len(regressions)} regression(s) against {args.baseline}:")
+            for r in regressions:
+                print(f"  REGRESSION {r}")
+            return 1
+        print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""Per-sentence saving from prosody applied by the TTS engine instead of DSP.
+
+For `--sentences` sentences with voice params cycling through the emotion
+map, times the two ways a sentence gets its prosody:
+ - dsp:    plain TTS (stub_synthesize), then modulate() on the WAV: decode,
+           speed and pitch resampling, gain, encode
+ - native: TTS that applies speed, pitch and volume itself
+           (stub_synthesize_prosody via synthesize_text); modulation skipped
+
+Both stubs generate the same tone, so the difference is the DSP step. With
+NLTK punkt data, run_pipeline() end to end is timed for both backends too.
+
+Usage:
+    python -m empathy_engine.bench_prosody --sentences 200
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+try:
+    from . import emotion_detector
+    from .bench_pipeline import _has_punkt, make_corpus
+    from .config import EMOTIONS, get_voice_params
+    from .pipeline import run_pipeline
+    from .stubs import StubDetector, stub_synthesize, stub_synthesize_prosody
+    from .tts_engine import native_controls, needs_dsp, split_voice_params, synthesize_text
+    from .voice_modulator import modulate
+except ImportError:
+    import emotion_detector
+    from bench_pipeline import _has_punkt, make_corpus
+    from config import EMOTIONS, get_voice_params
+    from pipeline import run_pipeline
+    from stubs import StubDetector, stub_synthesize, stub_synthesize_prosody
+    from tts_engine import native_controls, needs_dsp, split_voice_params, synthesize_text
+    from voice_modulator import modulate
+
+
+def render_sentence(synthesize, sentence: str, voice_params: Dict, work_dir: str) -> str:
+    """One sentence the way run_pipeline renders it: TTS, then whatever DSP is left."""
+    raw = os.path.join(work_dir, "raw.wav")
+    synthesize_text(sentence, raw, voice_params, synthesize)
+    _, dsp_params = split_voice_params(voice_params, native_controls(synthesize))
+    if not needs_dsp(dsp_params):
+        return raw
+    return modulate(raw, dsp_params, os.path.join(work_dir, "mod.wav"))
+
+
+def time_sentences(synthesize, sentences: List[str], params: List[Dict], work_dir: str) -> List[float]:
+    samples = []
+    for sentence, voice_params in zip(sentences, params):
+        t0 = time.perf_counter()
+        render_sentence(synthesize, sentence, voice_params, work_dir)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sentences", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3, help="end-to-end runs per backend (best is kept)")
+    args = parser.parse_args(argv)
+
+    emotion_detector.set_detector(StubDetector())
+    sentences = make_corpus(args.sentences)
+    params = [get_voice_params(EMOTIONS[i % len(EMOTIONS)], ("low", "medium", "high")[i % 3])
+              for i in range(len(sentences))]
+    backends = {"dsp": stub_synthesize, "native": stub_synthesize_prosody}
+
+    work_dir = tempfile.mkdtemp(prefix="empathy_bench_prosody_")
+    try:
+        print(f"{len(sentences)} sentences, per-sentence render (TTS + remaining DSP):")
+        medians = {}
+        for name, synthesize in backends.items():
+            samples = time_sentences(synthesize, sentences, params, work_dir)
+            medians[name] = statistics.median(samples)
+            print(f"  {name:<7} median {medians[name] * 1000:6.2f} ms   mean {statistics.mean(samples) * 1000:6.2f} ms")
+        saved = medians["dsp"] - medians["native"]
+        print(f"  saving  {saved * 1000:6.2f} ms per sentence ({saved / medians['dsp']:.0%})")
+
+        if _has_punkt():
+            text = " ".join(sentences)
+            print("run_pipeline end to end:")
+            for name, synthesize in backends.items():
+                best = None
+                for n in range(args.repeat):
+                    out = run_pipeline(text, output_dir=os.path.join(work_dir, f"{name}{n}"), synthesize=synthesize)
+                    stages = out["stats"]["stages"]
+                    if best is None or stages["pipeline"]["wall_s"] < best["pipeline"]["wall_s"]:
+                        best = stages
+                per = len(out["timeline"])
+                print(f"  {name:<7} {best['pipeline']['wall_s'] * 1000 / per:6.2f} ms/sentence, "
+                      f"modulate {best.get('modulate', {}).get('wall_s', 0.0) * 1000 / per:5.2f} ms/sentence")
+        else:
+            print("NLTK punkt data not installed; skipping the end-to-end comparison")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""Sentence segmentation throughput in MB/s.
+
+Segments `--mb` megabytes of text built from the benchmark corpus
+(bench_pipeline.make_corpus) with abbreviations, numbers, quotes and
+ellipses mixed in, and times:
+ - sent_tokenize:  nltk.sent_tokenize, as the pipeline called it before
+ - punkt_spans:    PunktSegmenter.spans (model loaded once, offsets only)
+ - regex_spans:    RegexSegmenter.spans
+ - regex_sentences RegexSegmenter.sentences (spans plus the substrings)
+ - regex_stream:   stream_spans over a file-like object, 1 MB reads
+
+Also checks that stream_spans finds the same sentences as spans(). The
+Punkt rows are skipped when NLTK punkt data is not installed.
+
+Usage:
+    python -m empathy_engine.bench_segment --mb 4
+"""
+import argparse
+import io
+import statistics
+import sys
+import time
+from typing import Callable, List, Optional
+
+import nltk
+
+try:
+    from .bench_pipeline import _has_punkt, make_corpus
+    from .segmentation import PunktSegmenter, RegexSegmenter, stream_spans
+except ImportError:
+    from bench_pipeline import _has_punkt, make_corpus
+    from segmentation import PunktSegmenter, RegexSegmenter, stream_spans
+
+
+# Mixed into the corpus so the slower, context-dependent decisions are timed too
+_EXTRAS = (
+    'Mr. Smith said "hi!" to Dr. Jones.',
+    "It was 5 p.m. in the U.S. when J. K. Rowling arrived...",
+    "Then what? (Nobody knew.)",
+    "The total rose 3.5% to $1,250.75, i.e. more than expected.",
+    "She wrote “I’m fine.” He didn’t believe it!",
+)
+
+
+def make_text(megabytes: float, seed: int = 48) -> str:
+    """About `megabytes` MB of text, one paragraph per 20 sentences."""
+    sentences = make_corpus(2000, seed=seed)
+    paragraphs: List[str] = []
+    size = 0
+    i = 0
+    while size < megabytes * 1e6:
+        chunk = sentences[i % len(sentences):i % len(sentences) + 20] + [_EXTRAS[i // 20 % len(_EXTRAS)]]
+        paragraph = " ".join(chunk)
+        paragraphs.append(paragraph)
+        size += len(paragraph.encode("utf-8")) + 2
+        i += 20
+    return "\n\n".join(paragraphs)
+
+
+def _time(fn: Callable[[], object], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mb", type=float, default=4.0, help="megabytes of text to segment")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    text = make_text(args.mb)
+    mb = len(text.encode("utf-8")) / 1e6
+    regex = RegexSegmenter()
+    runs = {}
+    if _has_punkt():
+        punkt = PunktSegmenter()
+        runs["sent_tokenize"] = lambda: nltk.sent_tokenize(text)
+        runs["punkt_spans"] = lambda: sum(1 for _ in punkt.spans(text))
+    else:
+        print("NLTK punkt data not installed; timing the regex segmenter only")
+    runs["regex_spans"] = lambda: sum(1 for _ in regex.spans(text))
+    runs["regex_sentences"] = lambda: regex.sentences(text)
+    runs["regex_stream"] = lambda: sum(1 for _ in stream_spans(io.StringIO(text), segmenter=regex))
+
+    spans = list(regex.spans(text))
+    streamed = [(start, end) for start, end, _ in stream_spans(io.StringIO(text), segmenter=regex)]
+    if streamed != spans:
+        print("FAIL: stream_spans differs from spans()")
+        return 1
+    print(f"{mb:.2f} MB, {len(spans)} sentences (regex), median of {args.repeat}")
+
+    baseline = None
+    print(f"{'segmenter':<16} {'seconds':>8} {'MB/s':>8} {'speedup':>8}")
+    for name, fn in runs.items():
+        seconds = _time(fn, args.repeat)
+        baseline = baseline or seconds
+        print(f"{name:<16} {seconds:>8.3f} {mb / seconds:>8.1f} {baseline / seconds:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
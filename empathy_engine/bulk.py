@@ -0,0 +1,275 @@
+"""Offline bulk rendering of JSONL input: `python -m empathy_engine`.
+
+Each input line is `{"text": ..., "id": ...}` (`id` optional, defaults to
+the line number; ids name the output files, so keep them unique). Lines are
+read as a stream and grouped into chunks of `--chunk-size`; chunks are
+sharded across `--workers` processes, each loading the detector once, and
+rendered with render_batch() (batched detection, a TTS thread pool per
+chunk). Outputs:
+ - `<out>/audio/<id>.<ext>`       the rendered audio
+ - `<out>/timelines/<id>.json`    analysis and per-sentence timeline
+ - `<out>/manifest.jsonl`         one record per input line, successful or not
+
+The manifest doubles as the checkpoint: a record is appended only once the
+item's files are in place, so a killed run started again with the same
+arguments skips everything already recorded (`--retry-failed` also redoes
+failed items). Throughput and ETA are printed to stderr while it runs.
+
+Usage:
+    python -m empathy_engine texts.jsonl --out renders/ --workers 8 --format opus
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    from . import emotion_detector
+    from .audio_codec import OUTPUT_FORMATS, normalize_format
+    from .batch import render_batch
+    from .startup import configure_artifacts
+    from .stubs import install_from_env
+except ImportError:
+    import emotion_detector
+    from audio_codec import OUTPUT_FORMATS, normalize_format
+    from batch import render_batch
+    from startup import configure_artifacts
+    from stubs import install_from_env
+
+
+MANIFEST = "manifest.jsonl"
+PROGRESS_INTERVAL = 2.0  # seconds between progress lines
+
+_SAFE_ID = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+# Per worker process, set by _init_worker
+_synthesize = None
+
+
+def _file_stem(item_id: str) -> str:
+    if not _SAFE_ID.match(item_id) or item_id.startswith("."):
+        raise ValueError(f"id {item_id!r} must be 1-128 characters of [A-Za-z0-9._-]")
+    return item_id
+
+
+def read_items(path: str) -> Iterator[Tuple[int, Dict]]:
+    """Yield (line number, item) for each non-blank input line.
+
+    Malformed lines come back as `{"error": ...}` so they are recorded in the
+    manifest instead of stopping the run.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                if not isinstance(item, dict) or not isinstance(item.get("text"), str) or not item["text"].strip():
+                    raise ValueError("expected an object with a non-empty 'text'")
+                item["id"] = _file_stem(str(item.get("id", f"{line_no:08d}")))
+            except ValueError as e:
+                item = {"id": f"{line_no:08d}", "error": f"invalid input line: {e}"}
+            yield line_no, item
+
+
+def load_manifest(out_dir: str, retry_failed: bool = False) -> Set[int]:
+    """Line numbers already recorded in the manifest.
+
+    A torn last record from a killed run is cut off so appends stay valid.
+    """
+    path = os.path.join(out_dir, MANIFEST)
+    done: Set[int] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "rb+") as f:
+        data = f.read()
+        complete = data[: data.rfind(b"\n") + 1]
+        if len(complete) != len(data):
+            f.truncate(len(complete))
+    for line in complete.decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if retry_failed and "error" in record:
+            continue
+        done.add(record["line"])
+    return done
+
+
+def _init_worker() -> None:
+    # Runs once per worker process: the detector loads here, not per chunk
+    global _synthesize
+    configure_artifacts()
+    _synthesize = install_from_env()
+    if _synthesize is None:
+        emotion_detector._init_detector()
+
+
+def render_chunk(chunk: List[Tuple[int, Dict]], out_dir: str, output_format: str,
+                 bitrate_kbps: Optional[float], concurrency: int) -> List[Dict]:
+    """Render one chunk in a worker process. Returns its manifest records."""
+    ext = OUTPUT_FORMATS[output_format]["extension"]
+    records: List[Dict] = []
+    todo = []
+    for line_no, item in chunk:
+        if "error" in item:
+            records.append({"line": line_no, "id": item["id"], "error": item["error"]})
+        else:
+            todo.append((line_no, item))
+    if not todo:
+        return records
+
+    staging = tempfile.mkdtemp(prefix="bulk_", dir=os.path.join(out_dir, "temp"))
+    try:
+        batch = render_batch(
+            [item["text"] for _, item in todo], output_dir=staging, synthesize=_synthesize,
+            output_format=output_format, bitrate_kbps=bitrate_kbps, concurrency=concurrency,
+        )
+        moved: Dict[str, str] = {}
+        for (line_no, item), result in zip(todo, batch["items"]):
+            record = {"line": line_no, "id": item["id"]}
+            if "error" in result:
+                record["error"] = result["error"]
+                records.append(record)
+                continue
+            audio_path = os.path.join(out_dir, "audio", f"{item['id']}.{ext}")
+            timeline_path = os.path.join(out_dir, "timelines", f"{item['id']}.json")
+            analysis = {k: v for k, v in result.items() if k not in ("output_audio_path", "index")}
+            _write_json(timeline_path, dict(analysis, id=item["id"], text=item["text"]))
+            src = result["output_audio_path"]
+            if src in moved:
+                # Repeated texts in a chunk share one rendered file
+                shutil.copyfile(moved[src], audio_path)
+            else:
+                os.replace(src, audio_path)
+                moved[src] = audio_path
+            record.update(
+                audio=os.path.relpath(audio_path, out_dir),
+                timeline=os.path.relpath(timeline_path, out_dir),
+                sentences=len(result["timeline"]),
+                dominant_emotion=result["dominant_emotion"],
+            )
+            if result.get("degraded_sentences"):
+                # Some sentences came from the TTS fallback
+                record["degraded_sentences"] = result["degraded_sentences"]
+            records.append(record)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return records
+
+
+def _write_json(path: str, data: Dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _chunks(items: Iterator[Tuple[int, Dict]], size: int) -> Iterator[List[Tuple[int, Dict]]]:
+    chunk: List[Tuple[int, Dict]] = []
+    for entry in items:
+        chunk.append(entry)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _format_eta(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}m{seconds % 60:02d}s"
+
+
+def run(input_path: str, out_dir: str, workers: int, output_format: str = "wav",
+        bitrate_kbps: Optional[float] = None, chunk_size: int = 32, concurrency: int = 4,
+        retry_failed: bool = False) -> Dict:
+    """Render every pending line of `input_path` into `out_dir`. Returns run stats."""
+    output_format = normalize_format(output_format)
+    for sub in ("audio", "timelines", "temp"):
+        os.makedirs(os.path.join(out_dir, sub), exist_ok=True)
+    done = load_manifest(out_dir, retry_failed)
+    with open(input_path, "rb") as f:
+        total = sum(1 for line in f if line.strip())
+    remaining = max(0, total - len(done))
+    print(f"{total} items, {len(done)} already done, {remaining} to render with {workers} workers", file=sys.stderr)
+
+    pending = (entry for entry in read_items(input_path) if entry[0] not in done)
+    stats = {"rendered": 0, "failed": 0}
+    started = last_report = time.perf_counter()
+    # spawn: workers import the model themselves instead of inheriting a copy
+    ctx = multiprocessing.get_context("spawn")
+    with open(os.path.join(out_dir, MANIFEST), "a", encoding="utf-8") as manifest, \
+            ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker) as pool:
+        in_flight = set()
+        chunks = _chunks(pending, chunk_size)
+        try:
+            while True:
+                # Keep two chunks per worker queued so the input is never read far ahead
+                while len(in_flight) < 2 * workers:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    in_flight.add(pool.submit(render_chunk, chunk, out_dir, output_format, bitrate_kbps, concurrency))
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    for record in future.result():
+                        manifest.write(json.dumps(record) + "\n")
+                        stats["failed" if "error" in record else "rendered"] += 1
+                    manifest.flush()
+                    os.fsync(manifest.fileno())
+
+                now = time.perf_counter()
+                if now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    n = stats["rendered"] + stats["failed"]
+                    rate = n / (now - started)
+                    eta = _format_eta((remaining - n) / rate) if rate > 0 else "?"
+                    print(f"{len(done) + n}/{total} ({(len(done) + n) / max(total, 1):.1%})  "
+                          f"{rate:.1f} texts/s  ETA {eta}  failed {stats['failed']}", file=sys.stderr)
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["texts_per_s"] = (stats["rendered"] + stats["failed"]) / stats["seconds"] if stats["seconds"] else 0.0
+    shutil.rmtree(os.path.join(out_dir, "temp"), ignore_errors=True)
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m empathy_engine", description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL file, one {\"text\", \"id\"} object per line")
+    parser.add_argument("--out", required=True, help="output directory (also holds the checkpoint manifest)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--format", default="wav", choices=sorted(OUTPUT_FORMATS))
+    parser.add_argument("--bitrate", type=float, help="kbps for opus/mp3")
+    parser.add_argument("--chunk-size", type=int, default=32, help="texts per batched detection/TTS chunk")
+    parser.add_argument("--tts-concurrency", type=int, default=4, help="TTS threads per worker")
+    parser.add_argument("--retry-failed", action="store_true", help="also redo items that failed before")
+    parser.add_argument("--stub", action="store_true", help="offline stub detector and TTS (EMPATHY_STUB_BACKENDS=1)")
+    args = parser.parse_args(argv)
+
+    if args.stub:
+        os.environ["EMPATHY_STUB_BACKENDS"] = "1"
+    try:
+        stats = run(args.input, args.out, max(1, args.workers), args.format, args.bitrate,
+                    max(1, args.chunk_size), max(1, args.tts_concurrency), args.retry_failed)
+    except KeyboardInterrupt:
+        print("Interrupted; run again with the same arguments to resume.", file=sys.stderr)
+        return 130
+    print(f"rendered {stats['rendered']}, failed {stats['failed']} in {stats['seconds']:.1f}s "
+          f"({stats['texts_per_s']:.1f} texts/s)", file=sys.stderr)
+    return 1 if stats["failed"] else 0
@@ -15,6 +15,9 @@ Design philosophy (revised):
   - Bug fix: sadness medium/low pitch corrected to negative (was erroneously positive).
 """
 
+import hashlib
+import json
+import os
 from typing import Dict
 
 
@@ -259,6 +262,53 @@ EMOTION_VOICE_MAP: Dict[str, Dict[str, Dict]] = {
 }
 
 
+class VoiceParams(dict):
+    """Read-only voice parameter dict; still JSON-serializable like a dict.
+
+    Copy with `dict(params)` to get a mutable version.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("voice parameters are read-only; copy with dict() first")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return VoiceParams, (dict(self),)
+
+
+# Shared table entries are handed out by get_voice_params, so freeze them
+EMOTION_VOICE_MAP = {
+    emotion: {intensity: VoiceParams(params) for intensity, params in levels.items()}
+    for emotion, levels in EMOTION_VOICE_MAP.items()
+}
+
+
+# How timeline voice params are picked (see voice_table.timeline_voice_params):
+#  - EMPATHY_VOICE_INTERPOLATE=1: interpolate continuously by confidence
+#    instead of the low/medium/high buckets
+#  - EMPATHY_VOICE_TOP_K=k: confidence-weighted blend of the top k emotions
+VOICE_INTERPOLATE = os.environ.get("EMPATHY_VOICE_INTERPOLATE", "0").lower() in ("1", "true", "yes", "on")
+VOICE_TOP_K = max(1, int(os.environ.get("EMPATHY_VOICE_TOP_K", 1)))
+
+
+def _voice_map_version() -> str:
+    """Short content hash of the mapping tables; changes whenever they are edited."""
+    tables = [EMOTION_VOICE_MAP, EMOTION_VALENCE]
+    if VOICE_INTERPOLATE or VOICE_TOP_K > 1:
+        # Only non-default modes change the hash, so existing cache keys stay valid
+        tables.append({"interpolate": VOICE_INTERPOLATE, "top_k": VOICE_TOP_K})
+    payload = json.dumps(tables, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
 def get_voice_params(emotion: str, intensity: str) -> Dict:
     """Return voice parameters for a given emotion and intensity.
 
@@ -397,10 +447,14 @@ def apply_base_pitch_to_params(sentence_params: Dict, base_pitch: float) -> Dict
         base_pitch:      float from compute_base_pitch()
 
     Returns:
-        New dict with adjusted pitch_semitones clamped to [-5, +5]; original
-        dict is not mutated.
+        New read-only dict with adjusted pitch_semitones clamped to [-5, +5];
+        original dict is not mutated.
     """
     result = dict(sentence_params)
     current_pitch = result.get("pitch_semitones", 0)
     result["pitch_semitones"] = max(-5.0, min(5.0, current_pitch + base_pitch))
-    return result
\ No newline at end of file
+    return VoiceParams(result)
+
+
+# Used in render cache keys so cached audio is invalidated by mapping edits
+VOICE_MAP_VERSION = _voice_map_version()
@@ -0,0 +1,232 @@
+"""Incremental re-rendering for documents that are edited between renders.
+
+`DocumentRenderer` keeps per-sentence artifacts across renders of the same
+document:
+ - emotion scores, keyed by sentence hash
+ - raw TTS audio, keyed by sentence hash plus the voice params the TTS
+   engine applied natively (see tts_engine.native_prosody), if any
+ - modulated audio, keyed by sentence hash plus the voice params (including
+   the corpus-level base_pitch) it was rendered with
+
+The sentence hash is all the context the caches need. Detection scores
+each sentence on its own and timeline_voice_params() maps each entry's
+emotions to voice params independently. Neighbouring sentences only reach a
+sentence through the corpus-level base_pitch. base_pitch is part of the
+voice params that cached audio is checked against, so a shift beyond
+`pitch_tolerance` re-renders the sentence.
+
+On each render the new sentence list is diffed against the previous version.
+Only new or edited sentences go through detection and TTS; a sentence is
+re-modulated only when its voice params moved, e.g. because the edit shifted
+the corpus-level base_pitch by more than `pitch_tolerance` semitones. The
+output is then re-mixed from the cached segments, so a one-word edit costs
+roughly one sentence of detection + TTS + modulation plus the mixdown.
+Sentences rendered by the TTS fallback (`degraded_sentences`) are not
+cached and go through TTS again on the next render.
+
+Example:
+    with DocumentRenderer() as doc:
+        doc.render(draft)
+        doc.render(edited_draft)  # only the edited sentences are re-processed
+"""
+import difflib
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pydub import AudioSegment
+
+try:
+    from .emotion_detector import apply_prosody_to_timeline, score_sentences, summarize_timeline
+    from .tts_engine import native_controls, needs_dsp, split_voice_params, synthesize_sentence, synthesize_text
+    from .voice_modulator import modulate_segment
+    from .audio_codec import OUTPUT_FORMATS, export_audio, normalize_format
+    from .pipeline import mixdown, resolve_voice_params
+    from . import metrics, segmentation
+except ImportError:
+    from emotion_detector import apply_prosody_to_timeline, score_sentences, summarize_timeline
+    from tts_engine import native_controls, needs_dsp, split_voice_params, synthesize_sentence, synthesize_text
+    from voice_modulator import modulate_segment
+    from audio_codec import OUTPUT_FORMATS, export_audio, normalize_format
+    from pipeline import mixdown, resolve_voice_params
+    import metrics
+    import segmentation
+
+
+def _sentence_key(sentence: str) -> str:
+    # Context (base_pitch) is checked through the voice params, see above
+    return hashlib.sha256(sentence.encode("utf-8")).hexdigest()
+
+
+class DocumentRenderer:
+    """Renders successive versions of one document, reusing unchanged sentences.
+
+    Renders of a single instance are serialized; use one instance per document.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = "static/audio",
+        synthesize: Optional[Callable[[str, str], str]] = None,
+        output_format: str = "wav",
+        bitrate_kbps: Optional[float] = None,
+        pitch_tolerance: float = 0.05,
+    ):
+        self.output_dir = output_dir
+        self.synthesize = synthesize or synthesize_sentence
+        self.output_format = normalize_format(output_format)
+        self.bitrate_kbps = bitrate_kbps
+        self.pitch_tolerance = float(pitch_tolerance)
+
+        scratch_root = os.path.join(output_dir, "temp")
+        os.makedirs(scratch_root, exist_ok=True)
+        self._work_dir = tempfile.mkdtemp(prefix="doc_", dir=scratch_root)
+
+        self._sentences: List[str] = []
+        self._entries: Dict[str, Dict] = {}
+        self._raw: Dict[str, Tuple[Dict, AudioSegment]] = {}
+        self._modulated: Dict[str, Tuple[Dict, AudioSegment]] = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "DocumentRenderer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Drop cached artifacts and remove the scratch directory."""
+        self._entries.clear()
+        self._raw.clear()
+        self._modulated.clear()
+        shutil.rmtree(self._work_dir, ignore_errors=True)
+
+    def _params_match(self, cached: Dict, wanted: Dict) -> bool:
+        return (
+            cached.get("speed") == wanted.get("speed")
+            and cached.get("volume_db") == wanted.get("volume_db")
+            and abs(float(cached.get("pitch_semitones", 0.0)) - float(wanted.get("pitch_semitones", 0.0)))
+            <= self.pitch_tolerance
+        )
+
+    def _raw_audio(self, key: str, sentence: str, voice_params: Dict) -> Tuple[AudioSegment, bool]:
+        # (audio, degraded): degraded audio came from the TTS fallback
+        path = os.path.join(self._work_dir, f"{key}.wav")
+        try:
+            with metrics.stage("tts"):
+                _, degraded = synthesize_text(sentence, path, voice_params, self.synthesize)
+            return AudioSegment.from_wav(path), degraded
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def render(self, text: str) -> Dict:
+        """Render `text`, re-processing only what changed since the last render.
+
+        Returns the same structure as run_pipeline() plus `render_stats`.
+        """
+        if not isinstance(text, str):
+            raise TypeError("text must be a string")
+
+        with self._lock, metrics.track_run() as run:
+            with metrics.stage("document"):
+                out = self._render(text)
+        out["stats"] = run.as_dict()
+        return out
+
+    def _render(self, text: str) -> Dict:
+        with metrics.stage("segment"):
+            sentences = segmentation.sentences(text)
+        metrics.count("sentences", len(sentences))
+        matcher = difflib.SequenceMatcher(a=self._sentences, b=sentences, autojunk=False)
+        changed = [
+            j
+            for tag, _i1, _i2, j1, j2 in matcher.get_opcodes()
+            if tag != "equal"
+            for j in range(j1, j2)
+        ]
+        keys = [_sentence_key(s) for s in sentences]
+        stats = {"sentences": len(sentences), "changed": changed, "detected": 0, "synthesized": 0, "modulated": 0}
+
+        # Step 1: batched scores for new sentences, then corpus-level prosody
+        missing = {k: s for k, s in zip(keys, sentences) if k not in self._entries}
+        if missing:
+            for key, entry in zip(missing, score_sentences(list(missing.values()))):
+                self._entries[key] = entry
+            stats["detected"] = len(missing)
+        timeline = [self._entries[key] for key in keys]
+        result = apply_prosody_to_timeline(summarize_timeline(timeline))
+        timeline = result.get("timeline", [])
+
+        # Steps 2-3: TTS for new sentences (or where natively applied params
+        # moved), modulation where the rest moved
+        native = native_controls(self.synthesize)
+        segments = []
+        degraded: List[int] = []
+        for n, (key, item) in enumerate(zip(keys, timeline), start=1):
+            wanted = resolve_voice_params(item)
+            engine_params, dsp_params = split_voice_params(wanted, native)
+            raw = self._raw.get(key)
+            fallback_used = False
+            if raw is None or not self._params_match(raw[0], engine_params):
+                audio, fallback_used = self._raw_audio(key, item.get("sentence", ""), wanted)
+                raw = (engine_params, audio)
+                self._modulated.pop(key, None)
+                stats["synthesized"] += 1
+                if fallback_used:
+                    # Fallback audio is used once and not kept: the next render retries the TTS
+                    degraded.append(n)
+                else:
+                    self._raw[key] = raw
+
+            cached = self._modulated.get(key)
+            if cached is None or not self._params_match(cached[0], wanted):
+                audio = modulate_segment(raw[1], dsp_params) if needs_dsp(dsp_params) else raw[1]
+                # The engine's share is what the raw audio was made with
+                cached = (dict(wanted, **raw[0]), audio)
+                if not fallback_used:
+                    self._modulated[key] = cached
+                stats["modulated"] += 1
+            # Report the params the audio was actually rendered with
+            item["voice_params"] = cached[0]
+            segments.append(cached[1])
+
+        # Keep artifacts for the current version only
+        live = set(keys)
+        for cache in (self._entries, self._raw, self._modulated):
+            for key in [k for k in cache if k not in live]:
+                del cache[key]
+        self._sentences = sentences
+
+        # Step 4: re-mix from segments and move the output into place
+        spec = OUTPUT_FORMATS[self.output_format]
+        out_name = f"empathy_output_{uuid.uuid4().hex}.{spec['extension']}"
+        out_path = os.path.join(self.output_dir, out_name)
+        staged_path = os.path.join(self._work_dir, out_name)
+        with metrics.stage("mixdown"):
+            final = mixdown(segments)
+        with metrics.stage("export"):
+            export_audio(final, staged_path, self.output_format, self.bitrate_kbps)
+        metrics.count("bytes_written", os.path.getsize(staged_path))
+        os.replace(staged_path, out_path)
+
+        stats["reused"] = len(sentences) - stats["modulated"]
+        return {
+            "dominant_emotion": result.get("dominant_emotion"),
+            "weighted_emotion": result.get("weighted_emotion"),
+            "volatility_score": result.get("volatility_score"),
+            "valence_score": result.get("valence_score"),
+            "base_pitch": result.get("base_pitch"),
+            "timeline": timeline,
+            "output_audio_path": out_path,
+            "output_format": self.output_format,
+            "media_type": spec["media_type"],
+            "degraded_sentences": degraded,
+            "render_stats": stats,
+        }
@@ -10,37 +10,149 @@ This model predicts a fine-grained set of 27 emotions plus `neutral` (GoEmotions
 Corpus analysis includes emotional valence and prosody modeling for subtle
 global pitch adjustment based on text sentiment and emotional stability.
 """
-from typing import Dict
-import nltk
+from typing import Callable, Dict, List, Optional, Tuple
+import hashlib
+import os
+import threading
 import json
 from contextlib import asynccontextmanager
 
 try:
-    from .config import compute_valence_score, compute_base_pitch, apply_base_pitch_to_params, get_voice_params
+    from .config import compute_valence_score, compute_base_pitch
+    from .voice_table import timeline_voice_params
+    from .single_flight import SingleFlight
+    from . import metrics, segmentation
 except ImportError:
     # Fallback for __main__ execution
-    from config import compute_valence_score, compute_base_pitch, apply_base_pitch_to_params, get_voice_params
+    from config import compute_valence_score, compute_base_pitch
+    from voice_table import timeline_voice_params
+    from single_flight import SingleFlight
+    import metrics
+    import segmentation
 
-try:
-    from transformers import pipeline
-except Exception as e:  # pragma: no cover - helpful error when deps missing
-    raise ImportError(
-        "transformers is required to use emotion_detector. Install dependencies: pip install -r requirements.txt"
-    ) from e
+MODEL_NAME = "SamLowe/roberta-base-go_emotions"
+# Pin a commit hash in production so render caches key on the exact weights
+MODEL_REVISION = os.environ.get("EMPATHY_MODEL_REVISION", "main")
+# Local directory with the saved model (see `artifacts`); loaded without network
+MODEL_PATH = os.environ.get("EMPATHY_MODEL_PATH") or None
+
+# Sentences per model call in detect_emotions()/analyze_corpus()
+DETECT_BATCH_SIZE = int(os.environ.get("EMPATHY_DETECT_BATCH_SIZE", 8))
+
+
+def _default_threads() -> Optional[int]:
+    # Several server processes (uvicorn --workers sets WEB_CONCURRENCY) would
+    # each start one torch thread per core; split the cores between them
+    workers = int(os.environ.get("WEB_CONCURRENCY") or 1)
+    return max(1, (os.cpu_count() or 1) // workers) if workers > 1 else None
+
+
+# torch intra-op threads for the model; None leaves torch's default. Both
+# settings may also come from a tuning profile (see autotune, startup)
+TORCH_THREADS = int(os.environ.get("EMPATHY_TORCH_THREADS") or 0) or _default_threads()
 
+# (MODEL_PATH, version) of the last model_version() call
+_local_version: Optional[Tuple[str, str]] = None
 
 _detector = None
+_detector_lock = threading.Lock()
+# In-flight model calls per sentence text, shared by concurrent callers
+_detections = SingleFlight("detect")
+
+
+def model_version() -> str:
+    """Identity of the configured weights, for cache keys and ETags.
+
+    `MODEL_NAME@MODEL_REVISION` for a Hub model. A local model
+    (EMPATHY_MODEL_PATH or a bundle) is loaded whatever the revision says, so
+    its version is the commit recorded in the bundle's bundle.json, else a
+    hash of the model directory (see _hash_model_dir).
+    """
+    global _local_version
+    if not MODEL_PATH:
+        return f"{MODEL_NAME}@{MODEL_REVISION}"
+    cached = _local_version
+    if cached is not None and cached[0] == MODEL_PATH:
+        return cached[1]
+    model_dir = os.path.abspath(MODEL_PATH)
+    manifest = {}
+    if os.path.basename(model_dir) == "model":
+        try:
+            with open(os.path.join(os.path.dirname(model_dir), "bundle.json"), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+    if manifest.get("commit"):
+        version = f"{manifest.get('model', MODEL_NAME)}@{manifest['commit']}"
+    else:
+        version = f"local@{_hash_model_dir(model_dir)}"
+    _local_version = (MODEL_PATH, version)
+    return version
+
+
+def _hash_model_dir(model_dir: str, sample_bytes: int = 1 << 20) -> str:
+    # Small files (config, tokenizer) in full; weight files by size plus their
+    # first, middle and last `sample_bytes`, so startup does not read them whole
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(model_dir)):
+        path = os.path.join(model_dir, name)
+        if not os.path.isfile(path):
+            continue
+        size = os.path.getsize(path)
+        digest.update(f"{name}:{size}\n".encode("utf-8"))
+        with open(path, "rb") as f:
+            if size <= 3 * sample_bytes:
+                digest.update(f.read())
+                continue
+            for start in (0, size // 2, size - sample_bytes):
+                f.seek(start)
+                digest.update(f.read(sample_bytes))
+    return digest.hexdigest()[:16]
 
 
 def _init_detector():
     global _detector
-    if _detector is None:
+    if _detector is not None:
+        return
+    # Concurrent first requests must not each load the model
+    with _detector_lock:
+        if _detector is not None:
+            return
+        try:
+            from transformers import pipeline
+        except Exception as e:  # pragma: no cover - helpful error when deps missing
+            raise ImportError(
+                "transformers is required to use emotion_detector. Install dependencies: pip install -r requirements.txt"
+            ) from e
+        if TORCH_THREADS:
+            set_torch_threads(TORCH_THREADS)
         # return_all_scores=True gives scores for all labels
-        _detector = pipeline(
-            "text-classification",
-            model="SamLowe/roberta-base-go_emotions",
-            return_all_scores=True,
-        )
+        if MODEL_PATH:
+            _detector = pipeline("text-classification", model=MODEL_PATH, return_all_scores=True)
+        else:
+            _detector = pipeline(
+                "text-classification",
+                model=MODEL_NAME,
+                revision=MODEL_REVISION,
+                return_all_scores=True,
+            )
+
+
+def set_torch_threads(threads: int) -> None:
+    """Set torch's intra-op thread count for this process."""
+    import torch
+
+    torch.set_num_threads(int(threads))
+
+
+def set_detector(detector: Callable) -> None:
+    """Replace the model with any callable shaped like the HF pipeline.
+
+    Used by stress tests and benchmarks to run offline with a stub detector.
+    """
+    global _detector
+    with _detector_lock:
+        _detector = detector
 
 
 # GoEmotions label set (informational)
@@ -102,9 +214,78 @@ def detect_emotion(text: str) -> Dict:
 
     _init_detector()
 
-    # pipeline output can vary across HF versions and model wrappers.
-    raw = _detector(text)
+    def detect(_cancel):
+        # pipeline output can vary across HF versions and model wrappers.
+        with metrics.stage("detect"):
+            raw = _detector(text)
+        return _detection_from_output(raw)
+
+    # Concurrent requests for the same sentence share one model call
+    return dict(_detections.do(text, detect))
+
+
+def detect_emotions(texts: List[str], batch_size: Optional[int] = None,
+                    cancel: Optional[threading.Event] = None) -> List[Dict]:
+    """Batched detect_emotion(): one model call per `batch_size` texts.
 
+    Returns one dict per input text, in order, shaped like detect_emotion().
+    `batch_size` defaults to DETECT_BATCH_SIZE. Once `cancel` is set (and
+    every other caller sharing the texts has cancelled too) no further
+    batches are run and concurrent.futures.CancelledError is raised.
+    """
+    for text in texts:
+        if not isinstance(text, str):
+            raise TypeError("text must be a string")
+
+    results: List[Dict] = [
+        {"emotion": "neutral", "confidence": 0.0, "all_scores": {}, "intensity": "low"} for _ in texts
+    ]
+    todo = [i for i, t in enumerate(texts) if t.strip() != ""]
+    if not todo:
+        return results
+
+    _init_detector()
+    batch_size = batch_size or DETECT_BATCH_SIZE
+    # Each distinct text is scored once; texts another call is already
+    # scoring are waited on instead of sent to the model again
+    unique = list(dict.fromkeys(texts[i] for i in todo))
+    if len(unique) < len(todo):
+        metrics.count("detect_coalesced", len(todo) - len(unique))
+    detections: Dict[str, Dict] = {}
+    while unique:
+        leading, following = _detections.claim(unique, cancel)
+        pending = list(leading)
+        try:
+            for start in range(0, len(pending), batch_size):
+                if all(_detections.abandoned(leading[t]) for t in pending[start:]):
+                    raise _detections.cancelled_error("detection cancelled")
+                chunk = pending[start:start + batch_size]
+                with metrics.stage("detect"):
+                    raw = _detector(chunk, batch_size=batch_size)
+                if not isinstance(raw, list) or len(raw) != len(chunk):
+                    raise RuntimeError("unexpected batched model output: %r" % (type(raw),))
+                for text, item in zip(chunk, raw):
+                    detections[text] = _detection_from_output([item])
+                    _detections.resolve(text, detections[text])
+        except BaseException as e:
+            _detections.fail([t for t in pending if t not in detections], e)
+            raise
+        unique = []
+        for text, call in following.items():
+            try:
+                detections[text] = _detections.wait(call, cancel)
+            except _detections.cancelled_error:
+                if cancel is not None and cancel.is_set():
+                    raise
+                # Abandoned by the callers that claimed it, not by us: score it again
+                unique.append(text)
+    for i in todo:
+        results[i] = dict(detections[texts[i]])
+    return results
+
+
+def _detection_from_output(raw) -> Dict:
+    """Normalize one raw model output into the detect_emotion() result dict."""
     # Normalize into a mapping label->score
     all_scores = {}
 
@@ -222,9 +403,11 @@ def compute_emotional_volatility(timeline: list) -> float:
     return changes / (len(tops) - 1)
 
 
-def analyze_corpus(text: str) -> Dict:
+def analyze_corpus(text: str, cancel: Optional[threading.Event] = None) -> Dict:
     """Analyze a long text corpus and return timeline, dominant, weighted, and volatility.
 
+    `cancel` is passed on to detect_emotions().
+
     Timeline format:
 
     [
@@ -245,18 +428,44 @@ def analyze_corpus(text: str) -> Dict:
     #     except Exception:
     #         pass
 
-    sentences = nltk.sent_tokenize(text)
-    timeline = []
-    for s in sentences:
-        det = detect_emotion(s)
-        # convert all_scores dict to sorted list of tuples
-        all_scores = det.get("all_scores", {})
-        emotions_list = [
-            {"label": lbl, "confidence": float(score), "intensity": _intensity_from_score(float(score))}
-            for lbl, score in sorted(all_scores.items(), key=lambda kv: kv[1], reverse=True)
-        ]
-        timeline.append({"sentence": s, "emotions": emotions_list})
+    with metrics.stage("segment"):
+        sentences = segmentation.sentences(text)
+    metrics.count("sentences", len(sentences))
+    timeline = score_sentences(sentences, cancel=cancel)
+    return summarize_timeline(timeline)
+
+
+def score_sentence(sentence: str) -> Dict:
+    """Detect emotions for one sentence and return its timeline entry.
+
+    Entry format: {"sentence": "...", "emotions": [{"label", "confidence", "intensity"}, ...]}
+    with emotions sorted by confidence, highest first.
+    """
+    return _timeline_entry(sentence, detect_emotion(sentence))
+
 
+def score_sentences(sentences: List[str], batch_size: Optional[int] = None,
+                    cancel: Optional[threading.Event] = None) -> List[Dict]:
+    """score_sentence() for many sentences using batched detection."""
+    detections = detect_emotions(sentences, batch_size, cancel)
+    return [_timeline_entry(s, det) for s, det in zip(sentences, detections)]
+
+
+def _timeline_entry(sentence: str, det: Dict) -> Dict:
+    # convert all_scores dict to sorted list of tuples
+    all_scores = det.get("all_scores", {})
+    emotions_list = [
+        {"label": lbl, "confidence": float(score), "intensity": _intensity_from_score(float(score))}
+        for lbl, score in sorted(all_scores.items(), key=lambda kv: kv[1], reverse=True)
+    ]
+    return {"sentence": sentence, "emotions": emotions_list}
+
+
+def summarize_timeline(timeline: list) -> Dict:
+    """Compute corpus-level metrics for an already-scored timeline.
+
+    Returns the same structure as analyze_corpus().
+    """
     dominant = get_dominant_emotion(timeline)
     weighted = get_weighted_emotion(timeline)
     volatility = compute_emotional_volatility(timeline)
@@ -294,27 +503,17 @@ def apply_prosody_to_timeline(corpus_result: Dict) -> Dict:
     timeline = corpus_result.get("timeline", [])
     base_pitch = corpus_result.get("base_pitch", 0.0)
 
-    enhanced_timeline = []
-    for item in timeline:
-        sentence = item.get("sentence", "")
-        emotions = item.get("emotions", [])
+    # Voice params for every sentence at once, base_pitch applied (see voice_table)
+    all_params = timeline_voice_params(timeline, base_pitch)
 
-        # Get the top emotion and its intensity to select voice parameters
-        voice_params = None
-        if emotions:
-            top_emotion = emotions[0]
-            emotion_label = top_emotion.get("label", "neutral")
-            intensity = top_emotion.get("intensity", "medium")
-            voice_params = get_voice_params(emotion_label, intensity)
-            # Apply base_pitch modulation
-            voice_params = apply_base_pitch_to_params(voice_params, base_pitch)
-
-        enhanced_entry = {
-            "sentence": sentence,
-            "emotions": emotions,
+    enhanced_timeline = [
+        {
+            "sentence": item.get("sentence", ""),
+            "emotions": item.get("emotions", []),
             "voice_params": voice_params,
         }
-        enhanced_timeline.append(enhanced_entry)
+        for item, voice_params in zip(timeline, all_params)
+    ]
 
     result = dict(corpus_result)
     result["timeline"] = enhanced_timeline
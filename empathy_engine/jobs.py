@@ -0,0 +1,351 @@
+"""Durable job queue and worker processes for long renders.
+
+`JobQueue` keeps jobs in a SQLite database (WAL mode, safe to share between
+processes). A job moves through `queued` -> `running` -> `done` / `failed`:
+ - `claim()` hands the oldest runnable job to a worker under a lease
+ - the worker renews the lease while it records progress; a job whose
+   lease expires (worker crashed or the server restarted) goes back to
+   `queued`, or to `failed` once it has used up `max_attempts`
+ - a render error re-queues the job with exponential backoff until
+   `max_attempts` is reached
+A retried job renders again from the start. Its output goes through the
+shared OutputStore, so a render that finished just before a crash is a
+cache hit.
+
+`JobWorkers` runs `processes` worker processes, each looping over
+`claim()` and `run_pipeline`. Progress is stored per job as the number of
+sentences that finished detection, TTS and modulation.
+"""
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+try:
+    from .pipeline import PipelineCancelled, run_pipeline
+    from .output_store import OutputStore
+    from .stubs import install_from_env
+    from .startup import configure_artifacts
+except ImportError:
+    from pipeline import PipelineCancelled, run_pipeline
+    from output_store import OutputStore
+    from stubs import install_from_env
+    from startup import configure_artifacts
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           TEXT PRIMARY KEY,
+    status       TEXT NOT NULL,
+    text         TEXT NOT NULL,
+    options      TEXT NOT NULL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    progress     TEXT,
+    result       TEXT,
+    error        TEXT,
+    worker       TEXT,
+    lease_until  REAL,
+    not_before   REAL NOT NULL DEFAULT 0,
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_runnable ON jobs (status, not_before, created_at);
+"""
+
+# Result fields dropped before storing: per-sentence data is not needed to serve the job
+_RESULT_DROP = ("timeline", "sentence_audio_paths")
+
+
+class JobQueue:
+    """SQLite-backed job table; each method uses its own short connection."""
+
+    def __init__(self, db_path: str, max_attempts: int = 3, retry_backoff: float = 5.0):
+        self.db_path = db_path
+        self.max_attempts = int(max_attempts)
+        self.retry_backoff = float(retry_backoff)
+        parent = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(parent, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Autocommit; claim() opens its own transaction
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # ── Producer side ────────────────────────────────────────────────────
+
+    def submit(self, text: str, options: Optional[Dict] = None) -> str:
+        """Queue a render of `text`; `options` are run_pipeline keyword args."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, text, options, max_attempts, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, text, json.dumps(options or {}), self.max_attempts, now, now),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for field in ("options", "progress", "result"):
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update({status: n for status, n in rows})
+        return counts
+
+    def prune(self, max_age_seconds: float) -> int:
+        """Delete finished jobs last updated more than `max_age_seconds` ago."""
+        cutoff = time.time() - max_age_seconds
+        with self._connect() as conn:
+            cur = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, cutoff)
+            )
+        return cur.rowcount
+
+    # ── Worker side ──────────────────────────────────────────────────────
+
+    def claim(self, worker: str, lease_seconds: float) -> Optional[Dict]:
+        """Take the oldest runnable job, recovering expired leases first."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END,"
+                    " error = 'worker lost (lease expired)', worker = NULL, lease_until = NULL, updated_at = ?"
+                    " WHERE status = ? AND lease_until < ?",
+                    (FAILED, QUEUED, now, RUNNING, now),
+                )
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? AND not_before <= ? ORDER BY created_at LIMIT 1",
+                    (QUEUED, now),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, lease_until = ?,"
+                        " progress = NULL, error = NULL, updated_at = ? WHERE id = ?",
+                        (RUNNING, worker, now + lease_seconds, now, row["id"]),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row is not None else None
+
+    def heartbeat(self, job_id: str, worker: str, lease_seconds: float, progress: Optional[Dict] = None) -> bool:
+        """Extend the lease (and store progress). False if the job was taken away."""
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET lease_until = ?, progress = COALESCE(?, progress), updated_at = ?"
+                " WHERE id = ? AND worker = ? AND status = ?",
+                (now + lease_seconds, json.dumps(progress) if progress is not None else None, now, job_id, worker, RUNNING),
+            )
+        return cur.rowcount == 1
+
+    def complete(self, job_id: str, worker: str, result: Dict, progress: Optional[Dict] = None) -> bool:
+        stored = {k: v for k, v in result.items() if k not in _RESULT_DROP}
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, progress = COALESCE(?, progress), worker = NULL,"
+                " lease_until = NULL, updated_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (DONE, json.dumps(stored), json.dumps(progress) if progress is not None else None,
+                 time.time(), job_id, worker, RUNNING),
+            )
+        return cur.rowcount == 1
+
+    def fail(self, job_id: str, worker: str, error: str) -> bool:
+        """Record an error: re-queue with backoff, or fail once attempts run out."""
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END,"
+                " not_before = ? + ? * (1 << (attempts - 1)), error = ?, worker = NULL, lease_until = NULL,"
+                " updated_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (FAILED, QUEUED, now, self.retry_backoff, error, now, job_id, worker, RUNNING),
+            )
+        return cur.rowcount == 1
+
+    def release(self, job_id: str, worker: str) -> bool:
+        """Put an interrupted job back without counting the attempt."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, attempts = MAX(attempts - 1, 0), worker = NULL,"
+                " lease_until = NULL, updated_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (QUEUED, time.time(), job_id, worker, RUNNING),
+            )
+        return cur.rowcount == 1
+
+
+class _JobProgress:
+    """Collects run_pipeline progress; a heartbeat thread persists it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = {"stage": "queued", "sentences": None, "detected": 0, "synthesized": 0, "modulated": 0}
+
+    def __call__(self, stage: str, done: int, total: int) -> None:
+        field = {"detect": "detected", "tts": "synthesized", "modulate": "modulated"}[stage]
+        with self._lock:
+            self.state["stage"] = stage
+            self.state["sentences"] = total
+            self.state[field] = done
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return dict(self.state)
+
+
+def _run_job(queue: JobQueue, store: OutputStore, job: Dict, worker: str, synthesize,
+             stop, lease_seconds: float, heartbeat_seconds: float) -> None:
+    progress = _JobProgress()
+    cancel = threading.Event()
+    finished = threading.Event()
+
+    def heartbeat():
+        # Renews the lease, stores progress and turns a shutdown into a cancel
+        while not finished.wait(heartbeat_seconds):
+            if stop.is_set() or not queue.heartbeat(job["id"], worker, lease_seconds, progress.snapshot()):
+                cancel.set()
+                return
+
+    beat = threading.Thread(target=heartbeat, name=f"job-heartbeat-{job['id'][:8]}", daemon=True)
+    beat.start()
+    try:
+        result = run_pipeline(
+            job["text"],
+            output_dir=store.root,
+            synthesize=synthesize,
+            store=store,
+            cancel=cancel,
+            progress=progress,
+            **job["options"],
+        )
+    except PipelineCancelled:
+        queue.release(job["id"], worker)
+        return
+    except Exception as e:
+        print(f"Job {job['id']} attempt {job['attempts']} failed: {e}")
+        queue.fail(job["id"], worker, f"{type(e).__name__}: {e}")
+        return
+    finally:
+        finished.set()
+        beat.join()
+
+    state = progress.snapshot()
+    state["stage"] = "done"
+    queue.complete(job["id"], worker, result, state)
+
+
+def worker_main(db_path: str, output_dir: str, stop, poll_interval: float = 0.5,
+                lease_seconds: float = 60.0, heartbeat_seconds: float = 1.0) -> None:
+    """Entry point of one worker process: claim and render jobs until `stop` is set."""
+    configure_artifacts()
+    synthesize = install_from_env()
+    queue = JobQueue(db_path)
+    store = OutputStore(output_dir)  # eviction is left to the API process
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    while not stop.is_set():
+        try:
+            job = queue.claim(worker, lease_seconds)
+        except sqlite3.Error as e:
+            print(f"Job worker {worker} could not claim: {e}")
+            job = None
+        if job is None:
+            stop.wait(poll_interval)
+            continue
+        _run_job(queue, store, job, worker, synthesize, stop, lease_seconds, heartbeat_seconds)
+
+
+class JobWorkers:
+    """Supervises `processes` worker processes sharing one JobQueue database.
+
+    Workers that die are replaced every `check_interval` seconds; their jobs
+    are picked up again once the lease runs out.
+    """
+
+    def __init__(self, db_path: str, output_dir: str, processes: int = 2, lease_seconds: float = 60.0,
+                 check_interval: float = 5.0):
+        self.db_path = db_path
+        self.output_dir = output_dir
+        self.processes = int(processes)
+        self.lease_seconds = float(lease_seconds)
+        self.check_interval = float(check_interval)
+        # spawn: forking a process that holds model threads or an event loop is unsafe
+        self._ctx = multiprocessing.get_context("spawn")
+        self._stop = self._ctx.Event()
+        self._procs: List = []
+        self._monitor: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the worker processes and the monitor thread (idempotent)."""
+        self._stop.clear()
+        self._spawn()
+        if self._monitor is None or not self._monitor.is_alive():
+            self._monitor = threading.Thread(target=self._watch, name="job-workers-monitor", daemon=True)
+            self._monitor.start()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.check_interval):
+            if len(self.alive()) < self.processes:
+                print("Job worker exited, starting a replacement")
+                self._spawn()
+
+    def _spawn(self) -> None:
+        for i in range(self.processes - len(self.alive())):
+            proc = self._ctx.Process(
+                target=worker_main,
+                args=(self.db_path, self.output_dir, self._stop),
+                kwargs={"lease_seconds": self.lease_seconds},
+                name=f"empathy-job-worker-{i}",
+                daemon=True,
+            )
+            proc.start()
+            self._procs.append(proc)
+
+    def alive(self) -> List:
+        self._procs = [p for p in self._procs if p.is_alive()]
+        return self._procs
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Ask workers to stop; running jobs are cancelled and re-queued."""
+        self._stop.set()
+        if self._monitor is not None:
+            self._monitor.join(timeout=self.check_interval)
+            self._monitor = None
+        deadline = time.time() + timeout
+        for proc in self._procs:
+            proc.join(max(0.0, deadline - time.time()))
+            if proc.is_alive():
+                proc.terminate()
+        self._procs = []
@@ -0,0 +1,234 @@
+"""Per-stage timing and counters for the pipeline.
+
+Stages are timed with `stage(name)` and events counted with `count(name, n)`.
+Each measurement goes to two places:
+ - the RunStats of the current `track_run()` block (one per run_pipeline
+   call), which run_pipeline attaches to its result as `stats`
+ - a process-wide registry of histograms and counters, rendered in
+   Prometheus text format by `render_prometheus()`
+
+Stage names: `segment`, `detect`, `tts`, `tts_request`, `tts_decode`,
+`modulate`, `mixdown`, `export`, `pipeline`, `document`.
+
+Wall time uses `time.perf_counter()`; CPU time is that of the calling thread
+(`time.thread_time()`), so concurrent requests don't pollute each other.
+
+Disable with `EMPATHY_METRICS=0` or `set_enabled(False)`: `stage()` then
+returns a shared no-op context manager and `count()` returns immediately.
+
+`observe_stages(observer)` additionally reports stage enter/exit to an
+object with `stage_enter(name)`/`stage_exit(name)` methods for the current
+context (used by `profiling` for per-stage memory peaks).
+"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# Seconds; spans a cached mixdown (ms) to a long multi-sentence render (minutes)
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+_enabled = os.environ.get("EMPATHY_METRICS", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def set_enabled(flag: bool) -> None:
+    global _enabled
+    _enabled = bool(flag)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+class RunStats:
+    """Timings and counters collected during one pipeline run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, float] = {}
+
+    def add_stage(self, name: str, wall: float, cpu: float) -> None:
+        with self._lock:
+            s = self.stages.setdefault(name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0})
+            s["calls"] += 1
+            s["wall_s"] += wall
+            s["cpu_s"] += cpu
+
+    def add(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "stages": {k: dict(v) for k, v in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Process-wide aggregates of every stage and counter."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        self._wall: Dict[str, _Histogram] = {}
+        self._cpu: Dict[str, float] = {}
+        self._counters: Dict[str, float] = {}
+
+    def observe_stage(self, name: str, wall: float, cpu: float) -> None:
+        with self._lock:
+            hist = self._wall.get(name)
+            if hist is None:
+                hist = self._wall[name] = _Histogram(self._buckets)
+            hist.observe(wall)
+            self._cpu[name] = self._cpu.get(name, 0.0) + cpu
+
+    def add(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def reset(self) -> None:
+        with self._lock:
+            self._wall.clear()
+            self._cpu.clear()
+            self._counters.clear()
+
+    def render_prometheus(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """Render all metrics in Prometheus text exposition format (0.0.4).
+
+        `gauges` adds point-in-time values (e.g. output store size) as
+        `empathy_<name>` gauges.
+        """
+        lines: List[str] = []
+        with self._lock:
+            lines.append("# HELP empathy_stage_wall_seconds Wall time per pipeline stage call.")
+            lines.append("# TYPE empathy_stage_wall_seconds histogram")
+            for name in sorted(self._wall):
+                hist = self._wall[name]
+                cumulative = 0
+                for bound, n in zip(hist.buckets, hist.counts):
+                    cumulative += n
+                    lines.append(f'empathy_stage_wall_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'empathy_stage_wall_seconds_bucket{{stage="{name}",le="+Inf"}} {hist.count}')
+                lines.append(f'empathy_stage_wall_seconds_sum{{stage="{name}"}} {hist.sum}')
+                lines.append(f'empathy_stage_wall_seconds_count{{stage="{name}"}} {hist.count}')
+
+            lines.append("# HELP empathy_stage_cpu_seconds_total CPU time of the calling thread per pipeline stage.")
+            lines.append("# TYPE empathy_stage_cpu_seconds_total counter")
+            for name in sorted(self._cpu):
+                lines.append(f'empathy_stage_cpu_seconds_total{{stage="{name}"}} {self._cpu[name]}')
+
+            for name in sorted(self._counters):
+                lines.append(f"# TYPE empathy_{name}_total counter")
+                lines.append(f"empathy_{name}_total {self._counters[name]}")
+
+        for name in sorted(gauges or {}):
+            lines.append(f"# TYPE empathy_{name} gauge")
+            lines.append(f"empathy_{name} {float(gauges[name])}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+_current_run: contextvars.ContextVar[Optional[RunStats]] = contextvars.ContextVar("empathy_run_stats", default=None)
+_stage_observer: contextvars.ContextVar[Optional[object]] = contextvars.ContextVar("empathy_stage_observer", default=None)
+
+
+class _Stage:
+    __slots__ = ("name", "t0", "c0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "_Stage":
+        observer = _stage_observer.get()
+        if observer is not None:
+            observer.stage_enter(self.name)
+        self.t0 = time.perf_counter()
+        self.c0 = time.thread_time()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        wall = time.perf_counter() - self.t0
+        cpu = time.thread_time() - self.c0
+        observer = _stage_observer.get()
+        if observer is not None:
+            observer.stage_exit(self.name)
+        REGISTRY.observe_stage(self.name, wall, cpu)
+        run = _current_run.get()
+        if run is not None:
+            run.add_stage(self.name, wall, cpu)
+
+
+class _NoopStage:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopStage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+def stage(name: str):
+    """Context manager timing one call of stage `name`."""
+    if not _enabled:
+        return _NOOP_STAGE
+    return _Stage(name)
+
+
+def count(name: str, n: float = 1) -> None:
+    """Add `n` to counter `name` for the current run and the registry."""
+    if not _enabled:
+        return
+    REGISTRY.add(name, n)
+    run = _current_run.get()
+    if run is not None:
+        run.add(name, n)
+
+
+@contextmanager
+def track_run() -> Iterator[RunStats]:
+    """Collect stages and counters recorded in this context into a RunStats."""
+    run = RunStats()
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+
+
+@contextmanager
+def observe_stages(observer) -> Iterator[None]:
+    """Report stage enter/exit in this context to `observer`."""
+    token = _stage_observer.set(observer)
+    try:
+        yield
+    finally:
+        _stage_observer.reset(token)
@@ -0,0 +1,355 @@
+"""Managed output directory doubling as a whole-result render cache.
+
+Each finished render is stored as two files under the store root:
+ - `<sha256>.<ext>`  the encoded audio, named by a hash of its bytes
+ - `<key>.json`      the run_pipeline result (analysis + timeline)
+
+`key` is `render_key(...)`, a hash of everything that determines the audio,
+so an identical request returns the stored artifact without re-running the
+pipeline. Audio files are content-addressed so their URLs can be cached
+forever, and renders producing identical bytes share one file.
+Analysis-only results (`analysis_key(...)`) are stored the same way as a
+single `analysis_<key>.json`. All state lives on disk, which keeps several
+worker processes sharing one directory consistent.
+
+The store is bounded: entries idle for longer than `ttl_seconds` are
+removed, then the least recently used ones until the total size is under
+`max_bytes`. Renders are the entries, not files: an audio file shared by
+several renders is deleted with the last sidecar pointing at it. Eviction
+runs on a background thread (`start()`/`stop()`) and can also be triggered
+with `evict()`.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+try:
+    from .config import VOICE_MAP_VERSION
+    from .emotion_detector import model_version
+    from .segmentation import segmenter_name
+except ImportError:
+    from config import VOICE_MAP_VERSION
+    from emotion_detector import model_version
+    from segmentation import segmenter_name
+
+
+# Files written by run_pipeline without a store; swept once idle past the TTL
+_UNMANAGED_PREFIX = "empathy_output_"
+_HEX = frozenset("0123456789abcdef")
+
+
+def _is_hash(name: str) -> bool:
+    # Render keys and audio content hashes are SHA-256 hex digests
+    return len(name) == 64 and _HEX.issuperset(name)
+
+
+def render_key(text: str, tts_backend: str, output_format: str, bitrate_kbps: Optional[float] = None) -> str:
+    """Hash of every input that determines the rendered audio."""
+    payload = json.dumps(
+        {
+            "text": text,
+            "model": model_version(),
+            "voice_map": VOICE_MAP_VERSION,
+            # Sentence splits differ between segmenters
+            "segmenter": segmenter_name(),
+            "tts": tts_backend,
+            "format": output_format,
+            "bitrate": bitrate_kbps,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def content_hash(path: str) -> str:
+    """SHA-256 hex digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def analysis_key(text: str) -> str:
+    """Hash of every input that determines the analysis (timeline and voice params)."""
+    payload = json.dumps(
+        {"text": text, "model": model_version(), "voice_map": VOICE_MAP_VERSION,
+         "segmenter": segmenter_name()},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class OutputStore:
+    """Size- and TTL-bounded store of rendered outputs keyed by render_key."""
+
+    def __init__(
+        self,
+        root: str,
+        ttl_seconds: float = 24 * 3600,
+        max_bytes: int = 1024 ** 3,
+        sweep_interval: float = 60.0,
+    ):
+        self.root = root
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_bytes = int(max_bytes)
+        self.sweep_interval = float(sweep_interval)
+        os.makedirs(root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._bytes_stored = 0
+        self._entries = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ── Cache access ─────────────────────────────────────────────────────
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """Return the stored result for `key`, or None on a miss.
+
+        A hit refreshes the entry's access time so LRU eviction keeps it.
+        """
+        meta_path = self._meta_path(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            audio_path = result["output_audio_path"]
+            now = time.time()
+            os.utime(audio_path, (now, now))
+            os.utime(meta_path, (now, now))
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self._misses += 1
+            return None
+
+        with self._lock:
+            self._hits += 1
+        result["cache_hit"] = True
+        return result
+
+    def put(self, key: str, result: Dict) -> Dict:
+        """Move `result["output_audio_path"]` into the store under `key`.
+
+        Returns a copy of `result` pointing at the stored file.
+        """
+        stored = self._store_audio(result)
+
+        # Sidecar is written last and atomically: its presence marks a complete entry
+        self._write_json(self._meta_path(key), stored)
+
+        with self._lock:
+            self._entries += 1
+            self._bytes_stored += os.path.getsize(self._meta_path(key))
+
+        stored["cache_hit"] = False
+        return stored
+
+    def put_audio(self, result: Dict) -> Dict:
+        """Like put(), but without a sidecar: the audio is servable, never a hit.
+
+        Used for degraded renders. The file is swept once idle past the TTL
+        like any other audio no sidecar points at.
+        """
+        stored = self._store_audio(result)
+        stored["cache_hit"] = False
+        return stored
+
+    def _store_audio(self, result: Dict) -> Dict:
+        src = result["output_audio_path"]
+        ext = os.path.splitext(src)[1]
+        audio_path = os.path.join(self.root, f"{content_hash(src)}{ext}")
+        new_audio = not os.path.exists(audio_path)
+        os.replace(src, audio_path)
+        if new_audio:
+            with self._lock:
+                self._bytes_stored += os.path.getsize(audio_path)
+
+        stored = {k: v for k, v in result.items() if k != "sentence_audio_paths"}
+        stored["output_audio_path"] = audio_path
+        return stored
+
+    def _write_json(self, path: str, data: Dict) -> None:
+        fd, tmp_path = tempfile.mkstemp(prefix=".meta_", dir=self.root)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _analysis_path(self, key: str) -> str:
+        return os.path.join(self.root, f"analysis_{key}.json")
+
+    def lookup_analysis(self, key: str) -> Optional[Dict]:
+        """Stored analysis for `analysis_key` `key`, or None."""
+        path = self._analysis_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                analysis = json.load(f)
+            now = time.time()
+            os.utime(path, (now, now))
+        except (OSError, ValueError):
+            return None
+        return analysis
+
+    def put_analysis(self, key: str, analysis: Dict) -> None:
+        path = self._analysis_path(key)
+        self._write_json(path, analysis)
+        with self._lock:
+            self._entries += 1
+            self._bytes_stored += os.path.getsize(path)
+
+    # ── Eviction ─────────────────────────────────────────────────────────
+
+    def evict(self) -> int:
+        """Apply the TTL and size caps now. Returns the number of entries removed.
+
+        An entry is a render (its sidecar) or a standalone file such as an
+        analysis. Audio files may be shared by several renders; one is
+        deleted only once no remaining sidecar points at it.
+        """
+        now = time.time()
+        sidecars: List[Dict] = []
+        audio: Dict[str, os.stat_result] = {}
+        standalone: List[Dict] = []
+        for de in os.scandir(self.root):
+            if not de.is_file() or de.name.startswith("."):
+                continue
+            stem, ext = os.path.splitext(de.name)
+            st = de.stat()
+            if _is_hash(stem) and ext == ".json":
+                sidecars.append({"path": de.path, "size": st.st_size, "atime": st.st_mtime})
+            elif _is_hash(stem):
+                audio[de.name] = st
+            elif stem.startswith(_UNMANAGED_PREFIX):
+                # In-flight or unmanaged output; only the TTL applies
+                if now - st.st_mtime > self.ttl_seconds:
+                    self._unlink(de.path)
+            else:
+                standalone.append({"path": de.path, "size": st.st_size, "atime": st.st_mtime})
+
+        # Which audio file each render points at, and how many renders share it
+        refs: Dict[str, int] = {}
+        for entry in sidecars:
+            try:
+                with open(entry["path"], "r", encoding="utf-8") as f:
+                    entry["audio"] = os.path.basename(json.load(f)["output_audio_path"])
+            except (OSError, ValueError, KeyError, TypeError):
+                entry["audio"] = None
+            if entry["audio"] in audio:
+                refs[entry["audio"]] = refs.get(entry["audio"], 0) + 1
+
+        removed = 0
+        survivors = []
+        for entry in sidecars + standalone:
+            # Sidecars that are unreadable or whose audio is gone are useless
+            dangling = "audio" in entry and entry["audio"] not in audio
+            if dangling or now - entry["atime"] > self.ttl_seconds:
+                self._remove(entry, audio, refs)
+                removed += 1
+            else:
+                survivors.append(entry)
+        # Audio no render points at: being stored right now, or left over
+        for name, st in list(audio.items()):
+            if name not in refs and now - st.st_mtime > self.ttl_seconds:
+                self._remove_audio(name, audio)
+
+        total = sum(e["size"] for e in survivors) + sum(st.st_size for st in audio.values())
+        kept = len(survivors)
+        for entry in sorted(survivors, key=lambda e: e["atime"]):
+            if total <= self.max_bytes:
+                break
+            total -= self._remove(entry, audio, refs)
+            removed += 1
+            kept -= 1
+
+        with self._lock:
+            self._evictions += removed
+            self._entries = kept
+            self._bytes_stored = total
+        return removed
+
+    def _remove(self, entry: Dict, audio: Dict[str, os.stat_result], refs: Dict[str, int]) -> int:
+        # Sidecar first so a concurrent lookup never sees metadata without
+        # audio; the audio goes with the last sidecar pointing at it.
+        # Returns the bytes freed.
+        self._unlink(entry["path"])
+        freed = entry["size"]
+        name = entry.get("audio")
+        if name in refs:
+            refs[name] -= 1
+            if refs[name] == 0:
+                del refs[name]
+                freed += self._remove_audio(name, audio)
+        return freed
+
+    def _remove_audio(self, name: str, audio: Dict[str, os.stat_result]) -> int:
+        path = os.path.join(self.root, name)
+        st = audio.pop(name)
+        try:
+            # A put() since the scan replaced the file for a new sidecar; keep that one
+            if os.stat(path).st_ino != st.st_ino:
+                return 0
+            os.remove(path)
+        except OSError:
+            pass
+        return st.st_size
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.evict()
+            except Exception as e:
+                print(f"Output store eviction failed: {e}")
+
+    def start(self) -> None:
+        """Start background eviction (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.evict()
+        self._thread = threading.Thread(target=self._run, name="output-store-evict", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    # ── Metrics ──────────────────────────────────────────────────────────
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "entries": self._entries,
+                "bytes_stored": self._bytes_stored,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+            }
@@ -1,98 +1,355 @@
 """Pipeline to run full Empathy Engine: detection -> TTS -> modulation -> mixdown"""
 import os
 import shutil
+import tempfile
+import threading
 import uuid
-from typing import Dict, List
+from concurrent.futures import CancelledError
+from typing import Callable, Dict, FrozenSet, List, Optional
 
 from pydub import AudioSegment
 
 try:
-    from .emotion_detector import analyze_corpus
-    from .tts_engine import synthesize_sentence
+    from .emotion_detector import analyze_corpus, apply_prosody_to_timeline
+    from .tts_engine import native_controls, needs_dsp, split_voice_params, synthesize_sentence, synthesize_text
     from .voice_modulator import modulate
     from .config import get_voice_params
+    from .audio_codec import DEFAULT_BITRATE_KBPS, OUTPUT_FORMATS, export_audio, normalize_format
+    from .output_store import OutputStore, analysis_key, render_key
+    from . import metrics
+    from .profiling import ProfileStore
+    from .single_flight import SingleFlight
 except ImportError:
     # Fallback for direct execution
-    from emotion_detector import analyze_corpus
-    from tts_engine import synthesize_sentence
+    from emotion_detector import analyze_corpus, apply_prosody_to_timeline
+    from tts_engine import native_controls, needs_dsp, split_voice_params, synthesize_sentence, synthesize_text
     from voice_modulator import modulate
     from config import get_voice_params
+    from audio_codec import DEFAULT_BITRATE_KBPS, OUTPUT_FORMATS, export_audio, normalize_format
+    from output_store import OutputStore, analysis_key, render_key
+    import metrics
+    from profiling import ProfileStore
+    from single_flight import SingleFlight
 
 
-def run_pipeline(text: str, output_dir: str = "static/audio") -> Dict:
-    """Run the full pipeline and produce a concatenated WAV.
+class PipelineCancelled(Exception):
+    """Raised inside a run whose `cancel` event was set."""
 
-    Returns a dict with analysis and file paths.
+
+# In-flight renders (with a store) and analyses, shared by concurrent callers
+_renders = SingleFlight("render", PipelineCancelled)
+_analyses = SingleFlight("analysis", PipelineCancelled)
+
+
+def check_cancel(cancel: Optional[threading.Event]) -> None:
+    """Raise PipelineCancelled if `cancel` is set."""
+    if cancel is not None and cancel.is_set():
+        metrics.count("runs_cancelled")
+        raise PipelineCancelled("pipeline run cancelled")
+
+
+def tts_backend_name(synthesize: Callable) -> str:
+    """Stable identifier of a TTS function, used in render cache keys."""
+    return f"{getattr(synthesize, '__module__', '')}.{getattr(synthesize, '__qualname__', repr(synthesize))}"
+
+
+def resolve_voice_params(item: Dict) -> Dict:
+    """Voice params of a timeline entry, falling back to its top emotion."""
+    voice_params = item.get("voice_params")
+    if not voice_params:
+        # Fallback to top emotion if voice_params absent
+        emotions = item.get("emotions", [])
+        if emotions:
+            top = emotions[0]
+            voice_params = get_voice_params(top.get("label", "neutral"), top.get("intensity", "medium"))
+        else:
+            voice_params = get_voice_params("neutral", "medium")
+    return voice_params
+
+
+def mixdown(segments: List[AudioSegment]) -> AudioSegment:
+    """Concatenate sentence segments with 300ms silence gaps."""
+    gap = AudioSegment.silent(duration=300)
+    final = AudioSegment.silent(duration=0)
+    for i, seg in enumerate(segments):
+        final += seg
+        if i < len(segments) - 1:
+            final += gap
+    return final
+
+
+def run_pipeline(
+    text: str,
+    output_dir: str = "static/audio",
+    synthesize: Optional[Callable[[str, str], str]] = None,
+    output_format: str = "wav",
+    bitrate_kbps: Optional[float] = None,
+    store: Optional[OutputStore] = None,
+    profiler: Optional[ProfileStore] = None,
+    cancel: Optional[threading.Event] = None,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+) -> Dict:
+    """Run the full pipeline and produce a concatenated audio file.
+
+    Safe to call concurrently: each call works in its own scratch directory
+    under `<output_dir>/temp` and only ever removes that directory.
+    `synthesize` overrides the TTS function (same signature as
+    `synthesize_sentence`), e.g. with a stub for offline runs. Prosody
+    controls it declares with `tts_engine.native_prosody` are applied by the
+    engine and skipped in modulation.
+    `output_format` is one of `wav`, `flac`, `opus`, `mp3`; `bitrate_kbps`
+    applies to the lossy formats (see `audio_codec.export_audio`).
+    With a `store`, identical requests return the stored artifact (with
+    `cache_hit=True`) and new outputs are moved into the store.
+
+    With a `profiler`, the run is profiled into that store (see `profiling`)
+    and the result carries `profile_id`.
+
+    Setting the `cancel` event stops the run at the next sentence boundary
+    with `PipelineCancelled`; scratch files are removed as usual.
+    `progress(stage, done, total)` is called as sentences finish the
+    `detect`, `tts` and `modulate` stages (not on cache hits).
+
+    Concurrent identical calls with a `store` share one render: the first
+    runs it and the others wait for its result or exception. The shared run
+    is cancelled only once all of their `cancel` events are set; a caller
+    whose own event is set stops waiting with `PipelineCancelled`.
+
+    Sentences whose TTS missed its deadline come from the fallback engine
+    and are listed (1-based) under `degraded_sentences`; such a render is
+    never stored as a cache entry, so the next identical call retries.
+
+    Returns a dict with analysis and file paths, plus per-stage timings and
+    counters under `stats` (see `metrics`).
     """
+    if profiler is not None:
+        with profiler.profile(f"run_pipeline chars={len(text)} format={output_format}") as prof:
+            out = run_pipeline(text, output_dir, synthesize, output_format, bitrate_kbps, store, cancel=cancel, progress=progress)
+        if prof is not None:
+            out["profile_id"] = prof["id"]
+        return out
+
+    with metrics.track_run() as run:
+        with metrics.stage("pipeline"):
+            out = _render(text, output_dir, synthesize, output_format, bitrate_kbps, store, cancel, progress)
+    out["stats"] = run.as_dict()
+    return out
+
+
+def analysis_etag(text: str) -> str:
+    """Strong HTTP entity tag of analyze_text(text): changes with the text, model or voice maps."""
+    return f'"{analysis_key(text)}"'
+
+
+def analyze_text(text: str, store: Optional[OutputStore] = None, cancel: Optional[threading.Event] = None) -> Dict:
+    """Timeline, corpus stats and per-sentence voice params of `text`, without audio.
+
+    Same as apply_prosody_to_timeline(analyze_corpus(text)); with a `store`,
+    results are shared through it under `analysis_key(text)`. The returned
+    dict carries `cache_hit`.
+    """
+    check_cancel(cancel)
+    key = analysis_key(text)
+    if store is not None:
+        cached = store.lookup_analysis(key)
+        if cached is not None:
+            metrics.count("analysis_cache_hits")
+            return dict(cached, cache_hit=True)
+        metrics.count("analysis_cache_misses")
+
+    def analyze(shared_cancel) -> Dict:
+        try:
+            corpus = analyze_corpus(text, shared_cancel)
+        except CancelledError:
+            # Detection stopped because every caller gave up
+            check_cancel(shared_cancel)
+            raise
+        result = apply_prosody_to_timeline(corpus)
+        if store is not None:
+            store.put_analysis(key, result)
+        return result
+
+    # Concurrent analyses of the same text share one computation
+    return dict(_analyses.do(key, analyze, cancel), cache_hit=False)
+
+
+def output_cache_key(text: str, synthesize: Callable, output_format: str, bitrate_kbps: Optional[float]) -> str:
+    """render_key of a run_pipeline call; `output_format` must be normalized."""
+    # Bitrate only affects lossy formats; keep lossless keys independent of it
+    key_bitrate = bitrate_kbps if output_format in DEFAULT_BITRATE_KBPS else None
+    return render_key(text, tts_backend_name(synthesize), output_format, key_bitrate)
+
+
+def make_scratch_dir(output_dir: str) -> str:
+    """Private scratch directory for one run under `<output_dir>/temp`."""
     os.makedirs(output_dir, exist_ok=True)
-    temp_dir = os.path.join(output_dir, "temp")
-    os.makedirs(temp_dir, exist_ok=True)
+    scratch_root = os.path.join(output_dir, "temp")
+    os.makedirs(scratch_root, exist_ok=True)
+    return tempfile.mkdtemp(prefix="run_", dir=scratch_root)
 
-    result = analyze_corpus(text)
 
-    # Enrich timeline if voice_params missing (safety)
-    timeline = result.get("timeline", [])
+def _render(
+    text: str,
+    output_dir: str,
+    synthesize: Optional[Callable[[str, str], str]],
+    output_format: str,
+    bitrate_kbps: Optional[float],
+    store: Optional[OutputStore],
+    cancel: Optional[threading.Event] = None,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+) -> Dict:
+    check_cancel(cancel)
+    report = progress or (lambda stage, done, total: None)
+    synthesize = synthesize or synthesize_sentence
+    output_format = normalize_format(output_format)
+
+    if store is None:
+        return _render_uncached(text, output_dir, synthesize, output_format, bitrate_kbps, None, None, cancel, report)
 
+    cache_key = output_cache_key(text, synthesize, output_format, bitrate_kbps)
+    cached = store.lookup(cache_key)
+    if cached is not None:
+        metrics.count("cache_hits")
+        return cached
+    metrics.count("cache_misses")
+    # Identical renders already in progress are joined instead of repeated;
+    # the store makes their output safe to share
+    return dict(_renders.do(
+        (store.root, cache_key),
+        lambda shared_cancel: _render_uncached(
+            text, output_dir, synthesize, output_format, bitrate_kbps, store, cache_key, shared_cancel, report,
+        ),
+        cancel,
+    ))
+
+
+def _render_uncached(
+    text: str,
+    output_dir: str,
+    synthesize: Callable[[str, str], str],
+    output_format: str,
+    bitrate_kbps: Optional[float],
+    store: Optional[OutputStore],
+    cache_key: Optional[str],
+    cancel,
+    report: Callable[[str, int, int], None],
+) -> Dict:
+    temp_dir = make_scratch_dir(output_dir)
     sentence_audio_paths: List[str] = []
-    modulated_paths: List[str] = []
+    degraded: List[int] = []
 
     try:
+        # Step 1: detection, then corpus-level base_pitch onto sentence params
+        # (reuses an analysis stored by /analyze or an earlier render)
+        result = analyze_text(text, store, cancel)
+        timeline = result.get("timeline", [])
+        total = len(timeline)
+        report("detect", total, total)
+
         # Step 2: synthesize raw audio for each sentence
         for idx, item in enumerate(timeline, start=1):
+            check_cancel(cancel)
             sentence = item.get("sentence", "")
             # Raw TTS path
             raw_wav = os.path.join(temp_dir, f"raw_{idx:03d}.wav")
-            synthesize_sentence(sentence, raw_wav)
+            with metrics.stage("tts"):
+                _, fallback_used = synthesize_text(sentence, raw_wav, resolve_voice_params(item), synthesize)
+            if fallback_used:
+                degraded.append(idx)
             sentence_audio_paths.append(raw_wav)
+            report("tts", idx, total)
 
-        # Step 3: apply modulation per sentence
-        for idx, item in enumerate(timeline, start=1):
-            voice_params = item.get("voice_params")
-            if not voice_params:
-                # Fallback to top emotion if voice_params absent
-                emotions = item.get("emotions", [])
-                if emotions:
-                    top = emotions[0]
-                    voice_params = get_voice_params(top.get("label", "neutral"), top.get("intensity", "medium"))
-                else:
-                    voice_params = get_voice_params("neutral", "medium")
-
-            raw_path = sentence_audio_paths[idx - 1]
-            mod_path = os.path.join(temp_dir, f"mod_{idx:03d}.wav")
-            modulate(raw_path, voice_params, mod_path)
-            modulated_paths.append(mod_path)
-
-        # Step 4: concatenate with 300ms silence gaps
-        gap = AudioSegment.silent(duration=300)
-        final = AudioSegment.silent(duration=0)
-        for i, p in enumerate(modulated_paths):
-            seg = AudioSegment.from_wav(p)
-            final += seg
-            if i < len(modulated_paths) - 1:
-                final += gap
-
-        out_name = f"empathy_output_{uuid.uuid4().hex[:8]}.wav"
-        out_path = os.path.join(output_dir, out_name)
-        final.export(out_path, format="wav")
-
-        # Populate return structure
-        return {
-            "dominant_emotion": result.get("dominant_emotion"),
-            "weighted_emotion": result.get("weighted_emotion"),
-            "volatility_score": result.get("volatility_score"),
-            "valence_score": result.get("valence_score"),
-            "base_pitch": result.get("base_pitch"),
-            "timeline": timeline,
-            "output_audio_path": out_path,
-            "sentence_audio_paths": modulated_paths,
-        }
+        return assemble_output(
+            result, sentence_audio_paths, temp_dir, output_dir, output_format, bitrate_kbps,
+            store, cache_key, cancel, report, native_controls(synthesize), degraded,
+        )
     finally:
-        # Clean up intermediate files
-        try:
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-        except Exception:
-            pass
+        # Clean up this run's intermediate files only
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def assemble_output(
+    result: Dict,
+    raw_paths: List[str],
+    temp_dir: str,
+    output_dir: str,
+    output_format: str,
+    bitrate_kbps: Optional[float],
+    store: Optional[OutputStore] = None,
+    cache_key: Optional[str] = None,
+    cancel: Optional[threading.Event] = None,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+    native: FrozenSet[str] = frozenset(),
+    degraded: Optional[List[int]] = None,
+) -> Dict:
+    """Modulate, mix down and export an analysed text whose raw TTS is done.
+
+    `result` is apply_prosody_to_timeline() output and `raw_paths` holds one
+    raw WAV per timeline entry. Prosody controls in `native` were applied by
+    the TTS engine; sentences with nothing left to modulate skip it.
+    Intermediate files go to `temp_dir`, which the caller removes. `degraded`
+    lists the (1-based) sentences rendered by the TTS fallback. Returns the
+    run_pipeline result dict (stored under `cache_key` when a `store` is
+    given and nothing is degraded).
+    """
+    report = progress or (lambda stage, done, total: None)
+    spec = OUTPUT_FORMATS[output_format]
+    timeline = result.get("timeline", [])
+    total = len(timeline)
+    modulated_paths: List[str] = []
+
+    # Step 3: apply modulation per sentence
+    for idx, item in enumerate(timeline, start=1):
+        check_cancel(cancel)
+        _, dsp_params = split_voice_params(resolve_voice_params(item), native)
+        raw_path = raw_paths[idx - 1]
+        if needs_dsp(dsp_params):
+            mod_path = os.path.join(temp_dir, f"mod_{idx:03d}.wav")
+            modulate(raw_path, dsp_params, mod_path)
+        else:
+            metrics.count("modulate_skipped")
+            mod_path = raw_path
+        modulated_paths.append(mod_path)
+        report("modulate", idx, total)
+
+    # Step 4: concatenate with 300ms silence gaps
+    check_cancel(cancel)
+    with metrics.stage("mixdown"):
+        final = mixdown([AudioSegment.from_wav(p) for p in modulated_paths])
+
+    # Export inside the scratch dir, then move into place atomically so
+    # readers never observe a partially written output file
+    out_name = f"empathy_output_{uuid.uuid4().hex}.{spec['extension']}"
+    out_path = os.path.join(output_dir, out_name)
+    staged_path = os.path.join(temp_dir, out_name)
+    with metrics.stage("export"):
+        export_audio(final, staged_path, output_format, bitrate_kbps)
+    metrics.count("bytes_written", os.path.getsize(staged_path))
+    os.replace(staged_path, out_path)
+
+    # Populate return structure
+    out = {
+        "dominant_emotion": result.get("dominant_emotion"),
+        "weighted_emotion": result.get("weighted_emotion"),
+        "volatility_score": result.get("volatility_score"),
+        "valence_score": result.get("valence_score"),
+        "base_pitch": result.get("base_pitch"),
+        "timeline": timeline,
+        "output_audio_path": out_path,
+        "output_format": output_format,
+        "media_type": spec["media_type"],
+        "sentence_audio_paths": modulated_paths,
+        "degraded_sentences": list(degraded or []),
+    }
+    if degraded:
+        # Fallback audio is served but never cached: the next call retries the TTS
+        metrics.count("degraded_renders")
+        print(f"Warning: {len(degraded)} sentence(s) rendered by the TTS fallback; not caching this render")
+        if store is not None:
+            out = store.put_audio(out)
+    elif store is not None:
+        out = store.put(cache_key, out)
+    return out
 
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+"""Opt-in per-request profiling with a bounded artifact directory.
+
+`ProfileStore.profile(label)` wraps one pipeline run and captures:
+ - a cProfile of the calling thread, saved as `<id>.prof` (load with pstats)
+ - tracemalloc peak memory overall and per pipeline stage
+ - a JSON summary `<id>.json` with the top functions by own (tottime) and
+   cumulative time
+
+tracemalloc is process-wide, so only one run is profiled at a time; a run
+that starts while another is being profiled proceeds unprofiled
+(`profile()` yields None). Per-stage peaks come from `metrics` stage events,
+so they need instrumentation enabled.
+
+The store keeps at most `max_profiles` runs, deleting the oldest first.
+`hot_functions()` aggregates own time across the retained summaries.
+"""
+import cProfile
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+try:
+    from . import metrics
+except ImportError:
+    import metrics
+
+
+TOP_N = 25
+
+_ID_RE = re.compile(r"^[0-9A-Za-z_]+$")
+
+
+def _func_name(func) -> str:
+    filename, lineno, name = func
+    return f"{os.path.basename(filename)}:{lineno}({name})" if lineno else name
+
+
+class _StagePeaks:
+    """Tracks the tracemalloc peak of every (possibly nested) open stage."""
+
+    def __init__(self):
+        self.open: List[str] = []
+        self.peaks: Dict[str, int] = {}
+
+    def _fold(self) -> None:
+        # The peak since the last reset belongs to every stage currently open
+        peak = tracemalloc.get_traced_memory()[1]
+        for name in self.open:
+            self.peaks[name] = max(self.peaks.get(name, 0), peak)
+        tracemalloc.reset_peak()
+
+    def stage_enter(self, name: str) -> None:
+        self._fold()
+        self.open.append(name)
+
+    def stage_exit(self, name: str) -> None:
+        self._fold()
+        if self.open and self.open[-1] == name:
+            self.open.pop()
+        elif name in self.open:
+            self.open.remove(name)
+
+
+class ProfileStore:
+    """Directory of recent request profiles, capped at `max_profiles`."""
+
+    def __init__(self, root: str, max_profiles: int = 50):
+        self.root = root
+        self.max_profiles = int(max_profiles)
+        os.makedirs(root, exist_ok=True)
+        self._busy = threading.Lock()
+
+    @contextmanager
+    def profile(self, label: str = "") -> Iterator[Optional[Dict]]:
+        """Profile the enclosed block; yields the summary dict being filled in.
+
+        The summary is complete (and written to disk) when the block exits.
+        Yields None if another run is already being profiled.
+        """
+        if not self._busy.acquire(blocking=False):
+            yield None
+            return
+
+        # Sortable by start time down to the microsecond; suffix avoids collisions
+        profile_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}_{uuid.uuid4().hex[:6]}"
+        summary: Dict = {"id": profile_id, "label": label, "started_at": time.time()}
+        peaks = _StagePeaks()
+        profiler = cProfile.Profile()
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        try:
+            with metrics.observe_stages(peaks):
+                profiler.enable()
+                try:
+                    yield summary
+                except BaseException as e:
+                    # Failed runs are kept too; slow failures are worth a look
+                    summary["error"] = repr(e)
+                    raise
+                finally:
+                    profiler.disable()
+        finally:
+            summary["wall_s"] = time.perf_counter() - t0
+            summary["peak_bytes"] = max([tracemalloc.get_traced_memory()[1]] + list(peaks.peaks.values()))
+            summary["stage_peak_bytes"] = peaks.peaks
+            if not was_tracing:
+                tracemalloc.stop()
+            self._busy.release()
+            self._save(profile_id, profiler, summary)
+
+    def _save(self, profile_id: str, profiler: cProfile.Profile, summary: Dict) -> None:
+        stats = pstats.Stats(profiler)
+        rows = [
+            {
+                "function": _func_name(func),
+                "calls": nc,
+                "tottime_s": tt,
+                "cumtime_s": ct,
+            }
+            for func, (_cc, nc, tt, ct, _callers) in stats.stats.items()
+        ]
+        summary["top_tottime"] = sorted(rows, key=lambda r: r["tottime_s"], reverse=True)[:TOP_N]
+        summary["top_cumtime"] = sorted(rows, key=lambda r: r["cumtime_s"], reverse=True)[:TOP_N]
+
+        stats.dump_stats(os.path.join(self.root, f"{profile_id}.prof"))
+        with open(os.path.join(self.root, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        self._prune()
+
+    def _prune(self) -> None:
+        ids = self.list_ids()
+        for old in ids[: max(0, len(ids) - self.max_profiles)]:
+            for ext in (".json", ".prof"):
+                try:
+                    os.remove(os.path.join(self.root, old + ext))
+                except OSError:
+                    pass
+
+    def list_ids(self) -> List[str]:
+        """Retained profile ids, oldest first."""
+        return sorted(n[:-5] for n in os.listdir(self.root) if n.endswith(".json"))
+
+    def summary(self, profile_id: str) -> Optional[Dict]:
+        if not _ID_RE.match(profile_id or ""):
+            return None
+        try:
+            with open(os.path.join(self.root, f"{profile_id}.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def prof_path(self, profile_id: str) -> Optional[str]:
+        if not _ID_RE.match(profile_id or ""):
+            return None
+        path = os.path.join(self.root, f"{profile_id}.prof")
+        return path if os.path.exists(path) else None
+
+    def hot_functions(self, limit: int = 20) -> List[Dict]:
+        """Top functions by own time summed over all retained profiles."""
+        totals: Dict[str, Dict] = {}
+        for profile_id in self.list_ids():
+            summary = self.summary(profile_id) or {}
+            for row in summary.get("top_tottime", []):
+                t = totals.setdefault(row["function"], {"function": row["function"], "tottime_s": 0.0, "calls": 0, "profiles": 0})
+                t["tottime_s"] += row["tottime_s"]
+                t["calls"] += row["calls"]
+                t["profiles"] += 1
+        return sorted(totals.values(), key=lambda r: r["tottime_s"], reverse=True)[:limit]
@@ -0,0 +1,172 @@
+"""Bounded worker pool for blocking pipeline runs, fair across clients.
+
+`RenderPool` runs calls such as `run_pipeline` on `max_workers` threads and
+lets at most `max_queue` further calls wait for a thread. Beyond that,
+`submit()` raises `PoolSaturated` carrying a `retry_after` estimate (seconds)
+so callers can shed load immediately instead of piling up work.
+
+Waiting calls are ordered by weighted fair queuing rather than arrival:
+`schedule()` tags each call with its client and an estimated cost, and the
+next free thread takes the call with the smallest virtual finish time
+(start = max(virtual time, client's last finish), finish = start +
+cost / weight). A client with a large backlog therefore only delays others
+by about one of its calls, and short calls from other clients overtake it.
+`submit()` is `schedule()` for an anonymous client with cost 1.
+
+Threads rather than processes: the emotion model, output store and metrics
+registry live in the process, and the slow parts (model inference, TTS
+requests, audio encoding) mostly run outside the GIL.
+
+Records `pool_rejected` counts and a `queue_wait` stage histogram in
+`metrics`; `stats()` gives the current occupancy.
+"""
+import heapq
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+try:
+    from . import metrics
+except ImportError:
+    import metrics
+
+
+class PoolSaturated(Exception):
+    """All workers are busy and the wait queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"render pool saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class RenderPool:
+    """Fair-queued thread pool with a bounded wait queue; see module docstring."""
+
+    # Weight of the newest run in the moving average of run durations
+    EWMA_ALPHA = 0.2
+    # Finish tags kept per client before idle clients are forgotten
+    MAX_TRACKED_CLIENTS = 1024
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 16, weights: Optional[Dict[str, float]] = None):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.weights = dict(weights or {})
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._heap = []  # (finish, seq, start, future, fn, args, kwargs, submitted)
+        self._seq = itertools.count()
+        self._vtime = 0.0
+        self._finish: Dict[str, float] = {}
+        self._pending = 0  # queued + running
+        self._running = 0
+        self._rejected = 0
+        self._avg_run_s: Optional[float] = None
+        self._shutdown = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"render_{i}", daemon=True) for i in range(self.max_workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Schedule `fn(*args, **kwargs)`; raises PoolSaturated when full."""
+        return self.schedule(fn, args, kwargs)
+
+    def schedule(self, fn: Callable, args=(), kwargs: Optional[Dict] = None, client: str = "",
+                 cost: float = 1.0, bounded: bool = True) -> Future:
+        """Queue `fn(*args, **kwargs)` for `client` with estimated `cost`.
+
+        `bounded=False` skips the queue limit, for the follow-up work units
+        of a request that was already admitted.
+        """
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new work after shutdown")
+            if bounded and self._pending >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                retry_after = self._retry_after()
+                metrics.count("pool_rejected")
+                raise PoolSaturated(retry_after)
+            start = max(self._vtime, self._finish.get(client, 0.0))
+            finish = start + max(float(cost), 1e-6) / self.weights.get(client, 1.0)
+            self._finish[client] = finish
+            heapq.heappush(self._heap, (finish, next(self._seq), start, future, fn, args, kwargs or {},
+                                        time.perf_counter()))
+            self._pending += 1
+            self._cond.notify()
+        # Also fires for futures cancelled while still queued
+        future.add_done_callback(self._done)
+        return future
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap and not self._shutdown:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                _, _, start, future, fn, args, kwargs, submitted = heapq.heappop(self._heap)
+                self._vtime = max(self._vtime, start)
+                if len(self._finish) > self.MAX_TRACKED_CLIENTS:
+                    # Clients whose last finish is behind virtual time start from it anyway
+                    self._finish = {c: f for c, f in self._finish.items() if f > self._vtime}
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._run(submitted, fn, args, kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def _run(self, submitted: float, fn: Callable, args, kwargs):
+        started = time.perf_counter()
+        if metrics.enabled():
+            metrics.REGISTRY.observe_stage("queue_wait", started - submitted, 0.0)
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._running -= 1
+                if self._avg_run_s is None:
+                    self._avg_run_s = elapsed
+                else:
+                    self._avg_run_s += self.EWMA_ALPHA * (elapsed - self._avg_run_s)
+
+    def _done(self, _future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _retry_after(self) -> int:
+        # Time for the queue ahead of a new caller to drain; caller holds the lock
+        avg = self._avg_run_s if self._avg_run_s is not None else 1.0
+        queued = max(0, self._pending - self._running)
+        return max(1, math.ceil(avg * (queued + 1) / self.max_workers))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": max(0, self._pending - self._running),
+                "rejected": self._rejected,
+                "avg_run_s": self._avg_run_s or 0.0,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting work; queued calls that have not started are dropped."""
+        with self._cond:
+            self._shutdown = True
+            queued, self._heap = self._heap, []
+            self._cond.notify_all()
+        for entry in queued:
+            entry[3].cancel()
+        if wait:
+            for t in self._threads:
+                t.join()
@@ -0,0 +1,367 @@
+"""Sentence segmentation: sentence spans over strings and file streams.
+
+ - spans(text): lazy iterator of (start, end) offsets into `text`, one per
+   sentence; no substrings are built
+ - sentences(text): list of sentence strings, drop-in for nltk.sent_tokenize
+ - stream_spans(stream): (start, end, sentence) over a text file object,
+   read in chunks, with offsets counted from the start of the stream
+ - PunktSegmenter: NLTK's Punkt model, loaded once; output identical to
+   nltk.sent_tokenize
+ - RegexSegmenter: Punkt's decision rules over one compiled regex, with
+   built-in English abbreviations; needs no NLTK data and is about 5x
+   faster (see bench_segment), but its word lists are not the model's: on
+   verify_segmentation's 5,008 texts it agrees with Punkt on 73.7% of the
+   texts and 92.4% of the sentence boundaries
+
+EMPATHY_SEGMENTER picks the implementation: "punkt" (default, needs NLTK
+punkt data) or "regex". The regex segmenter is only used when asked for,
+never as a silent fallback, since its sentences differ.
+"""
+import os
+import re
+import threading
+from typing import FrozenSet, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+import nltk
+
+
+SEGMENTER = os.environ.get("EMPATHY_SEGMENTER", "punkt").lower()
+
+# Punkt's token classes: characters that are tokens of their own, closing
+# quotes and brackets it moves onto the end of the sentence before them,
+# characters a word cannot start with, and multi-character punctuation
+_NON_WORD = ")\";}]*:@'({[‘’“”\xab\xbb?!"
+_CLOSERS = "\"')]}‘’“”\xab\xbb"
+_RE_NON_WORD = "[%s]" % re.escape(_NON_WORD)
+_RE_MULTI_CHAR = r"(?:\-{2,}|\.{2,}|(?:\.\s){2,}\.)"
+
+# Possible sentence end: `.?!` followed by a punctuation token, or by
+# whitespace and another token
+_CANDIDATE = re.compile(r"[.?!](?=(%s)|\s+\S)" % _RE_NON_WORD)
+# Whitespace that separates the word before a sentence end (ASCII, as Punkt)
+_ASCII_WHITESPACE = " \t\n\r\x0b\x0c"
+_ASCII_SPACE = re.compile("[%s]" % _ASCII_WHITESPACE)
+_NEXT_CHUNK = re.compile(r"\S+")
+# Closing quotes and brackets at the start of a sentence belong to the one before
+_REALIGN = re.compile(r"[%s]+?(?:\s+|(?=--)|$)" % re.escape(_CLOSERS), re.MULTILINE)
+# Punkt's word tokenizer
+_PUNKT_WORD = re.compile(
+    r"%(MultiChar)s|(?=[^\(\"\`{\[:;&\#\*@\)}\]\-,])\S+?"
+    r"(?=\s|$|%(NonWord)s|%(MultiChar)s|,(?=$|\s|%(NonWord)s|%(MultiChar)s))|\S"
+    % {"NonWord": _RE_NON_WORD, "MultiChar": _RE_MULTI_CHAR}
+)
+_NUMERIC = re.compile(r"^-?[\.,]?\d[\d,\.-]*\.?$")
+_INITIAL = re.compile(r"[^\W\d]\.$")
+_ELLIPSIS = re.compile(r"\.\.+$")
+_SENT_END = (".", "?", "!")
+_PUNCTUATION = (";", ":", ",", ".", "!", "?")
+
+# Common English abbreviations (lowercase, final period removed), after the
+# ones in NLTK's English Punkt model
+ABBREVIATIONS: FrozenSet[str] = frozenset("""
+    mr mrs ms dr prof sr jr st mt ft gen col lt sgt capt cmdr adm gov sen rep rev hon pres
+    inc corp co ltd llc bros dept univ assn
+    e.g i.e etc vs cf al viz approx est fig figs vol vols no nos pp ed eds
+    jan feb mar apr jun jul aug sep sept oct nov dec mon tue wed thu fri sat sun
+    a.m p.m u.s u.k u.n u.s.a ph.d b.a m.a d.c ave blvd rd
+""".split())
+
+# Capitalized words that start a new sentence even after an abbreviation,
+# ellipsis or initial
+SENT_STARTERS: FrozenSet[str] = frozenset("""
+    the he she it they we i you in but and this that there these those a an as if when while
+    after so then however yet his her its their our my what why how who where
+""".split())
+
+
+# Where stream_spans may resume scanning: after a whole word (between ASCII
+# whitespace) that contains no `.?!`. Every sentence end before such a word
+# has its following token complete, so its decision is final
+_RESUME = re.compile(r"(?<=[%s])[^\s.?!]+[%s]+(?=\S)" % (_ASCII_WHITESPACE, _ASCII_WHITESPACE))
+# How far back from the end of the buffer stream_spans re-scans on each read
+_RESCAN_CHARS = 256
+
+
+def _word_start(text: str, lo: int, pos: int) -> int:
+    # After the last ASCII whitespace in text[lo:pos]
+    i = max(lo, text.rfind(" ", lo, pos) + 1)
+    space = _ASCII_SPACE.search(text, i, pos)
+    while space is not None:
+        i = space.end()
+        space = _ASCII_SPACE.search(text, i, pos)
+    return i
+
+
+class RegexSegmenter:
+    """Punkt's sentence boundary rules without a trained model.
+
+    A chunk ending in `.`, `?` or `!` (plus closing quotes/brackets) and
+    followed by whitespace ends a sentence, except after an abbreviation,
+    an ellipsis or an initial that the next word does not look like it
+    starts a sentence after, and after a number followed by a lowercase
+    word. `abbreviations` and `sent_starters` default to the built-in
+    English lists; pass a Punkt model's to compare the rules alone.
+
+    With a Punkt model's lists the spans equal Punkt's on every text
+    verify_segmentation checks. With the built-in lists they do not: 3689
+    of its 5008 texts (73.7%) come out identical and 17856 of 19325 Punkt
+    boundaries (92.4%) are found, mostly differing after ellipses,
+    initials and abbreviations the model learned from its corpus.
+    """
+
+    name = "regex"
+
+    def __init__(self, abbreviations: Optional[Iterable[str]] = None,
+                 sent_starters: Optional[Iterable[str]] = None):
+        self.abbreviations = frozenset(ABBREVIATIONS if abbreviations is None else abbreviations)
+        self.sent_starters = frozenset(SENT_STARTERS if sent_starters is None else sent_starters)
+
+    def spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """(start, end) of each sentence, as Punkt's span_tokenize() reports them."""
+        start = 0
+        end_of_text = len(text.rstrip())
+        # A candidate followed by punctuation is held back: a later one in
+        # the same word replaces it, as in Punkt
+        held = None
+        searched = 0
+        for match in _CANDIDATE.finditer(text):
+            pos = match.start()
+            if held is None:
+                word_start = _word_start(text, searched, pos)
+            else:
+                same_word = _ASCII_SPACE.search(text, searched, pos) is None
+                # Replaced only if its word had anything before the punctuation
+                if not same_word or held[0] == held[1].start():
+                    boundary = self._boundary(text, *held)
+                    if boundary is not None:
+                        yield start, boundary[0]
+                        start = boundary[1]
+                word_start = held[0] if same_word else _word_start(text, searched, pos)
+            held = None
+            searched = pos + 1
+            if match.group(1) or text[match.end()] not in _ASCII_WHITESPACE:
+                held = (word_start, match)
+                continue
+            boundary = self._boundary(text, word_start, match)
+            if boundary is not None:
+                yield start, boundary[0]
+                start = boundary[1]
+        if held is not None:
+            boundary = self._boundary(text, *held)
+            if boundary is not None:
+                yield start, boundary[0]
+                start = boundary[1]
+        if start < end_of_text:
+            yield start, end_of_text
+
+    def _boundary(self, text: str, word_start: int, match) -> Optional[Tuple[int, int]]:
+        # (end of this sentence, start of the next) if `match` ends a sentence
+        end = match.end()
+        if match.group(1):
+            # Punctuation token right after: Punkt only looks that far
+            next_start = end
+            context = text[word_start:end + 1]
+        else:
+            following = _NEXT_CHUNK.search(text, end)
+            next_start = following.start()
+            context = None if self._ends_sentence(text[word_start:end]) else text[word_start:following.end()]
+        if context is not None and not self._contains_break(self._tokens(context)):
+            return None
+        realign = _REALIGN.match(text, next_start)
+        if realign:
+            end = next_start + len(realign.group().rstrip())
+            next_start = realign.end()
+        return end, next_start
+
+    def sentences(self, text: str) -> List[str]:
+        return [text[s:e] for s, e in self.spans(text)]
+
+    def _ends_sentence(self, chunk: str) -> bool:
+        # Common cases decided without tokenizing: `?` or `!`, or a plain
+        # word that is no abbreviation, then whitespace
+        if chunk[-1] != ".":
+            return True
+        word = chunk[:-1]
+        return len(word) > 1 and word.isalpha() and word.lower() not in self.abbreviations
+
+    @staticmethod
+    def _tokens(context: str) -> List[str]:
+        # Punkt tokenizes line by line
+        if "\n" not in context:
+            return _PUNKT_WORD.findall(context)
+        return [tok for line in context.split("\n") for tok in _PUNKT_WORD.findall(line)]
+
+    def _contains_break(self, tokens: List[str]) -> bool:
+        # Punkt's first pass: sentence ends, ellipses, abbreviations
+        breaks, abbrs = [], []
+        for tok in tokens:
+            if tok in _SENT_END:
+                breaks.append(True)
+                abbrs.append(False)
+            elif _ELLIPSIS.match(tok):
+                breaks.append(False)
+                abbrs.append(False)
+            elif tok.endswith("."):
+                word = tok[:-1].lower()
+                abbr = word in self.abbreviations or word.split("-")[-1] in self.abbreviations
+                breaks.append(not abbr)
+                abbrs.append(abbr)
+            else:
+                breaks.append(False)
+                abbrs.append(False)
+        # Second pass over neighbouring tokens; a break counts once a token follows it
+        for i in range(len(tokens) - 1):
+            tok, following = tokens[i], tokens[i + 1]
+            if tok.endswith("."):
+                breaks[i] = self._reclassify(tok, breaks[i], abbrs[i], following, breaks[i + 1])
+            if breaks[i]:
+                return True
+        return False
+
+    def _reclassify(self, tok: str, sentbreak: bool, abbr: bool, following: str, following_break: bool) -> bool:
+        # Punkt's orthographic heuristic, without corpus statistics: a
+        # lowercase word or `;:,.!?` never starts a sentence, otherwise unknown
+        not_starter = following in _PUNCTUATION or following[:1].islower()
+        upper = following[:1].isupper()
+        if upper:
+            typ = _NUMERIC.sub("##number##", following.lower())
+            if following_break and len(typ) > 1 and typ.endswith("."):
+                typ = typ[:-1]
+            starter = typ in self.sent_starters
+        else:
+            starter = False
+        initial = _INITIAL.match(tok) is not None
+        if (abbr or _ELLIPSIS.match(tok)) and not initial and starter:
+            return True
+        if initial or _NUMERIC.match(tok):
+            if not_starter:
+                return False
+            if initial and upper and not starter:
+                # J. Bach
+                return False
+        return sentbreak
+
+
+class PunktSegmenter:
+    """NLTK's pretrained Punkt model, loaded once (raises LookupError without its data)."""
+
+    name = "punkt"
+
+    def __init__(self, language: str = "english"):
+        try:
+            from nltk.tokenize.punkt import PunktTokenizer
+            self.tokenizer = PunktTokenizer(language)
+        except ImportError:
+            # NLTK < 3.8.2 ships pickled models
+            self.tokenizer = nltk.data.load(f"tokenizers/punkt/{language}.pickle")
+
+    def spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        return self.tokenizer.span_tokenize(text)
+
+    def sentences(self, text: str) -> List[str]:
+        return self.tokenizer.tokenize(text)
+
+
+_lock = threading.Lock()
+_segmenter = None
+
+
+def make_segmenter(name: str = "punkt"):
+    """A segmenter by name: "punkt" or "regex"."""
+    if name == "regex":
+        return RegexSegmenter()
+    if name == "punkt":
+        return PunktSegmenter()
+    raise ValueError(f"unknown segmenter {name!r} (choose punkt or regex)")
+
+
+def get_segmenter():
+    """The process-wide segmenter (EMPATHY_SEGMENTER), created on first use."""
+    global _segmenter
+    if _segmenter is None:
+        with _lock:
+            if _segmenter is None:
+                _segmenter = make_segmenter(SEGMENTER)
+    return _segmenter
+
+
+def set_segmenter(segmenter) -> None:
+    """Use `segmenter` (an instance or a name for make_segmenter) from now on."""
+    global _segmenter
+    _segmenter = make_segmenter(segmenter) if isinstance(segmenter, str) else segmenter
+
+
+def segmenter_name() -> str:
+    """Name of the segmenter in use ("punkt", "regex", ...), for cache keys.
+
+    Does not load the segmenter: before first use this is EMPATHY_SEGMENTER.
+    """
+    segmenter = _segmenter
+    if segmenter is None:
+        return SEGMENTER
+    return getattr(segmenter, "name", type(segmenter).__name__)
+
+
+def requires_nltk_data() -> bool:
+    """Whether the configured segmenter needs Punkt data (startup checks it)."""
+    return SEGMENTER != "regex"
+
+
+def spans(text: str) -> Iterator[Tuple[int, int]]:
+    """(start, end) offsets of each sentence in `text`, lazily."""
+    return get_segmenter().spans(text)
+
+
+def sentences(text: str) -> List[str]:
+    """The sentences of `text`, like nltk.sent_tokenize."""
+    return get_segmenter().sentences(text)
+
+
+def stream_spans(stream: TextIO, chunk_chars: int = 1 << 20, segmenter=None) -> Iterator[Tuple[int, int, str]]:
+    """(start, end, sentence) for each sentence of a text stream.
+
+    Reads `chunk_chars` characters at a time. A boundary is only reported
+    once the sentence after it is complete in the buffer, so results match
+    segmenting the whole text at once. Each read re-scans only the text
+    after the last settled word (about _RESCAN_CHARS back), so a long
+    stretch without a sentence boundary costs linear time.
+    """
+    segmenter = segmenter or get_segmenter()
+    buffer = ""
+    offset = 0
+    # Buffer index of the first sentence not yet yielded
+    head = 0
+    # Scans start here; every boundary before it has been yielded
+    scan_from = 0
+    while True:
+        chunk = stream.read(chunk_chars)
+        buffer += chunk
+        found = [(scan_from + s, scan_from + e) for s, e in segmenter.spans(buffer[scan_from:])]
+        found = [(s, e) for s, e in found if e > head]
+        if found:
+            # Whatever the scan starts with continues the sentence at head
+            found[0] = (head, found[0][1])
+        if not chunk:
+            for start, end in found:
+                yield offset + start, offset + end, buffer[start:end]
+            return
+        # The last boundary depends on a word the next read may extend; the
+        # last sentence may grow. Boundaries before a resume point are final
+        emit = len(found) - 2
+        resume = _RESUME.search(buffer, max(scan_from, len(buffer) - _RESCAN_CHARS))
+        if resume is not None:
+            emit = max(emit, sum(1 for s, _ in found[1:] if s <= resume.end()))
+        for start, end in found[:emit]:
+            yield offset + start, offset + end, buffer[start:end]
+        if emit > 0:
+            head = found[emit][0]
+            # Punkt reads the word before a sentence end back to the last
+            # ASCII whitespace, which can lie before the sentence start
+            scan_from = max(scan_from, _word_start(buffer, 0, head))
+        if resume is not None:
+            scan_from = max(scan_from, resume.end())
+        cut = min(head, scan_from)
+        buffer = buffer[cut:]
+        offset += cut
+        head -= cut
+        scan_from -= cut
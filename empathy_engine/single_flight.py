@@ -0,0 +1,159 @@
+"""Single-flight coalescing of identical concurrent computations.
+
+A `SingleFlight` runs at most one computation per key at a time. The first
+caller for a key (the leader) computes; callers arriving while it runs
+(followers) wait for it and receive the same result, or the same exception.
+Once the computation finishes the key is free again, so later callers start
+afresh (or find the result in a cache, as the pipeline's callers do).
+
+ - do(key, fn, cancel): the common case, one key per call
+ - claim(keys) / resolve() / fail() / wait(): for callers computing many
+   keys in one go, e.g. a batched model call over several sentences;
+   abandoned(call) tells such a caller that nobody wants a key any more
+
+Cancellation: `fn` is called with an event-like `cancel` that is set only
+once every caller waiting on the computation has set its own event, so one
+impatient client cannot cancel work others still want. A follower whose own
+event is set stops waiting and raises `cancelled_error`; a follower that
+was not cancelled but receives `cancelled_error` from a computation the
+others abandoned runs it again.
+
+Every follower counts as one duplicate computation avoided, in the
+`<name>_coalesced` counter (see `metrics`) and in stats(); all_stats()
+reports every instance by name.
+"""
+import threading
+from concurrent.futures import CancelledError
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+try:
+    from . import metrics
+except ImportError:
+    import metrics
+
+
+_instances: Dict[str, "SingleFlight"] = {}
+
+
+def all_stats() -> Dict[str, Dict]:
+    """stats() of every SingleFlight, by name."""
+    return {name: flight.stats() for name, flight in list(_instances.items())}
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "cancels")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.cancels: List[Optional[threading.Event]] = []
+
+
+class _AllCancelled:
+    """Event-like: set once every caller sharing a computation is cancelled."""
+
+    def __init__(self, call: _Call):
+        self._call = call
+
+    def is_set(self) -> bool:
+        return all(c is not None and c.is_set() for c in list(self._call.cancels))
+
+
+class SingleFlight:
+    """Coalesces concurrent computations per key; see module docstring."""
+
+    # How often a waiting follower checks its own cancel event
+    POLL_SECONDS = 0.05
+
+    def __init__(self, name: str, cancelled_error: type = CancelledError):
+        self.name = name
+        self.cancelled_error = cancelled_error
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._leaders = 0
+        self._coalesced = 0
+        _instances[name] = self
+
+    def do(self, key: Hashable, fn: Callable, cancel: Optional[threading.Event] = None):
+        """fn(shared_cancel) once per concurrent `key`; returns its result."""
+        while True:
+            (leading, following) = self.claim([key], cancel)
+            if leading:
+                call = leading[key]
+                try:
+                    result = fn(_AllCancelled(call))
+                except BaseException as e:
+                    self.fail([key], e)
+                    raise
+                self.resolve(key, result)
+                return result
+            try:
+                return self.wait(following[key], cancel)
+            except self.cancelled_error:
+                if cancel is not None and cancel.is_set():
+                    raise
+                # Abandoned by the callers ahead of us, not by us: run it again
+
+    def claim(self, keys: Iterable[Hashable],
+              cancel: Optional[threading.Event] = None) -> Tuple[Dict[Hashable, _Call], Dict[Hashable, _Call]]:
+        """Split `keys` into ({key: call} to compute, {key: call} to wait on).
+
+        The caller must resolve() or fail() every key it leads.
+        """
+        leading: Dict[Hashable, _Call] = {}
+        following: Dict[Hashable, _Call] = {}
+        with self._lock:
+            for key in keys:
+                if key in leading or key in following:
+                    continue
+                call = self._calls.get(key)
+                if call is None:
+                    call = self._calls[key] = _Call()
+                    leading[key] = call
+                else:
+                    following[key] = call
+                call.cancels.append(cancel)
+            self._leaders += len(leading)
+            self._coalesced += len(following)
+        if following:
+            metrics.count(f"{self.name}_coalesced", len(following))
+        return leading, following
+
+    def resolve(self, key: Hashable, result) -> None:
+        """Publish the result of a led computation."""
+        call = self._release(key)
+        call.result = result
+        call.done.set()
+
+    def fail(self, keys: Iterable[Hashable], error: BaseException) -> None:
+        """Publish `error` for led computations that did not finish."""
+        for key in keys:
+            call = self._release(key)
+            call.error = error
+            call.done.set()
+
+    def _release(self, key: Hashable) -> _Call:
+        # Freed before waking followers, so callers arriving afterwards start afresh
+        with self._lock:
+            return self._calls.pop(key)
+
+    def abandoned(self, call: _Call) -> bool:
+        """Whether every caller of a led computation has been cancelled."""
+        return _AllCancelled(call).is_set()
+
+    def wait(self, call: _Call, cancel: Optional[threading.Event] = None):
+        """Result of a followed computation; raises its error."""
+        if cancel is None:
+            call.done.wait()
+        else:
+            while not call.done.wait(self.POLL_SECONDS):
+                if cancel.is_set():
+                    raise self.cancelled_error("cancelled while waiting for a coalesced computation")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"in_flight": len(self._calls), "leaders": self._leaders, "coalesced": self._coalesced}
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+"""Network-free startup from bundled artifacts, plus warm-up.
+
+ - bundle(root): download NLTK punkt data and the emotion model into `root`
+   once, at build time
+ - configure_artifacts(root): point NLTK and the detector at a bundle and switch
+   Hugging Face to offline mode, so startup never touches the network
+   (unless EMPATHY_ALLOW_DOWNLOADS=1)
+ - load_tuning()/apply_tuning(): read the tuning profile written by
+   `python -m empathy_engine.autotune` and apply its thread count and batch
+   size to the detector
+ - ensure_nltk(allow_download): fail fast if punkt data is missing (not
+   needed with EMPATHY_SEGMENTER=regex)
+ - ensure_model(allow_download): fail fast if the model is not bundled and
+   would have to be downloaded
+ - warm_up(): run detection, modulation, mixdown and every encoder once so
+   the first real request doesn't pay for lazy initialisation
+
+A bundle is laid out as
+ - `<root>/nltk_data/`   punkt and punkt_tab
+ - `<root>/model/`       tokenizer and weights from save_pretrained()
+ - `<root>/bundle.json`  model name, revision and the commit it resolved to
+ - `<root>/tuning.json`  optional tuning profile for this host
+
+Usage:
+    python -m empathy_engine.startup bundle --out artifacts
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import nltk
+from pydub.generators import Sine
+
+try:
+    from . import emotion_detector, segmentation
+    from .audio_codec import OUTPUT_FORMATS, export_audio
+    from .pipeline import analyze_text, mixdown, resolve_voice_params
+    from .voice_modulator import modulate_segment
+except ImportError:
+    import emotion_detector
+    import segmentation
+    from audio_codec import OUTPUT_FORMATS, export_audio
+    from pipeline import analyze_text, mixdown, resolve_voice_params
+    from voice_modulator import modulate_segment
+
+
+ARTIFACTS_DIR = os.environ.get(
+    "EMPATHY_ARTIFACTS_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "artifacts")
+)
+NLTK_PACKAGES = ("punkt", "punkt_tab")
+# Startup never downloads NLTK data or the model unless this is set
+ALLOW_DOWNLOADS = os.environ.get("EMPATHY_ALLOW_DOWNLOADS", "0").lower() in ("1", "true", "yes", "on")
+TUNING_PROFILE = "tuning.json"
+
+WARMUP_TEXT = (
+    "Thank you so much, this is wonderful news! "
+    "I'm sorry, but the package was lost. "
+    "Why did nobody tell me sooner?"
+)
+
+
+def bundle(root: str = ARTIFACTS_DIR) -> Dict:
+    """Download NLTK data and the pinned model into `root`. Returns the manifest."""
+    nltk_dir = os.path.join(root, "nltk_data")
+    for package in NLTK_PACKAGES:
+        if not nltk.download(package, download_dir=nltk_dir, quiet=True, raise_on_error=True):
+            raise RuntimeError(f"failed to download NLTK package {package!r}")
+
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    model_dir = os.path.join(root, "model")
+    name, revision = emotion_detector.MODEL_NAME, emotion_detector.MODEL_REVISION
+    AutoTokenizer.from_pretrained(name, revision=revision).save_pretrained(model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(name, revision=revision)
+    model.save_pretrained(model_dir)
+
+    # The commit is what cache keys use for the bundled weights (model_version)
+    manifest = {"model": name, "revision": revision, "commit": getattr(model.config, "_commit_hash", None),
+                "nltk": list(NLTK_PACKAGES), "created_at": time.time()}
+    with open(os.path.join(root, "bundle.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def configure_artifacts(root: str = ARTIFACTS_DIR, allow_downloads: Optional[bool] = None) -> Dict[str, Optional[str]]:
+    """Use the bundle under `root` where present. Returns the paths in use.
+
+    EMPATHY_MODEL_PATH, if set, takes precedence over the bundled model.
+    Hugging Face is switched to offline mode when the model is local or
+    `allow_downloads` (default EMPATHY_ALLOW_DOWNLOADS) is off.
+    """
+    allow_downloads = ALLOW_DOWNLOADS if allow_downloads is None else allow_downloads
+    nltk_dir = os.path.join(root, "nltk_data")
+    if os.path.isdir(nltk_dir):
+        if nltk_dir not in nltk.data.path:
+            nltk.data.path.insert(0, nltk_dir)
+    else:
+        nltk_dir = None
+
+    model_dir = emotion_detector.MODEL_PATH
+    if model_dir is None and os.path.isdir(os.path.join(root, "model")):
+        model_dir = emotion_detector.MODEL_PATH = os.path.join(root, "model")
+    if model_dir is not None or not allow_downloads:
+        # Weights are local, or must be: never let transformers reach for the Hub
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+    profile_path = tuning_path(root)
+    profile = load_tuning(profile_path, root)
+    if profile is not None:
+        apply_tuning(profile)
+    return {"nltk_data": nltk_dir, "model": model_dir, "tuning": profile_path if profile else None}
+
+
+def tuning_path(root: str = ARTIFACTS_DIR) -> str:
+    """EMPATHY_TUNING_PROFILE, or the profile inside the bundle at `root`."""
+    return os.environ.get("EMPATHY_TUNING_PROFILE") or os.path.join(root, TUNING_PROFILE)
+
+
+def detector_id(root: str = ARTIFACTS_DIR) -> str:
+    """The detector startup loads: the local model directory, or name@revision."""
+    model_dir = emotion_detector.MODEL_PATH
+    if model_dir is None and os.path.isdir(os.path.join(root, "model")):
+        model_dir = os.path.join(root, "model")
+    if model_dir is not None:
+        return os.path.abspath(model_dir)
+    return f"{emotion_detector.MODEL_NAME}@{emotion_detector.MODEL_REVISION}"
+
+
+def load_tuning(path: Optional[str] = None, root: str = ARTIFACTS_DIR) -> Optional[Dict]:
+    """The tuning profile at `path`, or None if there is none for this host.
+
+    A profile measured on a machine with a different core count, or for
+    another detector than the one configured (see detector_id; stub sweeps
+    never match), is ignored.
+    """
+    path = path or tuning_path(root)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        profile = json.load(f)
+    cpus = profile.get("host", {}).get("cpu_count")
+    if cpus != os.cpu_count():
+        print(f"Ignoring tuning profile {path}: tuned for {cpus} CPUs, this host has {os.cpu_count()}")
+        return None
+    detector = detector_id(root)
+    if profile.get("detector") != detector:
+        print(f"Ignoring tuning profile {path}: tuned for detector {profile.get('detector')!r}, not {detector!r}")
+        return None
+    return profile
+
+
+def apply_tuning(profile: Dict) -> Dict[str, int]:
+    """Use the profile's thread count and batch size for the detector.
+
+    EMPATHY_TORCH_THREADS and EMPATHY_DETECT_BATCH_SIZE still take
+    precedence. Returns the settings applied.
+    """
+    applied = {}
+    if profile.get("threads") and not os.environ.get("EMPATHY_TORCH_THREADS"):
+        applied["threads"] = emotion_detector.TORCH_THREADS = int(profile["threads"])
+    if profile.get("batch_size") and not os.environ.get("EMPATHY_DETECT_BATCH_SIZE"):
+        applied["batch_size"] = emotion_detector.DETECT_BATCH_SIZE = int(profile["batch_size"])
+    return applied
+
+
+def ensure_nltk(allow_download: bool = False) -> None:
+    """Raise LookupError unless sent_tokenize can find its punkt data.
+
+    With `allow_download`, missing packages are fetched instead. Nothing
+    to check when the regex segmenter is configured.
+    """
+    if not segmentation.requires_nltk_data():
+        return
+    try:
+        nltk.sent_tokenize("Ready. Set.")
+        return
+    except LookupError:
+        if not allow_download:
+            raise LookupError(
+                "NLTK punkt data not found; bundle it with "
+                "`python -m empathy_engine.startup bundle` or set EMPATHY_ALLOW_DOWNLOADS=1"
+            )
+    for package in NLTK_PACKAGES:
+        print(f"Downloading NLTK package {package!r}...")
+        nltk.download(package, quiet=True, raise_on_error=True)
+    nltk.sent_tokenize("Ready. Set.")
+
+
+def ensure_model(allow_download: Optional[bool] = None) -> None:
+    """Raise LookupError if the model is not local and downloads are off.
+
+    `allow_download` defaults to EMPATHY_ALLOW_DOWNLOADS. Call after
+    configure_artifacts(), which picks up a bundled model.
+    """
+    allow_download = ALLOW_DOWNLOADS if allow_download is None else allow_download
+    if emotion_detector.MODEL_PATH is None and not allow_download:
+        raise LookupError(
+            "emotion model not bundled; bundle it with `python -m empathy_engine.startup bundle`, "
+            "point EMPATHY_MODEL_PATH at a saved model or set EMPATHY_ALLOW_DOWNLOADS=1"
+        )
+
+
+def warm_up(formats: Optional[List[str]] = None) -> Dict[str, float]:
+    """Exercise every stage once. Returns seconds spent per stage."""
+    timings: Dict[str, float] = {}
+
+    t0 = time.perf_counter()
+    analysis = analyze_text(WARMUP_TEXT)
+    emotion_detector.detect_emotion(WARMUP_TEXT)
+    timings["detect"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    tone = Sine(220, sample_rate=24000).to_audio_segment(duration=400, volume=-12.0)
+    audio = mixdown([modulate_segment(tone, resolve_voice_params(item)) for item in analysis["timeline"]])
+    timings["modulate"] = time.perf_counter() - t0
+
+    # First use of each codec loads libsndfile/ffmpeg paths
+    t0 = time.perf_counter()
+    scratch = tempfile.mkdtemp(prefix="empathy_warmup_")
+    try:
+        for fmt in formats or list(OUTPUT_FORMATS):
+            export_audio(audio, os.path.join(scratch, f"warmup.{OUTPUT_FORMATS[fmt]['extension']}"), fmt)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    timings["encode"] = time.perf_counter() - t0
+    return timings
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("bundle", help="download NLTK data and the model for offline startup")
+    p.add_argument("--out", default=ARTIFACTS_DIR)
+    p = sub.add_parser("warmup", help="load the bundle and time a warm-up pass")
+    p.add_argument("--root", default=ARTIFACTS_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "bundle":
+        manifest = bundle(args.out)
+        print(f"Bundled {manifest['model']}@{manifest['revision']} and NLTK data into {args.out}")
+        return 0
+
+    print(f"Using {configure_artifacts(args.root)}")
+    ensure_nltk()
+    ensure_model()
+    t0 = time.perf_counter()
+    emotion_detector._init_detector()
+    print(f"model load {time.perf_counter() - t0:.2f}s")
+    for stage, seconds in warm_up().items():
+        print(f"warm-up {stage} {seconds:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""Incremental text-in, audio-out rendering for live text.
+
+`StreamingSession` takes text as it arrives (live captions, chat) and speaks
+it sentence by sentence:
+ - feed(delta) buffers text and returns the sentences it completed. The
+   segmentation module decides the boundaries; a sentence ending at the
+   end of the buffer is only released once a probe word after it starts a
+   new sentence, so "Dr." or "3." at the end of a delta waits for more text
+ - flush() releases whatever is left, e.g. when the speaker pauses
+ - render(sentence) runs detection, TTS, modulation and encoding for one
+   sentence and returns its audio bytes with the emotion metadata
+
+Corpus-level prosody is a running estimate: base_pitch after each sentence
+equals what summarize_timeline() gives for all sentences so far, updated in
+O(1) per sentence. Audio already sent keeps the base_pitch it had.
+"""
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from pydub import AudioSegment
+
+try:
+    from .emotion_detector import score_sentence
+    from .tts_engine import native_controls, needs_dsp, split_voice_params, synthesize_sentence, synthesize_text
+    from .voice_modulator import modulate_segment
+    from .config import EMOTION_VALENCE, apply_base_pitch_to_params, compute_base_pitch, get_voice_params
+    from .voice_table import timeline_voice_params
+    from .audio_codec import OUTPUT_FORMATS, export_audio, normalize_format
+    from . import metrics, segmentation
+except ImportError:
+    from emotion_detector import score_sentence
+    from tts_engine import native_controls, needs_dsp, split_voice_params, synthesize_sentence, synthesize_text
+    from voice_modulator import modulate_segment
+    from config import EMOTION_VALENCE, apply_base_pitch_to_params, compute_base_pitch, get_voice_params
+    from voice_table import timeline_voice_params
+    from audio_codec import OUTPUT_FORMATS, export_audio, normalize_format
+    import metrics
+    import segmentation
+
+
+# Appended to the buffer to ask the segmenter whether its tail ends a sentence
+_PROBE = "The"
+_TERMINAL = re.compile(r"[.!?][\"')\]]*$")
+
+
+class RunningProsody:
+    """Valence, volatility and base_pitch of a growing timeline."""
+
+    def __init__(self):
+        self._valence_sum = 0.0
+        self._weight = 0.0
+        self._tops = 0
+        self._changes = 0
+        self._last_top: Optional[str] = None
+
+    def add(self, entry: Dict) -> None:
+        emotions = entry.get("emotions", [])
+        for e in emotions:
+            confidence = float(e.get("confidence", 0.0))
+            self._valence_sum += EMOTION_VALENCE.get(e.get("label", "neutral").lower(), 0.0) * confidence
+            self._weight += confidence
+        if emotions:
+            top = emotions[0]["label"]
+            if self._last_top is not None and top != self._last_top:
+                self._changes += 1
+            self._last_top = top
+            self._tops += 1
+
+    @property
+    def valence(self) -> float:
+        if self._weight == 0.0:
+            return 0.0
+        return max(-1.0, min(1.0, self._valence_sum / self._weight))
+
+    @property
+    def volatility(self) -> float:
+        return self._changes / (self._tops - 1) if self._tops >= 2 else 0.0
+
+    @property
+    def base_pitch(self) -> float:
+        return compute_base_pitch(self.valence, self.volatility)
+
+
+class StreamingSession:
+    """One live stream of text; see module docstring.
+
+    feed()/flush() and render() may run on different threads, but render()
+    calls are serialized so sentences update the prosody in order.
+    """
+
+    def __init__(
+        self,
+        synthesize: Optional[Callable[[str, str], str]] = None,
+        output_format: str = "opus",
+        bitrate_kbps: Optional[float] = None,
+        output_dir: str = "static/audio",
+    ):
+        self.synthesize = synthesize or synthesize_sentence
+        self.output_format = normalize_format(output_format)
+        self.bitrate_kbps = bitrate_kbps
+        self.media_type = OUTPUT_FORMATS[self.output_format]["media_type"]
+        self.prosody = RunningProsody()
+        self._buffer = ""
+        self._index = 0
+        self._lock = threading.Lock()
+        scratch_root = os.path.join(output_dir, "temp")
+        os.makedirs(scratch_root, exist_ok=True)
+        self._work_dir = tempfile.mkdtemp(prefix="stream_", dir=scratch_root)
+
+    def close(self) -> None:
+        """Remove the scratch directory."""
+        shutil.rmtree(self._work_dir, ignore_errors=True)
+
+    # ── Segmentation ─────────────────────────────────────────────────────
+
+    def feed(self, delta: str) -> List[str]:
+        """Append `delta` and return the sentences it completed, in order."""
+        self._buffer += delta
+        stripped = self._buffer.rstrip()
+        if not stripped:
+            return []
+        with metrics.stage("segment"):
+            sentences = segmentation.sentences(stripped)
+            if _TERMINAL.search(stripped) and self._buffer != stripped:
+                # Tail ends in punctuation and whitespace: a sentence if the segmenter
+                # starts a new one at the probe word
+                probed = segmentation.sentences(f"{stripped} {_PROBE}")
+                complete = sentences if probed[-1] == _PROBE else sentences[:-1]
+            else:
+                complete = sentences[:-1]
+        return self._consume(complete)
+
+    def flush(self) -> List[str]:
+        """Release the buffered text as sentences, complete or not."""
+        stripped = self._buffer.strip()
+        if not stripped:
+            self._buffer = ""
+            return []
+        return self._consume(segmentation.sentences(stripped))
+
+    def _consume(self, sentences: List[str]) -> List[str]:
+        # Sentences are slices of the input, so each sentence is found in order
+        pos = 0
+        for sentence in sentences:
+            pos = self._buffer.index(sentence, pos) + len(sentence)
+        self._buffer = self._buffer[pos:].lstrip()
+        return [s.strip() for s in sentences]
+
+    # ── Rendering ────────────────────────────────────────────────────────
+
+    def render(self, sentence: str) -> Dict:
+        """Detect, synthesize, modulate and encode one sentence.
+
+        Returns metadata (`index`, `sentence`, `emotions`, `voice_params`,
+        `base_pitch`, `media_type`, `timings`, `degraded` when the TTS
+        fallback rendered it) plus the encoded `audio` bytes.
+        """
+        with self._lock:
+            index = self._index
+            self._index += 1
+            timings = {}
+
+            t0 = time.perf_counter()
+            entry = score_sentence(sentence)
+            self.prosody.add(entry)
+            base_pitch = self.prosody.base_pitch
+            voice_params = timeline_voice_params([entry], base_pitch)[0]
+            if voice_params is None:
+                voice_params = apply_base_pitch_to_params(get_voice_params("neutral", "medium"), base_pitch)
+            timings["detect"] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            raw_path = os.path.join(self._work_dir, f"raw_{index:05d}.wav")
+            try:
+                with metrics.stage("tts"):
+                    _, degraded = synthesize_text(sentence, raw_path, voice_params, self.synthesize)
+                raw = AudioSegment.from_file(raw_path)
+            finally:
+                try:
+                    os.remove(raw_path)
+                except OSError:
+                    pass
+            timings["tts"] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            _, dsp_params = split_voice_params(voice_params, native_controls(self.synthesize))
+            audio = modulate_segment(raw, dsp_params) if needs_dsp(dsp_params) else raw
+            timings["modulate"] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            buf = io.BytesIO()
+            with metrics.stage("export"):
+                export_audio(audio, buf, self.output_format, self.bitrate_kbps)
+            timings["encode"] = time.perf_counter() - t0
+
+        metrics.count("stream_sentences")
+        return {
+            "index": index,
+            "sentence": sentence,
+            "emotions": entry["emotions"][:3],
+            "voice_params": voice_params,
+            "base_pitch": base_pitch,
+            "media_type": self.media_type,
+            "duration_s": len(audio) / 1000.0,
+            "degraded": degraded,
+            "timings": timings,
+            "audio": buf.getvalue(),
+        }
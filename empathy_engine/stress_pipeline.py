@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""Concurrent stress test for run_pipeline using the offline stubs.
+
+Renders every text once serially as a reference, then renders all of them
+again from N simultaneous threads and checks that:
+ - every concurrent output is byte-identical to its serial reference
+ - no two calls were handed the same output path
+ - no scratch directories are left behind under <output_dir>/temp
+
+Usage: python -m empathy_engine.stress_pipeline [--calls 64]
+Requires NLTK punkt data for sentence segmentation.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from . import emotion_detector
+    from .pipeline import run_pipeline
+    from .stubs import StubDetector, stub_synthesize
+except ImportError:
+    import emotion_detector
+    from pipeline import run_pipeline
+    from stubs import StubDetector, stub_synthesize
+
+
+TEXTS = [
+    "I can't believe we finally made it! The whole team was cheering.",
+    "The results came back this morning. I'm not sure how to feel about them.",
+    "Why would anyone leave the door open all night? That's just careless.",
+    "Thank you so much for everything. It really meant a lot to me.",
+    "I miss the old house. Everything about it felt like home. Now it's gone.",
+    "Wait, what just happened? Did the lights go out everywhere?",
+    "Honestly, that was the best meal I've had in years.",
+    "I'm worried the storm will get worse tonight. Please stay inside.",
+]
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=64, help="simultaneous run_pipeline calls")
+    args = parser.parse_args()
+
+    emotion_detector.set_detector(StubDetector())
+    output_dir = tempfile.mkdtemp(prefix="empathy_stress_")
+    try:
+        reference = {}
+        for text in TEXTS:
+            out = run_pipeline(text, output_dir=output_dir, synthesize=stub_synthesize)
+            reference[text] = _read(out["output_audio_path"])
+
+        jobs = [TEXTS[i % len(TEXTS)] for i in range(args.calls)]
+        with ThreadPoolExecutor(max_workers=args.calls) as pool:
+            results = list(pool.map(
+                lambda t: run_pipeline(t, output_dir=output_dir, synthesize=stub_synthesize), jobs
+            ))
+
+        failures = []
+        paths = [r["output_audio_path"] for r in results]
+        if len(set(paths)) != len(paths):
+            failures.append("duplicate output paths handed out")
+        for i, (text, res) in enumerate(zip(jobs, results)):
+            if _read(res["output_audio_path"]) != reference[text]:
+                failures.append(f"call {i}: output differs from serial reference")
+        leftovers = os.listdir(os.path.join(output_dir, "temp"))
+        if leftovers:
+            failures.append(f"{len(leftovers)} scratch dirs left behind")
+
+        print(f"{args.calls} concurrent calls, {len(failures)} failures")
+        for f in failures:
+            print(f"  FAIL {f}")
+        return 1 if failures else 0
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""Offline stand-ins for the emotion model and gTTS.
+
+Both stubs are deterministic functions of their input text so that runs can
+be compared byte-for-byte:
+ - StubDetector: callable with the HF pipeline output shape
+ - stub_synthesize(text, output_path): writes a sine tone instead of speech
+ - stub_synthesize_prosody(text, output_path, voice_params): the same tone
+   with speed, pitch and volume applied natively (see tts_engine.native_prosody)
+ - make_stub_synthesize(latency_ms, jitter_ms): stub_synthesize plus a
+   simulated network round trip
+ - StubTTSServer: local HTTP stand-in for a TTS service, serving the stub
+   tone with injected latency spikes; make_http_synthesize(url) is its client
+ - install_from_env(): swap both in when EMPATHY_STUB_BACKENDS=1 (load tests)
+"""
+import functools
+import hashlib
+import io
+import json
+import os
+import random
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+try:
+    from .config import EMOTIONS
+    from .tts_engine import native_prosody
+except ImportError:
+    from config import EMOTIONS
+    from tts_engine import native_prosody
+
+
+STUB_FRAME_RATE = 24000  # matches gTTS output
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class StubDetector:
+    """Deterministic replacement for the GoEmotions pipeline.
+
+    Called with a string it returns `[[{"label": ..., "score": ...}, ...]]`
+    like the HF pipeline with `return_all_scores=True`; called with a list it
+    returns one such label list per text. Scores derive from a hash of the text.
+
+    `call_ms` and `item_ms` add simulated model latency per call and per
+    text, so batching effects show up in benchmarks.
+    """
+
+    def __init__(self, call_ms: float = 0.0, item_ms: float = 0.0):
+        self.call_ms = call_ms
+        self.item_ms = item_ms
+
+    def __call__(self, inputs, **kwargs):
+        texts = inputs if isinstance(inputs, list) else [inputs]
+        if self.call_ms or self.item_ms:
+            time.sleep((self.call_ms + self.item_ms * len(texts)) / 1000.0)
+        return [self._scores(t) for t in texts]
+
+    def _scores(self, text):
+        digest = _digest(text)
+        raw = [digest[i % len(digest)] + 1 for i in range(len(EMOTIONS))]
+        # Sharpen the distribution so top labels span all intensity buckets
+        top = digest[0] % len(EMOTIONS)
+        raw[top] *= 4 + digest[1] % 40
+        total = float(sum(raw))
+        return [{"label": lbl, "score": v / total} for lbl, v in zip(EMOTIONS, raw)]
+
+
+def _tone(text: str, speed: float = 1.0, semitones: float = 0.0, gain_db: float = 0.0) -> AudioSegment:
+    if not isinstance(text, str):
+        raise TypeError("text must be a string")
+
+    if text.strip() == "" or len(text.strip()) < 3:
+        return AudioSegment.silent(duration=int(600 / speed), frame_rate=STUB_FRAME_RATE)
+    digest = _digest(text)
+    freq = (150 + digest[0] * 2) * 2.0 ** (semitones / 12.0)
+    duration_ms = min(60 * len(text.split()) + 200, 8000)
+    return Sine(freq, sample_rate=STUB_FRAME_RATE).to_audio_segment(
+        duration=int(duration_ms / speed), volume=-12.0 + gain_db
+    )
+
+
+def _write_tone(text: str, output_path: str, speed: float = 1.0, semitones: float = 0.0, gain_db: float = 0.0) -> str:
+    audio = _tone(text, speed, semitones, gain_db)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    audio.export(output_path, format="wav")
+    return output_path
+
+
+def stub_synthesize(text: str, output_path: str) -> str:
+    """Write a tone whose pitch and length depend on `text`. Returns WAV path."""
+    return _write_tone(text, output_path)
+
+
+@native_prosody("speed", "pitch_semitones", "volume_db")
+def stub_synthesize_prosody(text: str, output_path: str, voice_params: Optional[Dict] = None) -> str:
+    """stub_synthesize for an engine with native prosody: the tone is generated
+    at the requested speed, pitch and volume, with no DSP afterwards."""
+    params = voice_params or {}
+    return _write_tone(
+        text, output_path, float(params.get("speed", 1.0)),
+        float(params.get("pitch_semitones", 0.0)), float(params.get("volume_db", 0.0)),
+    )
+
+
+def make_stub_synthesize(latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                         native: bool = False) -> Callable[[str, str], str]:
+    """stub_synthesize (stub_synthesize_prosody with `native`) that first
+    sleeps `latency_ms` +/- uniform `jitter_ms`."""
+    base = stub_synthesize_prosody if native else stub_synthesize
+    if not latency_ms and not jitter_ms:
+        return base
+
+    # Same name and prosody controls as `base`: latency does not change the audio
+    @functools.wraps(base)
+    def synthesize(text: str, output_path: str, *voice_params) -> str:
+        delay = latency_ms + random.uniform(-jitter_ms, jitter_ms)
+        time.sleep(max(0.0, delay) / 1000.0)
+        return base(text, output_path, *voice_params)
+
+    return synthesize
+
+
+class StubTTSServer:
+    """Local HTTP stand-in for a TTS service, for hedging and deadline tests.
+
+    `POST /synthesize` with `{"text": ...}` returns the stub tone as WAV
+    after `latency_ms` +/- `jitter_ms`; a `spike_rate` fraction of requests
+    instead takes `spike_ms` (a stalled upstream). Use as a context manager;
+    `url` is the endpoint and `requests` counts requests served.
+    """
+
+    def __init__(self, latency_ms: float = 50.0, jitter_ms: float = 10.0,
+                 spike_rate: float = 0.0, spike_ms: float = 2000.0, seed: int = 47):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.spike_rate = spike_rate
+        self.spike_ms = spike_ms
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+
+    def _delay(self) -> float:
+        with self._lock:
+            self.requests += 1
+            if self._rng.random() < self.spike_rate:
+                return self.spike_ms / 1000.0
+            return max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+
+    def start(self) -> "StubTTSServer":
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                text = json.loads(self.rfile.read(length) or b"{}").get("text", "")
+                time.sleep(server._delay())
+                buf = io.BytesIO()
+                _tone(text).export(buf, format="wav")
+                body = buf.getvalue()
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "audio/wav")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name="stub-tts-server", daemon=True).start()
+        return self
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/synthesize"
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self) -> "StubTTSServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def make_http_synthesize(url: str, timeout: float = 60.0) -> Callable[[str, str], str]:
+    """TTS function that fetches WAV audio from `url` (e.g. StubTTSServer.url)."""
+
+    def http_synthesize(text: str, output_path: str) -> str:
+        request = urllib.request.Request(
+            url, data=json.dumps({"text": text}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read()
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, "wb") as f:
+            f.write(body)
+        return output_path
+
+    return http_synthesize
+
+
+def install_from_env() -> Optional[Callable[[str, str], str]]:
+    """Install the stub detector if EMPATHY_STUB_BACKENDS is set.
+
+    Latency comes from EMPATHY_STUB_DETECT_LATENCY_MS / _ITEM_MS and
+    EMPATHY_STUB_TTS_LATENCY_MS / _JITTER_MS; EMPATHY_STUB_TTS_NATIVE=1
+    picks the native-prosody TTS stub. Returns the stub TTS function to pass
+    as `synthesize`, or None when stubs are off.
+    """
+    if os.environ.get("EMPATHY_STUB_BACKENDS", "0").lower() not in ("1", "true", "yes", "on"):
+        return None
+    try:
+        from . import emotion_detector
+    except ImportError:
+        import emotion_detector
+
+    emotion_detector.set_detector(StubDetector(
+        call_ms=float(os.environ.get("EMPATHY_STUB_DETECT_LATENCY_MS", 0)),
+        item_ms=float(os.environ.get("EMPATHY_STUB_DETECT_ITEM_MS", 0)),
+    ))
+    return make_stub_synthesize(
+        latency_ms=float(os.environ.get("EMPATHY_STUB_TTS_LATENCY_MS", 0)),
+        jitter_ms=float(os.environ.get("EMPATHY_STUB_TTS_JITTER_MS", 0)),
+        native=os.environ.get("EMPATHY_STUB_TTS_NATIVE", "0").lower() in ("1", "true", "yes", "on"),
+    )
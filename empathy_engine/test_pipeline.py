@@ -1,7 +1,8 @@
 #!/usr/bin/env python
 """Test script for recalibrated pipeline"""
+import os
 import sys
-sys.path.insert(0, r'd:\darwix\empathy_engine')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from pipeline import run_pipeline
 
@@ -2,18 +2,36 @@
 
 Functions:
  - synthesize_sentence(text, output_path) -> wav_path
+ - local_synthesize(text, output_path) -> wav_path, offline (pyttsx3)
  - synthesize_batch(sentences, output_dir) -> list[wav_path]
+ - synthesize_text(text, output_path, voice_params, synthesize) -> (wav_path,
+   degraded), passing prosody to backends marked with native_prosody(...),
+   hedged and under a deadline (see tts_hedge)
 
-Handles short/empty text and simple retry logic for network errors.
+Handles short/empty text and simple retry logic for network errors. A
+sentence whose TTS misses its deadline is rendered by the first working
+engine in EMPATHY_TTS_FALLBACK (default "local,silence"; "none" raises).
 """
 import os
+import shutil
+import threading
 import time
 import tempfile
-from typing import List
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
 
-from gtts import gTTS
 from pydub import AudioSegment
 
+try:
+    from . import metrics
+    from .single_flight import SingleFlight
+    from .tts_hedge import TTSDeadlineExceeded, hedged_call
+    from .voice_modulator import modulate
+except ImportError:
+    import metrics
+    from single_flight import SingleFlight
+    from tts_hedge import TTSDeadlineExceeded, hedged_call
+    from voice_modulator import modulate
+
 
 def synthesize_sentence(text: str, output_path: str) -> str:
     """Synthesize `text` to WAV at `output_path`. Returns WAV path.
@@ -33,6 +51,9 @@ def synthesize_sentence(text: str, output_path: str) -> str:
         silence.export(output_path, format="wav")
         return output_path
 
+    # Imported lazily so offline runs with a stub TTS don't need gTTS
+    from gtts import gTTS
+
     mp3_fd, mp3_path = tempfile.mkstemp(suffix=".mp3")
     os.close(mp3_fd)
     try:
@@ -40,19 +61,22 @@ def synthesize_sentence(text: str, output_path: str) -> str:
         last_exc = None
         while attempts < 3:
             try:
-                tts = gTTS(text)
-                tts.save(mp3_path)
+                with metrics.stage("tts_request"):
+                    tts = gTTS(text)
+                    tts.save(mp3_path)
                 break
             except Exception as e:
                 last_exc = e
                 attempts += 1
                 if attempts >= 3:
                     raise
+                metrics.count("tts_retries")
                 time.sleep(1)
 
         # Convert mp3 to wav using pydub
-        audio = AudioSegment.from_file(mp3_path, format="mp3")
-        audio.export(output_path, format="wav")
+        with metrics.stage("tts_decode"):
+            audio = AudioSegment.from_file(mp3_path, format="mp3")
+            audio.export(output_path, format="wav")
         return output_path
     finally:
         try:
@@ -62,6 +86,91 @@ def synthesize_sentence(text: str, output_path: str) -> str:
             pass
 
 
+# pyttsx3 engines are not thread-safe
+_local_lock = threading.Lock()
+
+
+def local_synthesize(text: str, output_path: str) -> str:
+    """Synthesize `text` offline with pyttsx3 (system voices, e.g. eSpeak).
+
+    pyttsx3 is optional; without it this raises ImportError.
+    """
+    if not isinstance(text, str):
+        raise TypeError("text must be a string")
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    if text.strip() == "" or len(text.strip()) < 3:
+        return silence_synthesize(text, output_path)
+
+    import pyttsx3
+
+    raw_fd, raw_path = tempfile.mkstemp(suffix=".wav")
+    os.close(raw_fd)
+    try:
+        with _local_lock:
+            engine = pyttsx3.init()
+            engine.save_to_file(text, raw_path)
+            engine.runAndWait()
+        AudioSegment.from_file(raw_path).export(output_path, format="wav")
+        return output_path
+    finally:
+        try:
+            os.remove(raw_path)
+        except OSError:
+            pass
+
+
+def silence_synthesize(text: str, output_path: str) -> str:
+    """A pause of roughly the time `text` takes to say (last-resort fallback)."""
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    duration_ms = min(max(600, 350 * len(text.split())), 15000)
+    AudioSegment.silent(duration=duration_ms).export(output_path, format="wav")
+    return output_path
+
+
+FALLBACK_ENGINES: Dict[str, Callable[[str, str], str]] = {
+    "local": local_synthesize,
+    "silence": silence_synthesize,
+}
+
+
+def _fallback_chain() -> Tuple[str, ...]:
+    names = []
+    for name in os.environ.get("EMPATHY_TTS_FALLBACK", "local,silence").split(","):
+        name = name.strip().lower()
+        if not name or name == "none":
+            continue
+        if name not in FALLBACK_ENGINES:
+            print(f"Warning: unknown TTS fallback {name!r} ignored (choose from {sorted(FALLBACK_ENGINES)})")
+            continue
+        names.append(name)
+    return tuple(names)
+
+
+# Engines tried, in order, for a sentence whose TTS missed its deadline
+FALLBACK = _fallback_chain()
+
+
+def synthesize_fallback(text: str, output_path: str, native: Optional[Dict] = None) -> str:
+    """Render `text` with the first FALLBACK engine that works.
+
+    `native` is the prosody the primary engine would have applied itself;
+    it is applied here by DSP so the sentence still sounds as intended.
+    """
+    for name in FALLBACK:
+        try:
+            FALLBACK_ENGINES[name](text, output_path)
+        except Exception as e:
+            print(f"Warning: TTS fallback {name!r} failed: {e}")
+            continue
+        metrics.count(f"tts_fallback_{name}")
+        if native and needs_dsp(native):
+            modulate(output_path, dict(PROSODY_CONTROLS, **native), output_path)
+        return output_path
+    raise TTSDeadlineExceeded("TTS missed its deadline and no fallback engine worked")
+
+
 def synthesize_batch(sentences: List[str], output_dir: str) -> List[str]:
     """Synthesize a list of sentences to WAV files in `output_dir`.
 
@@ -78,21 +187,98 @@ def synthesize_batch(sentences: List[str], output_dir: str) -> List[str]:
     return wav_paths
 
 
-if __name__ == "__main__":
-    # quick manual test
-    out = synthesize_batch(["Hello world.", "I am so happy!", "This is sad."], output_dir="./temp_tts")
-    print(out)
-"""Scaffold for TTS engine.
+# In-flight TTS calls, shared by concurrent callers
+_tts_calls = SingleFlight("tts")
 
-Example function may use gTTS to synthesize speech to a file.
-"""
-from typing import Dict
+# Voice params a TTS backend can apply natively, with their neutral values
+PROSODY_CONTROLS: Dict[str, float] = {"speed": 1.0, "pitch_semitones": 0.0, "volume_db": 0.0}
+
+
+def native_prosody(*controls: str) -> Callable:
+    """Mark a TTS function as applying `controls` itself (SSML or engine settings).
+
+    The marked function is called as `synthesize(text, output_path,
+    voice_params)` with only those keys in `voice_params`; modulation then
+    skips them.
+    """
+    unknown = set(controls) - set(PROSODY_CONTROLS)
+    if unknown:
+        raise ValueError(f"unknown prosody controls: {sorted(unknown)}")
+
+    def mark(synthesize: Callable) -> Callable:
+        synthesize.prosody_controls = frozenset(controls)
+        return synthesize
+
+    return mark
+
+
+def native_controls(synthesize: Callable) -> FrozenSet[str]:
+    """Prosody controls `synthesize` applies natively (empty for plain TTS)."""
+    return getattr(synthesize, "prosody_controls", frozenset())
 
 
-def synthesize_text(text: str, output_path: str, voice_params: Dict = None) -> None:
-    """Synthesize `text` to `output_path`.
+def split_voice_params(voice_params: Dict, controls: FrozenSet[str]) -> Tuple[Dict, Dict]:
+    """Split `voice_params` into (params for the engine, params left for DSP).
 
-    `voice_params` can be used to choose voice or affect synthesis.
-    This is a scaffold showing expected signature.
+    The DSP half keeps every key, with natively applied ones set to neutral.
     """
-    raise NotImplementedError("TTS synthesize function not implemented yet")
+    native = {k: voice_params.get(k, neutral) for k, neutral in PROSODY_CONTROLS.items() if k in controls}
+    dsp = dict(voice_params)
+    dsp.update((k, PROSODY_CONTROLS[k]) for k in native)
+    return native, dsp
+
+
+def needs_dsp(voice_params: Dict) -> bool:
+    """Whether modulating with `voice_params` would change the audio."""
+    return any(float(voice_params.get(k, neutral)) != neutral for k, neutral in PROSODY_CONTROLS.items())
+
+
+def synthesize_text(
+    text: str,
+    output_path: str,
+    voice_params: Optional[Dict] = None,
+    synthesize: Optional[Callable] = None,
+) -> Tuple[str, bool]:
+    """Synthesize `text` to WAV at `output_path` with `synthesize` (default gTTS).
+
+    Backends marked with native_prosody() get their share of `voice_params`;
+    the rest is left for modulation (see split_voice_params). Concurrent
+    calls for the same text share one TTS call. Slow calls are hedged and
+    cut off at the deadline (see tts_hedge), after which the sentence comes
+    from synthesize_fallback(). Returns (wav_path, degraded); degraded
+    audio came from the fallback and must not be cached.
+    """
+    synthesize = synthesize or synthesize_sentence
+    controls = native_controls(synthesize)
+    native = split_voice_params(voice_params, controls)[0] if controls and voice_params is not None else None
+    backend = f"{getattr(synthesize, '__module__', '')}.{getattr(synthesize, '__qualname__', repr(synthesize))}"
+
+    def attempt(path: str) -> None:
+        if native is None:
+            synthesize(text, path)
+        else:
+            synthesize(text, path, native)
+
+    def run(_cancel) -> Tuple[str, bool]:
+        if native is not None:
+            metrics.count("tts_native_prosody")
+        return hedged_call(attempt, output_path, backend,
+                           lambda path: synthesize_fallback(text, path, native))
+
+    # Concurrent requests for the same sentence (and engine params) share one
+    # TTS call; the others copy its file
+    key = (backend, text, tuple(sorted(native.items())) if native else ())
+    produced, degraded = _tts_calls.do(key, run)
+    if produced != output_path:
+        try:
+            shutil.copyfile(produced, output_path)
+        except OSError:
+            # The leader's scratch directory is already gone
+            return run(None)
+    return output_path, degraded
+
+
+if __name__ == "__main__":
+    # quick manual test
+    out = synthesize_batch(["Hello world.", "I am so happy!", "This is sad."], output_dir="./temp_tts")
+    print(out)
@@ -0,0 +1,263 @@
+"""Deadlines and hedged requests for TTS calls.
+
+gTTS is a network call, and one slow response would otherwise hold up the
+whole render. hedged_call() runs one TTS call with:
+ - a hedge: if the call has not returned by the backend's recent p95
+   latency (EMPATHY_TTS_HEDGE_QUANTILE), a duplicate is issued and the
+   first to finish wins. Hedges are capped at EMPATHY_TTS_HEDGE_BUDGET of
+   all calls (default 5%), so a slow backend does not get twice the load
+ - a deadline: a call without a result after EMPATHY_TTS_DEADLINE_SECONDS
+   (default 10) is given up on, and the caller's fallback renders the
+   sentence instead (see tts_engine.FALLBACK); without a fallback it raises
+   TTSDeadlineExceeded. Fallback audio is reported as degraded so callers
+   keep it out of their caches
+
+Each attempt writes to its own scratch directory; the winner's file is
+moved into place and late attempts clean up after themselves. Setting both
+EMPATHY_TTS_HEDGE_QUANTILE and EMPATHY_TTS_DEADLINE_SECONDS to 0 calls the
+backend inline, as before.
+
+stats() reports the hedge delay and counters per backend; configure()
+changes the settings at runtime (benchmarks).
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    from . import metrics
+except ImportError:
+    import metrics
+
+
+DEADLINE_SECONDS = float(os.environ.get("EMPATHY_TTS_DEADLINE_SECONDS", 10))
+HEDGE_QUANTILE = float(os.environ.get("EMPATHY_TTS_HEDGE_QUANTILE", 0.95))
+HEDGE_BUDGET = float(os.environ.get("EMPATHY_TTS_HEDGE_BUDGET", 0.05))
+# Threads running TTS attempts; abandoned attempts hold theirs until they return
+TTS_THREADS = int(os.environ.get("EMPATHY_TTS_THREADS", 32))
+
+# Latencies needed before hedging starts, and how many recent ones are kept
+MIN_SAMPLES = 20
+WINDOW = 200
+# Hedges that may be issued back to back before the budget has to refill
+HEDGE_BURST = 5.0
+# Never hedge sooner than this, whatever the quantile says
+MIN_HEDGE_SECONDS = 0.01
+
+
+class TTSDeadlineExceeded(TimeoutError):
+    """No TTS attempt finished within the deadline and there was no fallback."""
+
+
+class _Backend:
+    """Recent latencies and hedge budget of one TTS backend."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=WINDOW)
+        # Token bucket: every call earns HEDGE_BUDGET of a hedge, up to HEDGE_BURST
+        self._tokens = 0.0
+        self.counts = {"calls": 0, "hedges": 0, "hedge_wins": 0, "budget_exhausted": 0,
+                       "deadline_misses": 0, "errors": 0}
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging; None while hedging is off or unmeasured."""
+        if HEDGE_QUANTILE <= 0:
+            return None
+        with self._lock:
+            if len(self._latencies) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        q = ordered[min(len(ordered) - 1, int(HEDGE_QUANTILE * len(ordered)))]
+        return max(q, MIN_HEDGE_SECONDS)
+
+    def start_call(self) -> None:
+        with self._lock:
+            self.counts["calls"] += 1
+            self._tokens = min(HEDGE_BURST, self._tokens + HEDGE_BUDGET)
+
+    def take_hedge(self) -> bool:
+        with self._lock:
+            if self._tokens < 1.0:
+                self.counts["budget_exhausted"] += 1
+                return False
+            self._tokens -= 1.0
+            self.counts["hedges"] += 1
+            return True
+
+    def add(self, name: str) -> None:
+        with self._lock:
+            self.counts[name] += 1
+
+    def stats(self) -> Dict:
+        delay = self.hedge_delay()
+        with self._lock:
+            return dict(self.counts, samples=len(self._latencies),
+                        hedge_delay_ms=None if delay is None else delay * 1000.0)
+
+
+_lock = threading.Lock()
+_backends: Dict[str, _Backend] = {}
+_pool: Optional[ThreadPoolExecutor] = None
+_attempts_in_flight = 0
+
+
+def _backend(name: str) -> _Backend:
+    with _lock:
+        state = _backends.get(name)
+        if state is None:
+            state = _backends[name] = _Backend()
+        return state
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=TTS_THREADS, thread_name_prefix="tts")
+        return _pool
+
+
+def configure(deadline_seconds: Optional[float] = None, hedge_quantile: Optional[float] = None,
+              hedge_budget: Optional[float] = None) -> None:
+    """Change the settings (None keeps one) and forget measured latencies."""
+    global DEADLINE_SECONDS, HEDGE_QUANTILE, HEDGE_BUDGET
+    if deadline_seconds is not None:
+        DEADLINE_SECONDS = deadline_seconds
+    if hedge_quantile is not None:
+        HEDGE_QUANTILE = hedge_quantile
+    if hedge_budget is not None:
+        HEDGE_BUDGET = hedge_budget
+    with _lock:
+        _backends.clear()
+
+
+def stats() -> Dict:
+    """Settings, attempts in flight and per-backend counters."""
+    with _lock:
+        backends = list(_backends.items())
+        in_flight = _attempts_in_flight
+    return {
+        "deadline_s": DEADLINE_SECONDS,
+        "hedge_quantile": HEDGE_QUANTILE,
+        "hedge_budget": HEDGE_BUDGET,
+        "attempts_in_flight": in_flight,
+        "backends": {name: state.stats() for name, state in backends},
+    }
+
+
+def _move(src: str, dst: str) -> None:
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    try:
+        os.replace(src, dst)
+    except OSError:
+        # Scratch space on another filesystem
+        shutil.move(src, dst)
+
+
+def _start(attempt: Callable[[str], object], output_path: str, state: _Backend) -> Future:
+    global _attempts_in_flight
+    work_dir = tempfile.mkdtemp(prefix="empathy_tts_")
+    path = os.path.join(work_dir, os.path.basename(output_path) or "attempt.wav")
+
+    def run() -> str:
+        t0 = time.perf_counter()
+        attempt(path)
+        state.record(time.perf_counter() - t0)
+        return path
+
+    def finished(_future: Future) -> None:
+        global _attempts_in_flight
+        with _lock:
+            _attempts_in_flight -= 1
+
+    with _lock:
+        _attempts_in_flight += 1
+    future = _executor().submit(run)
+    future.work_dir = work_dir
+    future.add_done_callback(finished)
+    return future
+
+
+def _discard(future: Future) -> None:
+    # Removes the attempt's files once it returns, however late
+    future.add_done_callback(lambda f: shutil.rmtree(f.work_dir, ignore_errors=True))
+
+
+def hedged_call(
+    attempt: Callable[[str], object],
+    output_path: str,
+    backend: str,
+    fallback: Optional[Callable[[str], object]] = None,
+) -> Tuple[str, bool]:
+    """Run `attempt(path)`, hedged and under the deadline; result at `output_path`.
+
+    `attempt` synthesizes to the path it is given; `backend` names the TTS
+    engine whose latencies pick the hedge delay. If no attempt finishes in
+    time, `fallback(output_path)` renders the sentence instead. Returns
+    (output_path, degraded), degraded being True when the fallback was
+    used. Errors of the attempts propagate once none is left running.
+    """
+    state = _backend(backend)
+    state.start_call()
+    hedge_after = state.hedge_delay()
+    if hedge_after is None and DEADLINE_SECONDS <= 0:
+        # Nothing to race against: call inline
+        t0 = time.perf_counter()
+        attempt(output_path)
+        state.record(time.perf_counter() - t0)
+        return output_path, False
+
+    started = time.perf_counter()
+    deadline = started + DEADLINE_SECONDS if DEADLINE_SECONDS > 0 else None
+    hedge_at = started + hedge_after if hedge_after is not None else None
+    primary = _start(attempt, output_path, state)
+    running = {primary}
+    error: Optional[BaseException] = None
+    while running:
+        wake = min((t for t in (hedge_at, deadline) if t is not None), default=None)
+        timeout = None if wake is None else max(0.0, wake - time.perf_counter())
+        done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            running.discard(future)
+            if future.exception() is not None:
+                error = future.exception()
+                _discard(future)
+                continue
+            _move(future.result(), output_path)
+            shutil.rmtree(future.work_dir, ignore_errors=True)
+            if future is not primary:
+                state.add("hedge_wins")
+                metrics.count("tts_hedge_wins")
+            for loser in running:
+                _discard(loser)
+            return output_path, False
+
+        now = time.perf_counter()
+        if deadline is not None and now >= deadline and running:
+            state.add("deadline_misses")
+            metrics.count("tts_deadline_misses")
+            for loser in running:
+                _discard(loser)
+            if fallback is None:
+                raise TTSDeadlineExceeded(f"TTS did not finish within {DEADLINE_SECONDS:g}s")
+            fallback(output_path)
+            return output_path, True
+        if hedge_at is not None and now >= hedge_at:
+            # One hedge per call at most
+            hedge_at = None
+            if running and state.take_hedge():
+                metrics.count("tts_hedges")
+                running.add(_start(attempt, output_path, state))
+
+    state.add("errors")
+    raise error
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+"""Check the segmentation module against nltk.sent_tokenize.
+
+Three comparisons over representative texts (dialogue, abbreviations,
+numbers, quotes, multi-line text, the benchmark corpus) and `--random`
+generated texts built from awkward tokens:
+ - punkt:       PunktSegmenter must give exactly nltk.sent_tokenize's sentences
+ - regex-rules: RegexSegmenter with the installed Punkt model's abbreviations
+                and sentence starters must give exactly Punkt's spans
+ - regex:       RegexSegmenter with its built-in English lists (what
+                EMPATHY_SEGMENTER=regex uses); differences from Punkt are
+                reported, not failed, since they come from the word lists
+                rather than the rules. With the defaults: 3689/5008 texts
+                identical, 17856/19325 Punkt boundaries found
+
+stream_spans() must also match spans() on every text. `--file` adds texts
+of your own. Exits non-zero on any failure. Needs NLTK punkt data.
+
+Usage:
+    python -m empathy_engine.verify_segmentation --random 5000
+"""
+import argparse
+import io
+import random
+import sys
+from typing import List, Optional, Tuple
+
+import nltk
+
+try:
+    from .bench_pipeline import make_corpus
+    from .segmentation import PunktSegmenter, RegexSegmenter, stream_spans
+except ImportError:
+    from bench_pipeline import make_corpus
+    from segmentation import PunktSegmenter, RegexSegmenter, stream_spans
+
+
+TEXTS = {
+    "dialogue": (
+        '"Are you coming?" she asked. "Not yet!" he shouted back. '
+        "'Fine,' she said. (He never came.) They waited... and waited."
+    ),
+    "abbreviations": (
+        "Mr. and Mrs. Smith met Dr. Jones at 5 p.m. in the U.S. capital. "
+        "They discussed e.g. budgets, i.e. money, etc. Then they left. "
+        "J. K. Rowling wrote it. St. Louis is in Missouri."
+    ),
+    "numbers": (
+        "The total was 3.5 million. On 12. March we met. Chapter 4. The end. "
+        "It rose 2.4% to $1,250.75 in Q3. Version 1.2.3 ships today."
+    ),
+    "quotes": (
+        "He said “I’m done.” Then he left. «Bonjour.» Nobody answered. "
+        "[Note: see above.] The list (a. first, b. second) was long."
+    ),
+    "emotional": (
+        "Everyone congratulated me on my presentation. They said I looked confident and sharp. "
+        "I nodded and thanked them, but inside I kept replaying the one slide where I stumbled. "
+        "I don’t know why I can’t just feel proud. What is wrong with me?! Nothing. Really."
+    ),
+    "multiline": (
+        "First line ends here.\nSecond line\ncontinues here. Third!\n\n"
+        "  Indented paragraph.\r\nWindows line.\tTabbed. Non\xa0breaking. space.   "
+    ),
+    "edge": "...  Wait.  ?!  (ok.)  --Hm.  x.y. z  e.g.(this) end.--next Word. ",
+    "corpus": " ".join(make_corpus(300)),
+}
+
+# Tokens the random texts are built from
+_WORDS = (
+    "Hello world the The J. Mr. dr. e.g. U.S. 5. 3.5 etc. it He (see this) \"Quote.\" 'single.' "
+    "“curly!” wait... Then no. Yes! why? ok?! (a.) [b] -- end.-- x.y. Z. 1999. -3. a, b; c: "
+    "«fr.» ‘x.’ word.) (Word.) ok.\" ! ? ... .. . Don’t i.e., * @me. #tag. & St. Inc.) "
+    "e.g.(this) Hi!\"he x.:y end.; ok?)x A.B. --word. Mr.- word.’s"
+).split()
+_SEPARATORS = (" ", " ", "  ", "\n", "\n\n", "\t", "\xa0", "\r\n")
+
+
+def random_texts(count: int, seed: int = 48) -> List[str]:
+    """`count` deterministic texts of 1-12 awkward tokens."""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        text = "".join(rng.choice(_WORDS) + rng.choice(_SEPARATORS) for _ in range(rng.randint(1, 12)))
+        texts.append(text.strip() if rng.random() < 0.5 else text)
+    return texts
+
+
+def _boundaries(spans: List[Tuple[int, int]]) -> set:
+    return {end for _, end in spans}
+
+
+def _show(text: str, expected: List[Tuple[int, int]], got: List[Tuple[int, int]]) -> None:
+    # From the first sentence that differs
+    first = next((i for i, (a, b) in enumerate(zip(expected, got)) if a != b), min(len(expected), len(got)))
+    print(f"    punkt: {[text[s:e][:80] for s, e in expected[first:first + 3]]}")
+    print(f"    got:   {[text[s:e][:80] for s, e in got[first:first + 3]]}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--random", type=int, default=5000, help="generated texts to compare")
+    parser.add_argument("--file", action="append", default=[], help="text file to compare (repeatable)")
+    parser.add_argument("--show", type=int, default=3, help="differences to print per comparison")
+    args = parser.parse_args(argv)
+
+    punkt = PunktSegmenter()
+    params = punkt.tokenizer._params
+    rules = RegexSegmenter(params.abbrev_types, params.sent_starters)
+    regex = RegexSegmenter()
+
+    texts = dict(TEXTS)
+    for n, text in enumerate(random_texts(args.random)):
+        texts[f"random{n}"] = text
+    for path in args.file:
+        with open(path, encoding="utf-8") as f:
+            texts[path] = f.read()
+
+    failures = {"punkt": 0, "regex-rules": 0, "stream": 0}
+    regex_diffs = 0
+    boundaries = agreed = 0
+    for name, text in texts.items():
+        expected = list(punkt.spans(text))
+        if punkt.sentences(text) != nltk.sent_tokenize(text):
+            failures["punkt"] += 1
+            if failures["punkt"] <= args.show:
+                print(f"  punkt != sent_tokenize on {name}")
+        got = list(rules.spans(text))
+        if got != expected:
+            failures["regex-rules"] += 1
+            if failures["regex-rules"] <= args.show:
+                print(f"  regex-rules differs on {name}")
+                _show(text, expected, got)
+        streamed = [(s, e) for s, e, _ in stream_spans(io.StringIO(text), chunk_chars=7, segmenter=rules)]
+        if streamed != got:
+            failures["stream"] += 1
+            if failures["stream"] <= args.show:
+                print(f"  stream_spans differs from spans on {name}")
+                _show(text, got, streamed)
+        got = list(regex.spans(text))
+        wanted = _boundaries(expected)
+        boundaries += len(wanted)
+        agreed += len(wanted & _boundaries(got))
+        if got != expected:
+            regex_diffs += 1
+            if regex_diffs <= args.show and not name.startswith("random"):
+                print(f"  regex (built-in lists) differs on {name}")
+                _show(text, expected, got)
+
+    print(f"{len(texts)} texts")
+    for check, count in failures.items():
+        print(f"  {check:<12} {'OK' if not count else f'{count} FAILED'}")
+    print(f"  {'regex':<12} {len(texts) - regex_diffs}/{len(texts)} texts identical, "
+          f"{agreed}/{boundaries} Punkt boundaries found")
+    return 1 if any(failures.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,6 +10,11 @@ import tempfile
 
 from pydub import AudioSegment
 
+try:
+    from . import metrics
+except ImportError:
+    import metrics
+
 
 def _clamp(v, lo, hi):
     return max(lo, min(hi, v))
@@ -21,6 +26,8 @@ def apply_speed(audio: AudioSegment, speed: float) -> AudioSegment:
     Clamps `speed` to [0.7, 1.4] before applying.
     """
     speed = _clamp(speed, 0.7, 1.4)
+    if speed == 1.0:
+        return audio
     new_frame_rate = int(audio.frame_rate * speed)
     altered = audio._spawn(audio.raw_data, overrides={"frame_rate": new_frame_rate})
     return altered.set_frame_rate(audio.frame_rate)
@@ -52,25 +59,36 @@ def apply_pitch(audio: AudioSegment, semitones: float) -> AudioSegment:
 def apply_volume(audio: AudioSegment, volume_db: float) -> AudioSegment:
     """Adjust volume in dB; clamp to [-6, +6]."""
     volume_db = _clamp(volume_db, -6.0, 6.0)
+    if volume_db == 0:
+        return audio
     return audio.apply_gain(volume_db)
 
 
-def modulate(input_path: str, voice_params: Dict, output_path: str) -> str:
-    """Apply speed -> pitch -> volume to `input_path` and save to `output_path`.
+def modulate_segment(audio: AudioSegment, voice_params: Dict) -> AudioSegment:
+    """Apply speed -> pitch -> volume to an in-memory segment.
 
     `voice_params` should contain keys: `speed`, `pitch_semitones`, `volume_db`.
-    Returns `output_path`.
     """
-    audio = AudioSegment.from_file(input_path)
-
     speed = float(voice_params.get("speed", 1.0))
     pitch = float(voice_params.get("pitch_semitones", 0.0))
     volume = float(voice_params.get("volume_db", 0.0))
 
     # Apply in order: speed -> pitch -> volume
-    audio = apply_speed(audio, speed)
-    audio = apply_pitch(audio, pitch)
-    audio = apply_volume(audio, volume)
+    with metrics.stage("modulate"):
+        audio = apply_speed(audio, speed)
+        audio = apply_pitch(audio, pitch)
+        audio = apply_volume(audio, volume)
+    return audio
+
+
+def modulate(input_path: str, voice_params: Dict, output_path: str) -> str:
+    """Apply speed -> pitch -> volume to `input_path` and save to `output_path`.
+
+    `voice_params` should contain keys: `speed`, `pitch_semitones`, `volume_db`.
+    Returns `output_path`.
+    """
+    audio = AudioSegment.from_file(input_path)
+    audio = modulate_segment(audio, voice_params)
 
     # Export final wav
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
@@ -0,0 +1,115 @@
+"""EMOTION_VOICE_MAP compiled into a NumPy table.
+
+ - VOICE_TABLE: read-only float array of shape (emotions, intensities,
+   params), indexed through LABEL_INDEX, INTENSITIES and PARAMS
+ - timeline_voice_params(timeline, base_pitch): voice params for every
+   timeline entry in one vectorized step, with the corpus base_pitch applied
+   and pitch clamped to [-5, +5]. By default the top emotion's intensity
+   bucket picks the row, exactly as get_voice_params() does; optionally the
+   intensity is interpolated continuously from the confidence, and the top
+   k emotions are blended by confidence. Values come back as read-only
+   VoiceParams.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    from .config import EMOTION_VOICE_MAP, VOICE_INTERPOLATE, VOICE_TOP_K, VoiceParams
+except ImportError:
+    from config import EMOTION_VOICE_MAP, VOICE_INTERPOLATE, VOICE_TOP_K, VoiceParams
+
+
+LABELS = tuple(EMOTION_VOICE_MAP)
+LABEL_INDEX: Dict[str, int] = {label: i for i, label in enumerate(LABELS)}
+INTENSITIES = ("low", "medium", "high")
+INTENSITY_INDEX: Dict[str, int] = {name: i for i, name in enumerate(INTENSITIES)}
+PARAMS = ("speed", "pitch_semitones", "volume_db")
+
+VOICE_TABLE = np.array(
+    [[[EMOTION_VOICE_MAP[label][i][p] for p in PARAMS] for i in INTENSITIES] for label in LABELS],
+    dtype=np.float64,
+)
+VOICE_TABLE.setflags(write=False)
+
+_NEUTRAL = LABEL_INDEX["neutral"]
+_MEDIUM = INTENSITY_INDEX["medium"]
+_PITCH = PARAMS.index("pitch_semitones")
+
+# Confidence at which each intensity row applies fully when interpolating:
+# the middle of the detector's medium (0.60-0.85) and high (> 0.85) bands,
+# and the same distance below medium for low. Clamped outside this range.
+INTERP_CONFIDENCE = (0.45, 0.725, 0.925)
+
+
+def _lookup(index: Dict[str, int], name: Optional[str], default: int) -> int:
+    # Names are normally lowercase already; lower() only on a miss
+    i = index.get(name)
+    if i is None:
+        i = index.get((name or "").lower(), default)
+    return i
+
+
+def timeline_voice_params(
+    timeline: List[Dict],
+    base_pitch: float = 0.0,
+    interpolate: Optional[bool] = None,
+    top_k: Optional[int] = None,
+) -> List[Optional[VoiceParams]]:
+    """Voice params for each timeline entry (None for entries without emotions).
+
+    `interpolate` and `top_k` default to EMPATHY_VOICE_INTERPOLATE and
+    EMPATHY_VOICE_TOP_K (bucketed top emotion only).
+    """
+    interpolate = VOICE_INTERPOLATE if interpolate is None else interpolate
+    k = max(1, VOICE_TOP_K if top_k is None else top_k)
+    n = len(timeline)
+    if n == 0:
+        return []
+
+    # Flat Python lists first, one array each: per-element NumPy writes are slow
+    labels: List[int] = []
+    levels: List[int] = []
+    confidence: List[float] = []
+    present: List[bool] = []
+    for item in timeline:
+        emotions = item.get("emotions") or ()
+        for col in range(k):
+            if col < len(emotions):
+                e = emotions[col]
+                labels.append(_lookup(LABEL_INDEX, e.get("label"), _NEUTRAL))
+                levels.append(_lookup(INTENSITY_INDEX, e.get("intensity"), _MEDIUM))
+                confidence.append(float(e.get("confidence", 0.0)))
+                present.append(True)
+            else:
+                labels.append(_NEUTRAL)
+                levels.append(_MEDIUM)
+                confidence.append(0.0)
+                present.append(False)
+    labels, levels, confidence, present = (
+        np.array(column).reshape(n, k) for column in (labels, levels, confidence, present)
+    )
+
+    if interpolate:
+        position = np.interp(confidence, INTERP_CONFIDENCE, (0.0, 1.0, 2.0))
+        lower = np.minimum(position.astype(np.intp), len(INTENSITIES) - 2)
+        frac = (position - lower)[..., None]
+        values = VOICE_TABLE[labels, lower] * (1.0 - frac) + VOICE_TABLE[labels, lower + 1] * frac
+    else:
+        values = VOICE_TABLE[labels, levels]
+
+    if k == 1:
+        params = values[:, 0]
+    else:
+        weights = np.where(present, confidence, 0.0)
+        # Entries whose confidences are all zero fall back to their top emotion
+        weights[weights.sum(axis=1) == 0.0, 0] = 1.0
+        weights /= weights.sum(axis=1, keepdims=True)
+        params = np.einsum("nk,nkp->np", weights, values)
+
+    params[:, _PITCH] = np.clip(params[:, _PITCH] + base_pitch, -5.0, 5.0)
+    speed, pitch, volume = PARAMS
+    return [
+        VoiceParams({speed: row[0], pitch: row[1], volume: row[2]}) if has_emotion else None
+        for row, has_emotion in zip(params.tolist(), present[:, 0].tolist())
+    ]